@@ -1,3 +1,4 @@
+local Clock = require("lib/clock")
 local Events = require("lib/events")
 local Outbox = require("lib/outbox")
 
@@ -8,6 +9,7 @@ local emitter = {
   armed = false,
   session_id = nil,
   seq = 0,
+  clock = nil,
   outbox = nil,
   events = nil,
 }
@@ -18,6 +20,7 @@ registerHotkey("pishock_emitter_toggle_armed", "PiShock Emitter: Toggle Armed",
 end)
 
 registerForEvent("onInit", function()
+  emitter.clock = Clock.new()
   emitter.outbox = Outbox.new(CONFIG_PATH, OUTBOX_PATH)
   emitter.session_id = emitter.outbox:session_id()
 
@@ -25,7 +28,7 @@ registerForEvent("onInit", function()
     emitter.seq = emitter.seq + 1
     emitter.outbox:emit({
       event_type = event_type,
-      ts_ms = math.floor(os.clock() * 1000),
+      ts_ms = emitter.clock:now_ms(),
       session_id = emitter.session_id,
       armed = emitter.armed,
       context = context or {},
@@ -34,7 +37,13 @@ registerForEvent("onInit", function()
   end)
 
   emitter.events:register_observers()
-  print("[pishock_emitter] initialized; writing to outbox/events.log")
+  print("[pishock_emitter] initialized; writing to " .. emitter.outbox:location())
+end)
+
+registerForEvent("onUpdate", function()
+  if emitter.clock then
+    emitter.clock:update()
+  end
 end)
 
 registerForEvent("onShutdown", function()
@@ -0,0 +1,44 @@
+-- Millisecond timestamps for `ts_ms`: Unix epoch milliseconds that never go
+-- backwards within a session, so the middleware can age every event.
+--
+-- Lua offers os.time() (whole wall-clock seconds) and os.clock(). On Windows
+-- (and under Wine/Proton) the CRT clock() behind os.clock() counts wall time
+-- since process start, not CPU time, so it is used as the monotonic source
+-- and anchored to the epoch. The first anchor is only accurate to a second;
+-- update() refines it to one frame the moment os.time() ticks over.
+
+local Clock = {}
+Clock.__index = Clock
+
+function Clock.new()
+  local now_s = os.time()
+  return setmetatable({
+    -- Epoch milliseconds at os.clock() == 0.
+    anchor_ms = now_s * 1000 - os.clock() * 1000,
+    last_s = now_s,
+    last_ms = 0,
+    refined = false,
+  }, Clock)
+end
+
+-- Call from onUpdate until `refined` is set; cheap enough for every frame.
+function Clock:update()
+  if self.refined then
+    return
+  end
+  local now_s = os.time()
+  if now_s ~= self.last_s then
+    -- The second just started: epoch ms is now_s * 1000 to within a frame.
+    self.anchor_ms = now_s * 1000 - os.clock() * 1000
+    self.refined = true
+  end
+end
+
+function Clock:now_ms()
+  -- max(): refining the anchor must not step a timestamp back.
+  local ms = math.max(self.last_ms, math.floor(self.anchor_ms + os.clock() * 1000))
+  self.last_ms = ms
+  return ms
+end
+
+return Clock
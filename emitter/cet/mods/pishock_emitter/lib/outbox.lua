@@ -1,6 +1,18 @@
 local JsonMin = require("lib/json_min")
 local CryptoHmac = require("lib/crypto_hmac")
 
+-- Signed outbox lines (`<sig_hex>\t<json_body>\n`) for the middleware's file
+-- ingester.
+--
+-- With `segment_bytes` > 0 (the default) events go to numbered segments next
+-- to `outbox_path` (outbox/events.000001.log, ...) and outbox/events.manifest
+-- names the active one. Once a segment reaches `segment_bytes` the next one is
+-- opened before the full one is closed, so a reader that sees segment N+1 knows
+-- N is complete; the ingester deletes segments it has consumed. With
+-- `segment_bytes` = 0 everything is appended to `outbox_path` itself.
+
+local DEFAULT_SEGMENT_BYTES = 4 * 1024 * 1024
+
 local Outbox = {}
 Outbox.__index = Outbox
 
@@ -20,6 +32,7 @@ local function load_config(config_path)
       shared_secret = "change-me",
       outbox_path = "outbox/events.log",
       session_id_prefix = "cp77",
+      segment_bytes = DEFAULT_SEGMENT_BYTES,
     }
   end
 
@@ -29,34 +42,120 @@ local function load_config(config_path)
   local shared_secret = content:match('"shared_secret"%s*:%s*"([^"]+)"') or "change-me"
   local outbox_path = content:match('"outbox_path"%s*:%s*"([^"]+)"') or "outbox/events.log"
   local session_id_prefix = content:match('"session_id_prefix"%s*:%s*"([^"]+)"') or "cp77"
+  local segment_bytes = tonumber(content:match('"segment_bytes"%s*:%s*(%d+)')) or DEFAULT_SEGMENT_BYTES
 
   return {
     shared_secret = shared_secret,
     outbox_path = outbox_path,
     session_id_prefix = session_id_prefix,
+    segment_bytes = segment_bytes,
   }
 end
 
-function Outbox.new(config_path, default_outbox_path)
-  local cfg = load_config(config_path)
-  local outbox_path = cfg.outbox_path or default_outbox_path
+-- "outbox/events.log" -> "outbox/events", ".log"
+local function split_ext(path)
+  local stem, ext = path:match("^(.*)(%.[^./\\]*)$")
+  if not stem then
+    return path, ""
+  end
+  return stem, ext
+end
 
-  ensure_dir("outbox")
+local function segment_path(outbox_path, segment)
+  local stem, ext = split_ext(outbox_path)
+  return string.format("%s.%06d%s", stem, segment, ext)
+end
+
+local function manifest_path(outbox_path)
+  local stem = split_ext(outbox_path)
+  return stem .. ".manifest"
+end
 
-  local handle, err = io.open(outbox_path, "a+")
+local function read_active_segment(path)
+  local f = io.open(path, "r")
+  if not f then
+    return nil
+  end
+  local content = f:read("*a")
+  f:close()
+  return tonumber(content:match('"active"%s*:%s*(%d+)'))
+end
+
+local function open_append(path)
+  local handle, err = io.open(path, "a")
   if not handle then
     error("Could not open outbox file: " .. tostring(err))
   end
+  return handle, handle:seek("end")
+end
+
+function Outbox.new(config_path, default_outbox_path)
+  local cfg = load_config(config_path)
+  local outbox_path = cfg.outbox_path or default_outbox_path
+
+  ensure_dir("outbox")
 
   local self = setmetatable({
-    handle = handle,
+    path = outbox_path,
+    segment_bytes = cfg.segment_bytes,
+    segment = nil,
+    size = 0,
     shared_secret = cfg.shared_secret,
     _session_id = string.format("%s-%d", cfg.session_id_prefix, math.floor(os.time())),
   }, Outbox)
 
+  if self.segment_bytes > 0 then
+    -- Continue the active segment of the last session, if any.
+    self.segment = read_active_segment(manifest_path(outbox_path)) or 1
+    self.handle, self.size = open_append(segment_path(outbox_path, self.segment))
+    self:_write_manifest()
+  else
+    self.handle = open_append(outbox_path)
+  end
+
   return self
 end
 
+-- Where events currently go, for log messages.
+function Outbox:location()
+  if self.segment then
+    return segment_path(self.path, self.segment)
+  end
+  return self.path
+end
+
+function Outbox:_write_manifest()
+  local path = manifest_path(self.path)
+  local tmp = path .. ".tmp"
+  local f = io.open(tmp, "w")
+  if not f then
+    return
+  end
+  f:write(string.format('{"version":1,"active":%d,"segment_bytes":%d}\n', self.segment, self.segment_bytes))
+  f:close()
+  if not os.rename(tmp, path) then
+    -- Windows will not rename over an existing file.
+    os.remove(path)
+    os.rename(tmp, path)
+  end
+end
+
+function Outbox:_roll()
+  local next_segment = self.segment + 1
+  local handle = io.open(segment_path(self.path, next_segment), "a")
+  if not handle then
+    -- Keep appending to the full segment rather than lose events.
+    return
+  end
+  -- Open the next segment before closing this one: once it exists, readers
+  -- treat this one as complete.
+  self.handle:close()
+  self.handle = handle
+  self.segment = next_segment
+  self.size = 0
+  self:_write_manifest()
+end
+
 function Outbox:session_id()
   return self._session_id
 end
@@ -66,6 +165,12 @@ function Outbox:emit(event_table)
   local sig_hex = CryptoHmac.hmac_sha256_hex(self.shared_secret, json_body)
   self.handle:write(sig_hex, "\t", json_body, "\n")
   self.handle:flush()
+  if self.segment then
+    self.size = self.size + #sig_hex + #json_body + 2
+    if self.size >= self.segment_bytes then
+      self:_roll()
+    end
+  end
 end
 
 function Outbox:close()
@@ -4,131 +4,406 @@ Design goals:
 - localhost-only deployment by default
 - HMAC request authentication for every event
 - strict policy evaluation before any PiShock actuation
+
+Importing this module does no config I/O: `app_factory()` builds the app from
+`MIDDLEWARE_CONFIG`, and the module-level `app` (for `uvicorn
+middleware.app:app`) is created on first access.
 """
 
 from __future__ import annotations
 
-import json
-import logging
+import asyncio
 import os
-from logging.handlers import RotatingFileHandler
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 from fastapi import FastAPI, HTTPException, Request
-
-from .config import ServiceConfig, load_config
-from .pishock_http import send_pishock_http
-from .policy import CooldownError, PolicyEngine, PolicyError
-from .security import verify_signature
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from .config import ServiceConfig, load_config_cached
+from .dedupe import DedupeIndex, open_dedupe
+from .dispatcher import ActionDispatcher, QueueFullError
+from .events import dumps
+from .journal import open_journal
+from .logs import configure_logging, log_metric_lines
+from .metrics import CONTENT_TYPE, Metrics, dispatcher_gauge_lines
+from .pipeline import Outcome, evaluate, evaluate_line
+from .policy import Action, PolicyEngine
+from .reload import ConfigReloader
+from .resilience import resilience_for
+from .security import SignatureVerifier
+
+if TYPE_CHECKING:
+    from .pishock_http import PiShockResult
 
 VERSION = "0.3.0"
-VERSION = "0.2.0"
 
 
-class JsonFormatter(logging.Formatter):
-    """Serialize log records as JSON for easier filtering and ingestion."""
+# Upper bound on one `/events` line; guards the streaming splitter's buffer.
+MAX_BATCH_LINE_BYTES = 64 * 1024
 
-    def format(self, record: logging.LogRecord) -> str:
-        payload = {
-            "level": record.levelname,
-            "logger": record.name,
-            "message": record.getMessage(),
-            "ts": int(record.created * 1000),
-        }
-        if record.exc_info:
-            payload["exception"] = self.formatException(record.exc_info)
-        return json.dumps(payload)
+# How often a changed dedupe index is persisted (and always at shutdown).
+DEDUPE_FLUSH_S = 1.0
 
 
-def configure_logging() -> logging.Logger:
-    """Configure stdout + rotating file logs.
+class FastJSONResponse(JSONResponse):
+    """JSON response serialized by the event codec (orjson/msgspec when installed).
 
-    Handler setup is idempotent to avoid duplicate logs when app reloads.
+    Ingest endpoints return it directly, which also skips FastAPI's
+    `jsonable_encoder` pass over the plain dict/int/str payloads they build.
     """
 
-    logger = logging.getLogger("middleware")
-    logger.setLevel(logging.INFO)
-    if logger.handlers:
-        return logger
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
 
-    formatter = JsonFormatter()
-    sh = logging.StreamHandler()
-    sh.setFormatter(formatter)
 
-    Path("logs").mkdir(exist_ok=True)
-    fh = RotatingFileHandler("logs/middleware.log", maxBytes=1_000_000, backupCount=3)
-    fh.setFormatter(formatter)
+async def _iter_lines(request: Request) -> AsyncIterator[bytes]:
+    """Yield newline-separated lines from the request body without buffering it whole."""
 
-    logger.addHandler(sh)
-    logger.addHandler(fh)
-    return logger
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+        if len(pending) > MAX_BATCH_LINE_BYTES:
+            raise HTTPException(status_code=413, detail="Batch line too long")
+    if pending:
+        yield pending
 
 
-def create_app(config: ServiceConfig) -> FastAPI:
-    """Create a configured FastAPI app instance."""
+def create_app(config: ServiceConfig, config_path: str | Path | None = None) -> FastAPI:
+    """Create a configured FastAPI app instance.
+
+    With `config_path`, the file is watched while the app runs and policy
+    settings are hot-reloaded from it (see `reload.ConfigReloader`).
+    """
 
     logger = configure_logging()
     policy_engine = PolicyEngine(config)
-    app = FastAPI(title="Cyberpunk PiShock Middleware", version=VERSION)
+    verifier = SignatureVerifier(config.shared_secret)
+    metrics = Metrics(config.event_mappings)
 
-    @app.get("/health")
-    async def health() -> dict[str, Any]:
-        """Basic service health endpoint."""
-
-        return {"status": "ok", "version": VERSION}
+    def apply_config(new_config: ServiceConfig) -> None:
+        policy_engine.reload(new_config)
+        metrics.add_event_types(new_config.event_mappings)
 
-    @app.post("/event", status_code=202)
-    async def ingest_event(request: Request) -> dict[str, Any]:
-        """Receive signed game events, apply policy, and optionally actuate PiShock."""
+    reloader = ConfigReloader(config_path, config, apply_config, logger) if config_path is not None else None
 
-        body = await request.body()
-        signature = request.headers.get("X-Event-Signature")
-        if not verify_signature(body, signature, config.shared_secret):
-            raise HTTPException(status_code=401, detail="Invalid signature")
+    def emit_coalesced(app: FastAPI, action: Action) -> None:
+        """Route an action produced by a closed coalescing window."""
 
+        logger.info("coalesced_action", extra={"action": action.__dict__})
+        if app.state.journal is not None:
+            app.state.journal.record_action(action)
+        if app.state.dispatcher is None:
+            return
         try:
-            event = await request.json()
-            action = policy_engine.decide(event)
-        except CooldownError as exc:
-            raise HTTPException(status_code=429, detail=str(exc)) from exc
-        except (PolicyError, KeyError, ValueError, TypeError) as exc:
-            raise HTTPException(status_code=400, detail=str(exc)) from exc
+            app.state.dispatcher.submit(action)
+        except QueueFullError as exc:
+            logger.warning("coalesced_action_rejected", extra={"detail": str(exc)})
+
+    async def flush_coalesced(app: FastAPI) -> None:
+        while True:
+            # Tick at a fraction of the shortest window so emission lag stays
+            # small; re-read each time since a reload may add or remove windows.
+            window_ms = policy_engine.coalesce_window_ms()
+            await asyncio.sleep(min(0.05, max(0.005, window_ms / 4000)) if window_ms else 0.25)
+            for action in policy_engine.flush_due():
+                emit_coalesced(app, action)
+
+    async def flush_dedupe(index: DedupeIndex) -> None:
+        while True:
+            await asyncio.sleep(DEDUPE_FLUSH_S)
+            try:
+                await asyncio.to_thread(index.flush)
+            except OSError as exc:
+                logger.warning("dedupe_flush_failed", extra={"detail": str(exc)})
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        # One pooled client per app: keep-alive connections survive across
+        # events instead of paying a TCP+TLS handshake per actuation.
+        app.state.pishock = None
+        app.state.dispatcher = None
+        app.state.resilience = None
+        app.state.journal = open_journal(config.journal, "http")
+        app.state.dedupe = open_dedupe(config.dedupe, "http")
+        if not config.dry_run:
+            # Dry runs never send, so they skip importing the HTTP client (httpx).
+            from .pishock_http import AsyncPiShockClient  # pylint: disable=import-outside-toplevel
+
+            client = AsyncPiShockClient(
+                url=config.transport.url,
+                timeout_s=config.transport.timeout_s,
+                max_connections=config.transport.max_connections,
+                max_keepalive_connections=config.transport.max_keepalive_connections,
+                keepalive_expiry_s=config.transport.keepalive_expiry_s,
+            )
 
-        logger.info("event_accepted event_type=%s action=%s", event.get("event_type"), action)
+            resilience = resilience_for(config.transport)
+
+            async def send(action: Action) -> PiShockResult:
+                return await resilience.run(
+                    lambda: client.send(
+                        mode=action.mode,
+                        intensity=action.intensity,
+                        duration_ms=action.duration_ms,
+                        username=config.pishock.username,
+                        apikey=config.pishock.apikey,
+                        code=action.target,
+                        name=config.pishock.name,
+                    )
+                )
+
+            app.state.pishock = client
+            app.state.resilience = resilience
+            app.state.dispatcher = ActionDispatcher(
+                send,
+                queue_size=config.dispatch.queue_size,
+                workers_per_target=config.dispatch.workers_per_target,
+                overflow=config.dispatch.overflow,
+                deadline_ms=config.dispatch.deadline_ms or None,
+                logger=logger,
+                metrics=metrics,
+            )
+        app.state.datagram = None
+        if config.datagram.udp_port or config.datagram.unix_path:
+            # Imported here: most deployments use HTTP or the file ingester only.
+            from .datagram import DatagramListeners  # pylint: disable=import-outside-toplevel
 
-        if config.dry_run:
-            logger.info(
-                "dry_run: would_send mode=%s intensity=%s duration_ms=%s",
-                action.mode,
-                action.intensity,
-                action.duration_ms,
+            app.state.datagram = await DatagramListeners.open(
+                config.datagram, lambda line, arrived_ns: handle_datagram(app, line, arrived_ns), logger
             )
+            logger.info("datagram_listening", extra={"addresses": app.state.datagram.addresses})
+        background = [asyncio.create_task(flush_coalesced(app))]
+        if app.state.dedupe is not None:
+            background.append(asyncio.create_task(flush_dedupe(app.state.dedupe)))
+        if reloader is not None:
+            reloader.start()
+        try:
+            yield
+        finally:
+            if reloader is not None:
+                await asyncio.to_thread(reloader.stop)
+            if app.state.datagram is not None:
+                app.state.datagram.close()
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+            # Windows still open at shutdown are emitted rather than lost.
+            for action in policy_engine.flush_due(force=True):
+                emit_coalesced(app, action)
+            # Drain queued actions before closing the pool they are sent on.
+            if app.state.dispatcher is not None:
+                await app.state.dispatcher.shutdown(config.dispatch.drain_timeout_s)
+            if app.state.pishock is not None:
+                await app.state.pishock.aclose()
+            if app.state.journal is not None:
+                await asyncio.to_thread(app.state.journal.close)
+            if app.state.dedupe is not None:
+                await asyncio.to_thread(app.state.dedupe.close)
+            policy_engine.close()
+
+    app = FastAPI(title="Cyberpunk PiShock Middleware", version=VERSION, lifespan=lifespan)
+    app.state.metrics = metrics
+    metrics.add_gauges(log_metric_lines)
+    # Read at scrape time, so the hot path never touches gauge state.
+    metrics.add_gauges(
+        lambda: dispatcher_gauge_lines(app.state.dispatcher.stats()) if getattr(app.state, "dispatcher", None) else []
+    )
+    metrics.add_gauges(lambda: app.state.resilience.metric_lines() if getattr(app.state, "resilience", None) else [])
+    metrics.add_gauges(lambda: app.state.journal.metric_lines() if getattr(app.state, "journal", None) else [])
+    app.state.reloader = reloader
+    if reloader is not None:
+        metrics.add_gauges(reloader.metric_lines)
+
+    @app.get("/health")
+    async def health(request: Request) -> dict[str, Any]:
+        """Basic service health endpoint, plus dispatch, transport, reload, journal, dedupe and datagram stats."""
+
+        payload: dict[str, Any] = {"status": "ok", "version": VERSION}
+        dispatcher = getattr(request.app.state, "dispatcher", None)
+        if dispatcher is not None:
+            payload["dispatch"] = dispatcher.stats()
+        resilience = getattr(request.app.state, "resilience", None)
+        if resilience is not None:
+            payload["transport"] = resilience.stats()
+        if reloader is not None:
+            payload["config"] = reloader.stats()
+        recorder = getattr(request.app.state, "journal", None)
+        if recorder is not None:
+            payload["journal"] = recorder.stats()
+        dedupe = getattr(request.app.state, "dedupe", None)
+        if dedupe is not None:
+            payload["dedupe"] = dedupe.stats()
+        datagram = getattr(request.app.state, "datagram", None)
+        if datagram is not None:
+            payload["datagram"] = datagram.stats()
+        return payload
+
+    @app.get("/metrics")
+    async def metrics_endpoint() -> PlainTextResponse:
+        """Prometheus text exposition of stage latencies, outcomes and queue gauges."""
+
+        return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+    def journal(app: FastAPI, outcome: Outcome, reason: str | None = None) -> None:
+        recorder = getattr(app.state, "journal", None)
+        if recorder is not None:
+            recorder.record(outcome, reason)
+
+    def admit(app: FastAPI, outcome: Outcome, arrived_ns: int) -> dict[str, Any]:
+        """Log an accepted outcome and queue its action (live mode).
+
+        `arrived_ns` (`time.monotonic_ns()`) starts the action's dispatch deadline.
+        Raises `QueueFullError` when the dispatcher refuses the action; its seq
+        is then forgotten by the replay check, so the emitter's retry is admitted.
+        """
+
+        if outcome.reason == "coalesced":
+            logger.info("event_coalesced", extra={"event_type": outcome.event_type, "detail": outcome.detail})
+            return {"accepted": True, "dry_run": config.dry_run, "coalesced": True}
+
+        action = outcome.action
+        logger.info("event_accepted", extra={"event_type": outcome.event_type, "action": action.__dict__})
+        if config.dry_run:
+            logger.info("dry_run_would_send", extra={"action": action.__dict__})
             return {"accepted": True, "dry_run": True, "action": action.__dict__}
 
-        result = send_pishock_http(
-            mode=action.mode,
-            intensity=action.intensity,
-            duration_ms=action.duration_ms,
-            username=config.pishock.username,
-            apikey=config.pishock.apikey,
-            code=action.target,
-            name=config.pishock.name,
-        )
-        logger.info("pishock_response ok=%s status=%s body=%s", result.ok, result.status_code, result.body)
-        if not result.ok:
-            raise HTTPException(status_code=502, detail="PiShock request failed")
-
-        return {"accepted": True, "dry_run": False, "action": action.__dict__}
+        try:
+            app.state.dispatcher.submit(action, arrived_ns, outcome.emitted_ns)
+        except QueueFullError:
+            event = outcome.event
+            dedupe = getattr(app.state, "dedupe", None)
+            if dedupe is not None and event.session_id is not None and event.seq is not None:
+                dedupe.forget(event.session_id, event.seq)
+            raise
+        return {"accepted": True, "dry_run": False, "queued": True, "action": action.__dict__}
+
+    def handle_datagram(app: FastAPI, line: bytes, arrived_ns: int) -> tuple[int, str]:
+        """`/event` for one outbox-format line received as a datagram; returns `(status, reason)`."""
+
+        outcome = evaluate_line(line, policy_engine, config, verifier, metrics, arrived_ns, app.state.dedupe)
+        if outcome.accepted:
+            try:
+                admit(app, outcome, arrived_ns)
+            except QueueFullError:
+                metrics.count_event(outcome.event_type, "queue_full")
+                journal(app, outcome, "queue_full")
+                return 503, "queue_full"
+        journal(app, outcome)
+        return outcome.status, outcome.reason
+
+    @app.post("/event", status_code=202, response_class=FastJSONResponse)
+    async def ingest_event(request: Request) -> FastJSONResponse:
+        """Receive signed game events, apply policy, and queue PiShock actuation.
+
+        Returns as soon as the action is admitted to the dispatch queue; the
+        PiShock round trip happens on a background worker.
+        """
+
+        arrived_ns = time.monotonic_ns()
+        metrics.requests_in_flight += 1
+        try:
+            body = await request.body()
+            outcome = evaluate(
+                body,
+                request.headers.get("X-Event-Signature"),
+                policy_engine,
+                config,
+                verifier,
+                metrics,
+                arrived_ns,
+                getattr(request.app.state, "dedupe", None),
+            )
+            if not outcome.accepted:
+                journal(request.app, outcome)
+                raise HTTPException(status_code=outcome.status, detail=outcome.detail)
+            try:
+                result = admit(request.app, outcome, arrived_ns)
+            except QueueFullError as exc:
+                metrics.count_event(outcome.event_type, "queue_full")
+                journal(request.app, outcome, "queue_full")
+                raise HTTPException(status_code=503, detail=str(exc)) from exc
+            journal(request.app, outcome)
+            return FastJSONResponse(result, status_code=202)
+        finally:
+            metrics.requests_in_flight -= 1
+
+    @app.post("/events", response_class=FastJSONResponse)
+    async def ingest_events(request: Request) -> FastJSONResponse:
+        """Receive a batch of outbox-format lines (`<sig_hex>\\t<json_body>`, NDJSON-style).
+
+        Each line is verified and decided independently; the body is consumed
+        as a stream. Returns one result per non-empty line, numbered from 1.
+        """
+
+        results: list[dict[str, Any]] = []
+        accepted = 0
+        lineno = 0
+        dedupe = getattr(request.app.state, "dedupe", None)
+        metrics.requests_in_flight += 1
+        try:
+            async for line in _iter_lines(request):
+                lineno += 1
+                if not line.strip():
+                    continue
+                arrived_ns = time.monotonic_ns()
+                outcome = evaluate_line(line, policy_engine, config, verifier, metrics, arrived_ns, dedupe)
+                if not outcome.accepted:
+                    journal(request.app, outcome)
+                    results.append(
+                        {"line": lineno, "status": outcome.status, "error": outcome.reason, "detail": outcome.detail}
+                    )
+                    continue
+                try:
+                    result = admit(request.app, outcome, arrived_ns)
+                except QueueFullError as exc:
+                    metrics.count_event(outcome.event_type, "queue_full")
+                    journal(request.app, outcome, "queue_full")
+                    results.append({"line": lineno, "status": 503, "error": "queue_full", "detail": str(exc)})
+                    continue
+                journal(request.app, outcome)
+                accepted += 1
+                results.append({"line": lineno, "status": 202, **result})
+        finally:
+            metrics.requests_in_flight -= 1
+
+        return FastJSONResponse({"accepted": accepted, "rejected": len(results) - accepted, "results": results})
 
     return app
 
 
+def runtime_config_path() -> str:
+    """`MIDDLEWARE_CONFIG`, or the example config as a fallback."""
+
+    return os.getenv("MIDDLEWARE_CONFIG", "middleware/config.example.yaml")
+
+
 def load_runtime_config() -> ServiceConfig:
     """Load config from `MIDDLEWARE_CONFIG` or the example fallback path."""
 
-    cfg_path = os.getenv("MIDDLEWARE_CONFIG", "middleware/config.example.yaml")
-    return load_config(cfg_path)
+    return load_config_cached(runtime_config_path())
+
+
+def app_factory() -> FastAPI:
+    """Build the service app from `MIDDLEWARE_CONFIG` (`uvicorn --factory middleware.app:app_factory`)."""
+
+    return create_app(load_runtime_config(), config_path=runtime_config_path())
+
+
+_app: FastAPI | None = None
 
 
-app = create_app(load_runtime_config())
+def __getattr__(name: str) -> Any:
+    # Lazy `app` attribute: built on first access, e.g. by `uvicorn middleware.app:app`.
+    global _app  # pylint: disable=global-statement
+    if name == "app":
+        if _app is None:
+            _app = app_factory()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,4 @@
+"""Offline benchmarks for middleware hot paths.
+
+Run modules directly, e.g. `python -m middleware.bench.signature`.
+"""
@@ -0,0 +1,106 @@
+"""Benchmark: working through an outbox backlog, line by line vs `catch_up`.
+
+Writes a synthetic backlog (old events from a past session followed by a few
+fresh ones, rewritten before each run so they stay fresh) and times the live
+tail's `_drain` against `file_ingest.catch_up` over the same bytes, in dry-run
+mode. Prints one JSON object with bytes/s and events/s per strategy.
+
+    python -m middleware.bench.catchup --events 200000 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from .. import file_ingest
+from ..checkpoint import Checkpointer
+from ..dedupe import DedupeIndex
+from ..policy import PolicyEngine
+from .events import generate_lines
+from .load import BENCH_SECRET, bench_config
+
+
+def _write_backlog(path: Path, events: int, fresh: int) -> None:
+    now_ms = time.time_ns() // 1_000_000
+    old = generate_lines(BENCH_SECRET, events, session_id="past", ts_start_ms=now_ms - 3_600_000)
+    recent = generate_lines(BENCH_SECRET, fresh, session_id="live", ts_start_ms=now_ms)
+    path.write_bytes(b"\n".join(old + recent) + b"\n")
+
+
+def _quiet_logger() -> logging.Logger:
+    logger = logging.getLogger("middleware.bench.catchup")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    return logger
+
+
+def _rates(size: int, lines: int, seconds: float) -> dict[str, float]:
+    return {
+        "seconds": round(seconds, 3),
+        "bytes_per_s": round(size / seconds),
+        "events_per_s": round(lines / seconds),
+    }
+
+
+def run(events: int = 200_000, fresh: int = 100, workers: int = 4, horizon_ms: int = 5000) -> dict[str, object]:
+    """Time both strategies over one backlog of `events` old plus `fresh` new events."""
+
+    config = bench_config("http://127.0.0.1:9", dry_run=True)
+    logger = _quiet_logger()
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = Path(tmp) / "events.log"
+        _write_backlog(outbox, events, fresh)
+        size = outbox.stat().st_size
+        results: dict[str, object] = {"events": events + fresh, "bytes": size}
+
+        policy = PolicyEngine(config)
+        with outbox.open("rb") as handle:
+            started = time.perf_counter()
+            lines, _ = file_ingest._drain(
+                handle, policy, config, logger, Checkpointer(Path(tmp) / "drain.offset"), dedupe=DedupeIndex()
+            )
+            results["line_by_line"] = _rates(size, lines, time.perf_counter() - started)
+        policy.close()
+
+        _write_backlog(outbox, events, fresh)
+        policy = PolicyEngine(config)
+        with outbox.open("rb") as handle:
+            report = file_ingest.catch_up(
+                handle,
+                policy,
+                config,
+                logger,
+                Checkpointer(Path(tmp) / "catchup.offset"),
+                dedupe=DedupeIndex(),
+                horizon_ms=horizon_ms,
+                workers=workers,
+            )
+        policy.close()
+        results["catch_up"] = {
+            **_rates(size, report.lines, report.seconds),
+            "accepted": report.accepted,
+            "fast_forwarded": report.fast_forwarded,
+        }
+    results["speedup"] = round(results["catch_up"]["events_per_s"] / results["line_by_line"]["events_per_s"], 2)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark outbox backlog catch-up")
+    parser.add_argument("--events", type=int, default=200_000, help="Old events in the backlog")
+    parser.add_argument("--fresh", type=int, default=100, help="Fresh events at the end of the backlog")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--horizon-ms", type=int, default=5000)
+    args = parser.parse_args()
+
+    results = run(args.events, args.fresh, args.workers, args.horizon_ms)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
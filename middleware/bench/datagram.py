@@ -0,0 +1,134 @@
+"""Benchmark: one event per round trip over `POST /event`, UDP and the Unix socket.
+
+Serves `create_app` with uvicorn (dry run, so only ingress and the decide path
+are measured) with both datagram listeners enabled, then sends the same kind of
+signed events closed loop, one at a time, over each ingress: a keep-alive
+`httpx.Client` for HTTP and a `DatagramSender` waiting for each reply for the
+datagram paths. Prints one JSON object with p50/p99 round trip and events/s
+per ingress.
+
+    python -m middleware.bench.datagram --events 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from ..config import DatagramConfig
+from ..datagram import DatagramSender
+from ..pipeline import split_signed_line
+from .events import generate_lines
+from .load import BENCH_SECRET, bench_config, percentiles_ms
+
+
+def _free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _time(lines: list[bytes], send: Callable[[bytes], int]) -> dict[str, Any]:
+    latencies: list[int] = []
+    statuses: dict[int, int] = {}
+    started_ns = time.perf_counter_ns()
+    for line in lines:
+        sent_ns = time.perf_counter_ns()
+        status = send(line)
+        latencies.append(time.perf_counter_ns() - sent_ns)
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed_s = (time.perf_counter_ns() - started_ns) / 1e9
+    return {
+        "latency_ms": percentiles_ms(latencies),
+        "events_per_s": round(len(lines) / elapsed_s),
+        "statuses": statuses,
+    }
+
+
+def run(events: int = 5000, warmup: int = 200) -> dict[str, Any]:
+    """Time `events` closed-loop round trips per ingress after `warmup` untimed ones."""
+
+    import httpx  # pylint: disable=import-outside-toplevel
+    import uvicorn  # pylint: disable=import-outside-toplevel
+
+    from ..app import create_app  # pylint: disable=import-outside-toplevel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        udp_port = _free_udp_port()
+        unix_path = os.path.join(tmp, "ingest.sock") if hasattr(socket, "AF_UNIX") else None
+        config = dataclasses.replace(
+            bench_config("http://127.0.0.1:9", dry_run=True),
+            datagram=DatagramConfig(udp_port=udp_port, unix_path=unix_path),
+        )
+        app = create_app(config)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.bind(("127.0.0.1", 0))
+        http_port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False))
+        thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, name="bench-uvicorn", daemon=True)
+        thread.start()
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("uvicorn failed to start")
+            time.sleep(0.01)
+
+        results: dict[str, Any] = {"events": events}
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{http_port}", timeout=10.0) as client:
+
+                def post(line: bytes) -> int:
+                    signature, body = split_signed_line(line)
+                    return client.post("/event", content=body, headers={"X-Event-Signature": signature}).status_code
+
+                targets: dict[str, Callable[[bytes], int]] = {"http": post}
+                senders = [DatagramSender(("127.0.0.1", udp_port), BENCH_SECRET)]
+                if unix_path:
+                    senders.append(DatagramSender(unix_path, BENCH_SECRET))
+                for kind, sender in zip(("udp", "unix"), senders):
+                    targets[kind] = lambda line, sender=sender: sender.send_line(line)[0]
+                try:
+                    for kind, send in targets.items():
+                        # A session per ingress, so replay protection never sees a repeated seq.
+                        lines = generate_lines(BENCH_SECRET, warmup + events, session_id=f"bench-{kind}")
+                        _time(lines[:warmup], send)
+                        results[kind] = _time(lines[warmup:], send)
+                finally:
+                    for sender in senders:
+                        sender.close()
+        finally:
+            server.should_exit = True
+            thread.join(timeout=10)
+            sock.close()
+
+    for kind in ("udp", "unix"):
+        if kind in results:
+            results[kind]["speedup_vs_http"] = round(results[kind]["events_per_s"] / results["http"]["events_per_s"], 2)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark datagram ingress against POST /event")
+    parser.add_argument("--events", type=int, default=5000, help="Timed round trips per ingress")
+    parser.add_argument("--warmup", type=int, default=200, help="Untimed round trips per ingress first")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    try:
+        results = run(args.events, args.warmup)
+    finally:
+        logging.disable(logging.NOTSET)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Local stand-in for the PiShock `apioperate` endpoint.
+
+Answers `POST /api/apioperate` after a configurable latency (+ uniform
+jitter), failing the first `fail_first` requests and a configurable fraction
+of the rest with `fail_status` (HTTP 500 by default), so load runs exercise
+the real client/dispatcher without leaving the machine.
+
+    python -m middleware.bench.fake_pishock --port 8788 --latency-ms 80 --jitter-ms 40 --error-rate 0.02
+    python -m middleware.bench.fake_pishock --fail-first 20 --fail-status 503   # outage, then recovery
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+APIOPERATE_PATH = "/api/apioperate"
+
+
+class FakePiShock:
+    """Threaded fake `apioperate` server; use as a context manager or `start()`/`stop()`."""
+
+    def __init__(
+        self,
+        *,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        fail_status: int = 500,
+        fail_first: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int | None = None,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.fail_status = fail_status
+        self.fail_first = fail_first
+        self._planned = 0
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.ops: dict[int, int] = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{APIOPERATE_PATH}"
+
+    def _plan(self) -> tuple[float, bool]:
+        with self._rng_lock:
+            delay_ms = self.latency_ms + self._rng.uniform(0.0, self.jitter_ms)
+            self._planned += 1
+            fail = self._planned <= self.fail_first or self._rng.random() < self.error_rate
+        return delay_ms / 1000.0, fail
+
+    def _record(self, op: int, failed: bool) -> None:
+        with self._count_lock:
+            self.requests += 1
+            self.errors += failed
+            self.ops[op] = self.ops.get(op, 0) + 1
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like the real endpoint, so pooled clients reuse connections.
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without TCP_NODELAY the
+            # body waits on the client's delayed ACK (~40 ms) on every response.
+            disable_nagle_algorithm = True
+
+            def do_POST(self) -> None:  # noqa: N802 - http.server naming
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                if self.path != APIOPERATE_PATH:
+                    self._reply(404, "Not Found")
+                    return
+                try:
+                    op = int(json.loads(raw)["Op"])
+                except (ValueError, KeyError, TypeError):
+                    self._reply(400, "Bad Request")
+                    return
+
+                delay_s, fail = fake._plan()
+                if delay_s > 0:
+                    time.sleep(delay_s)
+                fake._record(op, fail)
+                if fail:
+                    self._reply(fake.fail_status, "Injected failure")
+                else:
+                    self._reply(200, "Operation Succeeded.")
+
+            def _reply(self, status: int, text: str) -> None:
+                body = text.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:  # pylint: disable=redefined-builtin
+                pass
+
+        return Handler
+
+    def stats(self) -> dict[str, object]:
+        with self._count_lock:
+            return {"requests": self.requests, "errors": self.errors, "ops": dict(self.ops)}
+
+    def serve_forever(self) -> None:
+        """Serve on the calling thread until `stop()` (or Ctrl+C)."""
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def start(self) -> FakePiShock:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-pishock", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> FakePiShock:
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local fake PiShock apioperate endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, default=500, help="HTTP status for injected failures")
+    parser.add_argument("--fail-first", type=int, default=0, help="fail this many requests before any succeed")
+    args = parser.parse_args()
+
+    fake = FakePiShock(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        fail_status=args.fail_status,
+        fail_first=args.fail_first,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"fake apioperate listening on {fake.url}", flush=True)
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
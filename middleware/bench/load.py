@@ -0,0 +1,350 @@
+"""End-to-end load harness: `/event` and the file ingester against a fake PiShock.
+
+Starts a local `FakePiShock`, builds a service config pointing at it, and
+drives a signed event stream (generated, or replayed from a recorded outbox)
+through one or both ingress paths at a target rate. Everything runs on
+127.0.0.1, so results are comparable between builds on the same machine.
+
+    python -m middleware.bench.load --target both --events 2000 --rate 200
+    python -m middleware.bench.load --target file --replay path/to/events.log --secret <shared_secret>
+
+Latency is measured from each event's *scheduled* send time (open loop), so a
+stalled server shows up as queueing delay instead of a slower send rate:
+- http: until the `/event` response arrives.
+- file: until the ingester hands the event to `PolicyEngine.decide`
+  (append -> wake -> read -> verify -> parse).
+
+Prints one JSON object per target: p50/p95/p99 latency, achieved throughput,
+outcome counts (accepted, cooldown, ...), dispatcher drops, upstream requests,
+and bucketed per-stage p99s from the service metrics.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import tempfile
+import threading
+import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+
+from ..config import DispatchConfig, PiShockCredentials, ServiceConfig, TransportConfig
+from ..events import Event
+from ..metrics import STAGES, Metrics
+from ..pipeline import split_signed_line
+from ..policy import Action, PolicyEngine
+from .events import DEFAULT_MIX, generate_lines, load_outbox
+from .fake_pishock import FakePiShock
+
+BENCH_SECRET = "bench-secret"
+
+
+def bench_config(
+    url: str,
+    *,
+    secret: str = BENCH_SECRET,
+    dry_run: bool = False,
+    cooldown_ms: int = 0,
+    queue_size: int = 64,
+    overflow: str = "drop_oldest",
+    event_types: tuple[str, ...] = DEFAULT_MIX,
+) -> ServiceConfig:
+    """Service config for load runs: every event type mapped, PiShock at `url`."""
+
+    modes = ("shock", "vibrate", "beep")
+    return ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=0,
+        shared_secret=secret,
+        dry_run=dry_run,
+        allow_shock=True,
+        max_intensity=20,
+        max_duration_ms=2000,
+        default_cooldown_ms=cooldown_ms,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="bench", apikey="bench", code="bench-device"),
+        event_mappings={
+            event_type: {"mode": modes[i % len(modes)], "intensity": 5, "duration_ms": 300, "cooldown_ms": cooldown_ms}
+            for i, event_type in enumerate(event_types)
+        },
+        transport=TransportConfig(url=url),
+        dispatch=DispatchConfig(queue_size=queue_size, overflow=overflow),
+    )
+
+
+class _TimedPolicy(PolicyEngine):
+    """Policy engine that timestamps every `decide` call (file path latency)."""
+
+    def __init__(self, config: ServiceConfig) -> None:
+        super().__init__(config)
+        self.decided_ns: list[int] = []
+
+    def decide(self, event: Event | Mapping[str, Any], age_ms: int | None = None) -> Action:
+        self.decided_ns.append(time.perf_counter_ns())
+        return super().decide(event, age_ms)
+
+
+def percentiles_ms(samples_ns: list[int]) -> dict[str, float | None]:
+    """Nearest-rank p50/p95/p99/max in milliseconds."""
+
+    if not samples_ns:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples_ns)
+
+    def rank(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))] / 1e6, 3)
+
+    return {"p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99), "max": round(ordered[-1] / 1e6, 3)}
+
+
+def _stage_p99_ms(metrics: Metrics) -> dict[str, float | None]:
+    result = {}
+    for stage in STAGES:
+        bound = metrics.stages[stage].quantile(0.99)
+        result[stage] = None if bound is None else bound * 1000
+    return result
+
+
+def _report(
+    target: str,
+    lines: list[bytes],
+    rate: float,
+    elapsed_s: float,
+    latencies_ns: list[int],
+    metrics: Metrics,
+    fake: FakePiShock,
+    **extra: Any,
+) -> dict[str, Any]:
+    return {
+        "target": target,
+        "events": len(lines),
+        "completed": len(latencies_ns),
+        "rate_eps": rate or None,
+        "elapsed_s": round(elapsed_s, 3),
+        "throughput_eps": round(len(latencies_ns) / elapsed_s, 1) if elapsed_s > 0 else None,
+        "latency_ms": percentiles_ms(latencies_ns),
+        "outcomes": {k: v for k, v in metrics.outcome_totals().items() if v},
+        "stage_p99_ms": _stage_p99_ms(metrics),
+        "upstream": fake.stats(),
+        **extra,
+    }
+
+
+async def _drive_http(base_url: str, lines: list[bytes], rate: float, concurrency: int) -> tuple[list[int], float]:
+    import httpx  # pylint: disable=import-outside-toplevel
+
+    latencies: list[int] = []
+    gate = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+
+        async def send(line: bytes, scheduled_ns: int) -> None:
+            signature, body = split_signed_line(line)
+            async with gate:
+                started_ns = time.perf_counter_ns() if not rate else scheduled_ns
+                await client.post("/event", content=body, headers={"X-Event-Signature": signature})
+                latencies.append(time.perf_counter_ns() - started_ns)
+
+        start_ns = time.perf_counter_ns()
+        tasks = []
+        for i, line in enumerate(lines):
+            scheduled_ns = start_ns + int(i * 1e9 / rate) if rate else start_ns
+            delay_s = (scheduled_ns - time.perf_counter_ns()) / 1e9
+            if delay_s > 0:
+                await asyncio.sleep(delay_s)
+            tasks.append(asyncio.create_task(send(line, scheduled_ns)))
+        await asyncio.gather(*tasks)
+        elapsed_s = (time.perf_counter_ns() - start_ns) / 1e9
+    return latencies, elapsed_s
+
+
+def run_http(
+    lines: list[bytes], config: ServiceConfig, fake: FakePiShock, *, rate: float, concurrency: int
+) -> dict[str, Any]:
+    """Serve `create_app(config)` with uvicorn on an ephemeral port and POST every line."""
+
+    import uvicorn  # pylint: disable=import-outside-toplevel
+
+    from ..app import create_app  # pylint: disable=import-outside-toplevel
+
+    app = create_app(config)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Pre-bound sockets skip uvicorn's own setup; without TCP_NODELAY (inherited
+    # by accepted connections) every keep-alive response stalls on delayed ACK.
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, name="bench-uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.01)
+
+    try:
+        latencies, elapsed_s = asyncio.run(_drive_http(f"http://127.0.0.1:{port}", lines, rate, concurrency))
+    finally:
+        # Lifespan shutdown drains the dispatch queue against the fake server.
+        server.should_exit = True
+        thread.join(timeout=config.dispatch.drain_timeout_s + 10)
+        sock.close()
+
+    dispatch = app.state.dispatcher.stats() if app.state.dispatcher is not None else None
+    return _report("http", lines, rate, elapsed_s, latencies, app.state.metrics, fake, dispatch=dispatch)
+
+
+def run_file(
+    lines: list[bytes],
+    config: ServiceConfig,
+    fake: FakePiShock,
+    *,
+    rate: float,
+    tail_mode: str = "auto",
+    timeout_s: float = 60.0,
+) -> dict[str, Any]:
+    """Append every line to a temp outbox tailed by `run_ingest_loop` in a thread."""
+
+    from ..file_ingest import run_ingest_loop  # pylint: disable=import-outside-toplevel
+
+    policy = _TimedPolicy(config)
+    metrics = Metrics(config.event_mappings)
+    stop = threading.Event()
+    with tempfile.TemporaryDirectory(prefix="pishock-bench-") as tmp:
+        outbox = Path(tmp) / "events.log"
+        outbox.touch()
+        ingester = threading.Thread(
+            target=run_ingest_loop,
+            args=(outbox, Path(tmp) / "outbox.offset"),
+            kwargs={"poll_interval_s": 0.05, "tail_mode": tail_mode, "policy": policy, "metrics": metrics, "stop": stop},
+            name="bench-ingest",
+            daemon=True,
+        )
+        ingester.start()
+        # Let the ingester open the outbox and arm its waiter before appending.
+        time.sleep(0.2)
+
+        appended_ns: list[int] = []
+        start_ns = time.perf_counter_ns()
+        with outbox.open("ab", buffering=0) as handle:
+            for i, line in enumerate(lines):
+                scheduled_ns = start_ns + int(i * 1e9 / rate) if rate else time.perf_counter_ns()
+                delay_s = (scheduled_ns - time.perf_counter_ns()) / 1e9
+                if delay_s > 0:
+                    time.sleep(delay_s)
+                appended_ns.append(scheduled_ns)
+                handle.write(line + b"\n")
+
+        deadline = time.monotonic() + timeout_s
+        while len(policy.decided_ns) < len(lines) and time.monotonic() < deadline and ingester.is_alive():
+            time.sleep(0.005)
+        elapsed_s = (time.perf_counter_ns() - start_ns) / 1e9
+        stop.set()
+        ingester.join(timeout=5)
+
+    decided = policy.decided_ns
+    latencies = [done - appended for appended, done in zip(appended_ns, decided)]
+    policy.close()
+    return _report("file", lines, rate, elapsed_s, latencies, metrics, fake, tail_mode=tail_mode)
+
+
+def run(
+    *,
+    target: str = "both",
+    events: int = 1000,
+    rate: float = 0.0,
+    concurrency: int = 16,
+    replay: Path | None = None,
+    secret: str = BENCH_SECRET,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    dry_run: bool = False,
+    cooldown_ms: int = 0,
+    queue_size: int = 64,
+    overflow: str = "drop_oldest",
+    tail_mode: str = "auto",
+    seed: int = 0,
+) -> dict[str, Any]:
+    """Run the selected ingress path(s) and return the JSON-ready report."""
+
+    skipped = 0
+    if replay is not None:
+        lines, skipped = load_outbox(replay, secret)
+        event_types = tuple(sorted({json.loads(split_signed_line(line)[1]).get("event_type") for line in lines}))
+    else:
+        lines = generate_lines(secret, events, seed=seed)
+        event_types = DEFAULT_MIX
+
+    # Per-event log lines would dominate the measurement.
+    logging.disable(logging.WARNING)
+
+    report: dict[str, Any] = {"source": str(replay) if replay else "generated", "replay_skipped": skipped}
+    try:
+        for path in ("http", "file") if target == "both" else (target,):
+            # A fresh upstream per path keeps its request/error counts separate.
+            with FakePiShock(latency_ms=latency_ms, jitter_ms=jitter_ms, error_rate=error_rate, seed=seed) as fake:
+                config = bench_config(
+                    fake.url,
+                    secret=secret,
+                    dry_run=dry_run,
+                    cooldown_ms=cooldown_ms,
+                    queue_size=queue_size,
+                    overflow=overflow,
+                    event_types=event_types,
+                )
+                if path == "http":
+                    report["http"] = run_http(lines, config, fake, rate=rate, concurrency=concurrency)
+                else:
+                    report["file"] = run_file(lines, config, fake, rate=rate, tail_mode=tail_mode)
+    finally:
+        logging.disable(logging.NOTSET)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline load test for /event and the file ingester")
+    parser.add_argument("--target", choices=("http", "file", "both"), default="both")
+    parser.add_argument("--events", type=int, default=1000, help="Generated events (ignored with --replay)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Events/s, open loop (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Max in-flight /event requests")
+    parser.add_argument("--replay", type=Path, default=None, help="Recorded outbox to replay instead of generating")
+    parser.add_argument("--secret", default=BENCH_SECRET, help="Shared secret the events are signed with")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Fake PiShock base latency")
+    parser.add_argument("--jitter-ms", type=float, default=40.0, help="Fake PiShock uniform jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake PiShock calls failing with 500")
+    parser.add_argument("--dry-run", action="store_true", help="Skip PiShock dispatch entirely")
+    parser.add_argument("--cooldown-ms", type=int, default=0)
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--overflow", default="drop_oldest")
+    parser.add_argument("--tail-mode", default="auto")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = run(
+        target=args.target,
+        events=args.events,
+        rate=args.rate,
+        concurrency=args.concurrency,
+        replay=args.replay,
+        secret=args.secret,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        dry_run=args.dry_run,
+        cooldown_ms=args.cooldown_ms,
+        queue_size=args.queue_size,
+        overflow=args.overflow,
+        tail_mode=args.tail_mode,
+        seed=args.seed,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Micro-benchmark: per-event HMAC verification cost, before/after.
+
+Compares the legacy per-call `hmac.new(secret.encode(), ...)` path with
+`SignatureVerifier.verify` and threaded `verify_many`, over a synthetic backlog
+of outbox-sized event bodies. Prints one JSON object with ns/event figures.
+
+    python -m middleware.bench.signature --events 20000 --body-bytes 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import hmac
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..security import SignatureVerifier
+
+
+def _legacy_verify(body: bytes, signature: str | None, shared_secret: str) -> bool:
+    # Pre-SignatureVerifier implementation, kept here as the baseline.
+    if not signature:
+        return False
+    expected = hmac.new(shared_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def _make_backlog(events: int, body_bytes: int, secret: str) -> list[tuple[bytes, str]]:
+    pairs = []
+    for i in range(events):
+        body = json.dumps(
+            {"event_type": "player_damaged", "seq": i, "context": {"pad": "x" * max(0, body_bytes - 60)}},
+            separators=(",", ":"),
+        ).encode("utf-8")
+        pairs.append((body, hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()))
+    return pairs
+
+
+def _ns_per_event(fn, events: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        fn()
+        best = min(best, time.perf_counter_ns() - started)
+    return best / events
+
+
+def run(events: int = 20_000, body_bytes: int = 200, workers: int = 4, repeat: int = 5) -> dict[str, float]:
+    """Return best-of-`repeat` ns/event for each verification strategy."""
+
+    secret = "bench-secret"
+    pairs = _make_backlog(events, body_bytes, secret)
+    verifier = SignatureVerifier(secret)
+
+    results = {
+        "events": events,
+        "body_bytes": body_bytes,
+        "legacy_ns_per_event": _ns_per_event(
+            lambda: [_legacy_verify(b, s, secret) for b, s in pairs], events, repeat
+        ),
+        "verifier_ns_per_event": _ns_per_event(lambda: [verifier.verify(b, s) for b, s in pairs], events, repeat),
+        "verify_many_ns_per_event": _ns_per_event(lambda: verifier.verify_many(pairs), events, repeat),
+    }
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results[f"verify_many_{workers}_threads_ns_per_event"] = _ns_per_event(
+            lambda: verifier.verify_many(pairs, executor=pool), events, repeat
+        )
+    results["speedup_vs_legacy"] = results["legacy_ns_per_event"] / results["verifier_ns_per_event"]
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark HMAC verification per event")
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--body-bytes", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run(args.events, args.body_bytes, args.workers, args.repeat)
+    print(json.dumps({k: round(v, 1) if isinstance(v, float) else v for k, v in results.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
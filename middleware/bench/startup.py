@@ -0,0 +1,172 @@
+"""Cold-start report: how long a fresh interpreter takes to become ready.
+
+The file ingester is relaunched every game session, so its startup is paid
+every time. Each scenario runs in a new interpreter (`--repeat` times, median
+reported) with the repo on `PYTHONPATH`:
+
+- `interpreter`: `python -c pass`, the floor every scenario includes.
+- `ingester`: import `middleware.file_ingest`, load the config through the
+  cache, build the `PolicyEngine`.
+- `config_uncached`: `load_config` (PyYAML import + parse + validation).
+- `app`: import `middleware.app` and build the app with `app_factory()`.
+
+The ingester's slowest direct imports come from `python -X importtime`. With
+`--budget-ms`, the exit status is 1 when the ingester scenario (wall time,
+interpreter included) exceeds it.
+
+    python -m middleware.bench.startup --repeat 7 --budget-ms 250
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CONFIG = REPO_ROOT / "middleware" / "config.example.yaml"
+
+# Each snippet prints a JSON object of phase timings in ms; the wall time of
+# the whole process (interpreter start included) is measured by the parent.
+SCENARIOS = {
+    "interpreter": "pass",
+    "ingester": """
+import json, os, time
+t0 = time.perf_counter()
+import middleware.file_ingest
+t1 = time.perf_counter()
+from middleware.config import load_config_cached
+from middleware.policy import PolicyEngine
+PolicyEngine(load_config_cached(os.environ["MIDDLEWARE_CONFIG"]))
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1e3, "config_ms": (t2 - t1) * 1e3}))
+""",
+    "config_uncached": """
+import json, os, time
+from middleware.config import load_config
+t0 = time.perf_counter()
+load_config(os.environ["MIDDLEWARE_CONFIG"])
+print(json.dumps({"config_ms": (time.perf_counter() - t0) * 1e3}))
+""",
+    "app": """
+import json, time
+t0 = time.perf_counter()
+import middleware.app
+t1 = time.perf_counter()
+middleware.app.app_factory()
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1e3, "factory_ms": (t2 - t1) * 1e3}))
+""",
+}
+
+
+def _env(config: Path) -> dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+    env["MIDDLEWARE_CONFIG"] = str(config)
+    return env
+
+
+def _run_once(code: str, env: dict[str, str], cwd: str) -> dict[str, float]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", code], env=env, cwd=cwd, capture_output=True, text=True, check=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1e3
+    lines = proc.stdout.strip().splitlines()
+    phases = json.loads(lines[-1]) if lines else {}
+    return {"wall_ms": wall_ms, **phases}
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """`(module, self_us, cumulative_us)` rows from `python -X importtime` output.
+
+    Nested imports keep their leading indentation in `module`.
+    """
+
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            self_us, cumulative_us, module = line[len("import time:") :].split("|")
+            # Nesting is shown by indentation after the single separator space.
+            rows.append((module[1:].rstrip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue  # the header row
+    return rows
+
+
+def slowest_imports(module: str, env: dict[str, str], cwd: str, top: int) -> list[dict[str, object]]:
+    """Direct imports of `module`, slowest cumulative first."""
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # importtime lists a module's subtree right before the module's own row;
+    # its direct children are indented one level (two spaces).
+    parsed = parse_importtime(proc.stderr)
+    end = next(i for i, (name, _, _) in enumerate(parsed) if name == module)
+    start = end
+    while start > 0 and parsed[start - 1][0].startswith(" "):
+        start -= 1
+    rows = [
+        (name.strip(), cumulative)
+        for name, _, cumulative in parsed[start:end]
+        if name.startswith("  ") and not name.startswith("   ")
+    ]
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 2)} for name, us in rows[:top]]
+
+
+def run_report(config: Path = DEFAULT_CONFIG, repeat: int = 5, top: int = 10) -> dict[str, object]:
+    """Median timings per scenario plus the ingester's slowest imports."""
+
+    env = _env(config)
+    report: dict[str, object] = {"python": sys.version.split()[0], "repeat": repeat}
+    # A scratch cwd keeps `logs/` (created by the app) out of the repo.
+    with tempfile.TemporaryDirectory() as cwd:
+        # Warm the on-disk config cache and the OS page cache once.
+        _run_once(SCENARIOS["ingester"], env, cwd)
+        scenarios = {}
+        for name, code in SCENARIOS.items():
+            samples = [_run_once(code, env, cwd) for _ in range(repeat)]
+            scenarios[name] = {
+                key: round(statistics.median(sample[key] for sample in samples), 2) for key in samples[0]
+            }
+        report["scenarios"] = scenarios
+        report["slowest_imports"] = slowest_imports("middleware.file_ingest", env, cwd, top)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report middleware cold-start and import times")
+    parser.add_argument("--config", type=Path, default=DEFAULT_CONFIG)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if ingester startup exceeds this")
+    args = parser.parse_args()
+
+    report = run_report(args.config, args.repeat, args.top)
+    if args.budget_ms is not None:
+        wall_ms = report["scenarios"]["ingester"]["wall_ms"]
+        report["budget_ms"] = args.budget_ms
+        report["within_budget"] = wall_ms <= args.budget_ms
+    print(json.dumps(report, indent=2))
+    if report.get("within_budget") is False:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
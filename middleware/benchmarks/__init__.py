@@ -0,0 +1 @@
+"""Opt-in micro-benchmark regression suite (`pytest -m benchmark`)."""
@@ -0,0 +1,144 @@
+"""Benchmark fixtures: timing, baseline comparison and JSON results.
+
+Run with `python -m pytest -m benchmark`. Environment knobs:
+
+- `BENCH_THRESHOLD`: allowed slowdown vs. baseline as a fraction (default 0.25).
+- `BENCH_UPDATE_BASELINE=1`: rewrite `baseline.json` from this run instead of comparing.
+- `BENCH_RESULTS`: where to write this run's results (default `.results/latest.json` here).
+
+Timings are process CPU time (`time.process_time_ns`), so time spent
+descheduled does not count. Shared and virtualized machines still drift in
+speed from run to run, so each benchmark is also timed against a fixed
+pure-Python reference workload, measured in alternation with it so both see
+the same machine state, and regressions are judged on that normalized cost
+(`rel`). Raw CPU ns/call is reported alongside
+for tracking absolute cost. Baselines remain machine-specific: refresh them on
+the machine that compares.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).parent
+BASELINE_PATH = HERE / "baseline.json"
+
+# Each repeat runs for roughly this long; the best repeat is reported.
+TARGET_REPEAT_NS = 50_000_000
+REPEATS = 5
+
+_results: dict[str, dict[str, float | None]] = {}
+
+
+def _machine() -> dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+
+
+def _load_baseline() -> dict[str, dict[str, float]]:
+    try:
+        return json.loads(BASELINE_PATH.read_text(encoding="utf-8"))["results"]
+    except FileNotFoundError:
+        return {}
+
+
+def _reference() -> int:
+    # Interpreter-bound mix (calls, dict and string work) similar to the hot path.
+    total = 0
+    data = {"a": 1, "b": 2}
+    for i in range(50):
+        total += data.get("a", 0) + len(str(i))
+    return total
+
+
+def _calibrate(fn: Callable[[], object]) -> int:
+    """Loop count that makes one repeat of `fn` take about `TARGET_REPEAT_NS`."""
+
+    loops = 1
+    while True:
+        started = time.process_time_ns()
+        for _ in range(loops):
+            fn()
+        elapsed = time.process_time_ns() - started
+        if elapsed >= TARGET_REPEAT_NS // 10 or loops >= 1 << 24:
+            break
+        loops *= 10
+    return max(1, int(loops * TARGET_REPEAT_NS / max(elapsed, 1)))
+
+
+def _repeat_ns(fn: Callable[[], object], loops: int) -> float:
+    started = time.process_time_ns()
+    for _ in range(loops):
+        fn()
+    return (time.process_time_ns() - started) / loops
+
+
+def measure_ns(*fns: Callable[[], object]) -> list[float]:
+    """Best-of-`REPEATS` CPU nanoseconds per call of each of `fns`.
+
+    Repeats alternate between the functions, so a machine that slows down
+    midway slows all of them alike.
+    """
+
+    loops = [_calibrate(fn) for fn in fns]
+    best = [float("inf")] * len(fns)
+    for _ in range(REPEATS):
+        for i, fn in enumerate(fns):
+            best[i] = min(best[i], _repeat_ns(fn, loops[i]))
+    return best
+
+
+@pytest.fixture
+def bench() -> Callable[[str, Callable[[], object]], float]:
+    """`bench(name, fn)`: time `fn`, record it, and fail on regression vs. the baseline."""
+
+    threshold = float(os.getenv("BENCH_THRESHOLD", "0.25"))
+    updating = os.getenv("BENCH_UPDATE_BASELINE") == "1"
+    baseline = _load_baseline()
+
+    def run(name: str, fn: Callable[[], object]) -> float:
+        reference_ns, ns = measure_ns(_reference, fn)
+        rel = ns / reference_ns
+        base = baseline.get(name) or {}
+        base_rel = base.get("rel")
+        _results[name] = {
+            "ns_per_call": round(ns, 1),
+            "rel": round(rel, 4),
+            "baseline_ns": base.get("ns_per_call"),
+            "baseline_rel": base_rel,
+            "ratio": round(rel / base_rel, 3) if base_rel else None,
+        }
+        if not updating and base_rel and rel > base_rel * (1 + threshold):
+            pytest.fail(
+                f"{name}: {ns:.0f} ns/call, {rel / base_rel - 1:+.0%} vs baseline (normalized) > {threshold:.0%}"
+            )
+        return ns
+
+    return run
+
+
+def pytest_sessionfinish(session: pytest.Session, exitstatus: int) -> None:  # pylint: disable=unused-argument
+    if not _results:
+        return
+
+    results_path = Path(os.getenv("BENCH_RESULTS", HERE / ".results" / "latest.json"))
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"machine": _machine(), "results": _results}
+    results_path.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+    if os.getenv("BENCH_UPDATE_BASELINE") == "1":
+        fresh = {name: {"ns_per_call": r["ns_per_call"], "rel": r["rel"]} for name, r in _results.items()}
+        merged = {**_load_baseline(), **fresh}
+        baseline = {"machine": _machine(), "results": dict(sorted(merged.items()))}
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2) + "\n", encoding="utf-8")
@@ -0,0 +1,112 @@
+"""Per-call CPU cost of the event hot path, compared against `baseline.json`."""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import logging
+
+import pytest
+
+from middleware.config import PiShockCredentials, ServiceConfig, load_config
+from middleware.events import Event, decode_event
+from middleware.file_ingest import _process_line
+from middleware.logs import JsonFormatter
+from middleware.policy import CooldownError, PolicyEngine
+from middleware.security import verify_signature
+
+pytestmark = pytest.mark.benchmark
+
+SECRET = "bench-secret"
+EVENT = {
+    "event_type": "player_damaged",
+    "ts_ms": 1700000000000,
+    "session_id": "bench",
+    "armed": True,
+    "context": {"source": "cet", "damage": 100, "max_health": 400},
+}
+BODY = json.dumps(EVENT, separators=(",", ":")).encode("utf-8")
+SIGNATURE = hmac.new(SECRET.encode("utf-8"), BODY, hashlib.sha256).hexdigest()
+# Ingress paths hand `decide` a decoded `Event`, not the raw dict.
+DECODED = Event.from_mapping(EVENT)
+
+
+def _config(**mappings: dict) -> ServiceConfig:
+    return ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=8787,
+        shared_secret=SECRET,
+        dry_run=True,
+        allow_shock=True,
+        max_intensity=20,
+        max_duration_ms=2000,
+        default_cooldown_ms=0,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
+        event_mappings=mappings,
+    )
+
+
+def test_verify_signature(bench):
+    bench("verify_signature", lambda: verify_signature(BODY, SIGNATURE, SECRET))
+
+
+def test_decode_event(bench):
+    bench("decode_event", lambda: decode_event(BODY))
+
+
+def test_decide_plain(bench):
+    policy = PolicyEngine(_config(player_healed={"mode": "vibrate", "intensity": 5, "duration_ms": 300}))
+    event = Event("player_healed")
+    bench("decide_plain", lambda: policy.decide(event))
+
+
+def test_decide_cooldown_rejected(bench):
+    policy = PolicyEngine(
+        _config(player_healed={"mode": "vibrate", "intensity": 5, "duration_ms": 300, "cooldown_ms": 3_600_000})
+    )
+    event = Event("player_healed")
+    policy.decide(event)
+
+    def rejected() -> None:
+        try:
+            policy.decide(event)
+        except CooldownError:
+            pass
+
+    bench("decide_cooldown_rejected", rejected)
+
+
+def test_decide_damage_scaled_shock(bench):
+    policy = PolicyEngine(_config(player_damaged={"mode": "shock", "intensity": 8, "duration_ms": 400}))
+    bench("decide_damage_scaled_shock", lambda: policy.decide(DECODED))
+
+
+def test_process_line(bench):
+    config = _config(player_damaged={"mode": "shock", "intensity": 8, "duration_ms": 400})
+    policy = PolicyEngine(config)
+    logger = logging.getLogger("middleware.benchmarks.ingest")
+    logger.propagate = False
+    logger.addHandler(logging.NullHandler())
+    logger.setLevel(logging.INFO)
+    line = SIGNATURE.encode("ascii") + b"\t" + BODY + b"\n"
+    bench("process_line", lambda: _process_line(line, policy, config, logger))
+
+
+def test_json_formatter_format(bench):
+    formatter = JsonFormatter()
+    record = logging.LogRecord("middleware", logging.INFO, __file__, 1, "event_accepted", None, None)
+    record.event_type = "player_damaged"
+    record.action = {"mode": "shock", "intensity": 20, "duration_ms": 400, "target": "c", "priority": 0}
+
+    def format_uncached() -> str:
+        # The formatter caches its output on the record; time a cold format.
+        record.__dict__.pop("_json_line", None)
+        return formatter.format(record)
+
+    bench("json_formatter_format", format_uncached)
+
+
+def test_load_config(bench):
+    bench("load_config", lambda: load_config("middleware/config.example.yaml"))
@@ -0,0 +1,154 @@
+"""Ingest checkpoints: group-committed, atomically written outbox offsets.
+
+A checkpoint records the byte offset of the next unread line together with the
+identity of the file it points into (inode + size at write time), so a
+restarted ingester can tell "same file, resume" from "file was replaced or
+truncated, start over". For a segmented outbox it also records the segment
+number the offset refers to.
+
+Writes go to a temp file that is renamed over the checkpoint, so a crash leaves
+either the old or the new checkpoint on disk, never a torn one.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass(frozen=True)
+class CheckpointState:
+    """Persisted ingest position and the identity of the file it refers to."""
+
+    offset: int = 0
+    inode: int | None = None
+    size: int | None = None
+    # Segment number for a segmented outbox; None for the single-file outbox.
+    segment: int | None = None
+
+    def matches(self, stat: os.stat_result) -> bool:
+        """True if this checkpoint can resume reading the file described by `stat`.
+
+        The outbox only grows, so a file now smaller than it was at commit time
+        was truncated (and possibly rewritten past `offset`) under the same inode.
+        """
+
+        if self.inode is not None and self.inode != stat.st_ino:
+            return False
+        if self.size is not None and self.size > stat.st_size:
+            return False
+        return self.offset <= stat.st_size
+
+
+def load_checkpoint(path: Path) -> CheckpointState:
+    """Read a checkpoint; missing or unreadable files start from offset 0.
+
+    Accepts the legacy format (a bare integer offset) for upgrades in place.
+    """
+
+    try:
+        text = path.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return CheckpointState()
+    if not text:
+        return CheckpointState()
+    if text.isdigit():
+        return CheckpointState(offset=int(text))
+    try:
+        raw = json.loads(text)
+        return CheckpointState(
+            offset=int(raw["offset"]), inode=raw.get("inode"), size=raw.get("size"), segment=raw.get("segment")
+        )
+    except (ValueError, KeyError, TypeError):
+        return CheckpointState()
+
+
+def write_checkpoint(path: Path, state: CheckpointState, *, fsync: bool = False) -> None:
+    """Atomically replace `path` with `state` (temp file + rename)."""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    record = {"offset": state.offset, "inode": state.inode, "size": state.size}
+    if state.segment is not None:
+        record["segment"] = state.segment
+    data = json.dumps(record, separators=(",", ":"))
+    with tmp.open("w", encoding="utf-8") as handle:
+        handle.write(data)
+        if fsync:
+            handle.flush()
+            os.fsync(handle.fileno())
+    os.replace(tmp, path)
+    if fsync and hasattr(os, "O_DIRECTORY"):
+        # Persist the rename itself (POSIX); Windows has no directory fsync.
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class Checkpointer:
+    """Batches offset updates and commits them every N lines or T ms.
+
+    Callers report progress with `update()` after each line and call `flush()`
+    when the tail goes idle and on shutdown. `before_commit` runs ahead of
+    every offset write, to persist state that must never lag the offset.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        every_lines: int = 64,
+        every_ms: int = 250,
+        fsync: bool = False,
+        before_commit: Callable[[], None] | None = None,
+    ) -> None:
+        self.path = path
+        self.before_commit = before_commit
+        self.every_lines = max(1, every_lines)
+        self.every_ms = every_ms
+        self.fsync = fsync
+        self.committed = load_checkpoint(path)
+        # Segment that `update` offsets refer to; moved on by `switch`.
+        self.segment = self.committed.segment
+        self._pending: CheckpointState | None = None
+        self._pending_lines = 0
+        self._last_commit = time.monotonic()
+        self.commits = 0
+
+    def update(self, offset: int, inode: int | None = None, size: int | None = None) -> None:
+        """Record progress; commits when the line or time threshold is reached."""
+
+        self._pending = CheckpointState(offset=offset, inode=inode, size=size, segment=self.segment)
+        self._pending_lines += 1
+        if (
+            self._pending_lines >= self.every_lines
+            or (time.monotonic() - self._last_commit) * 1000 >= self.every_ms
+        ):
+            self.flush()
+
+    def switch(self, segment: int | None, inode: int | None = None, size: int | None = None) -> None:
+        """Move on to the start of `segment` and commit that position now."""
+
+        self.segment = segment
+        self._pending = CheckpointState(offset=0, inode=inode, size=size, segment=segment)
+        self.flush()
+
+    def flush(self) -> None:
+        """Commit pending progress, if any."""
+
+        if self._pending is None:
+            return
+        if self.before_commit is not None:
+            self.before_commit()
+        write_checkpoint(self.path, self._pending, fsync=self.fsync)
+        self.committed = self._pending
+        self._pending = None
+        self._pending_lines = 0
+        self._last_commit = time.monotonic()
+        self.commits += 1
@@ -1,15 +1,34 @@
 """Configuration models and loading helpers for the local middleware service.
 
 This module keeps all config parsing in one place so app/policy code can rely on
-strongly typed data structures. The primary source is a YAML file.
+strongly typed data structures. The primary source is a YAML file;
+`load_config_cached` keeps a validated JSON copy in the user's cache directory
+so restarts skip importing PyYAML and parsing altogether.
 """
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import Any
 
+# Dispatcher behavior when a per-target queue is full.
+OVERFLOW_POLICIES = ("reject", "drop_oldest", "drop_lowest_priority")
+# Where cooldown timestamps live; mmap/sqlite are shared between processes.
+COOLDOWN_BACKENDS = ("memory", "mmap", "sqlite")
+
+MAPPING_MODES = ("shock", "vibrate", "beep")
+MAPPING_KEYS = frozenset(
+    {"mode", "intensity", "duration_ms", "cooldown_ms", "target", "priority", "coalesce_window_ms", "max_age_ms"}
+)
+
+
+class ConfigError(ValueError):
+    """Raised when a config file is invalid; the message names the offending key."""
+
 
 @dataclass(frozen=True)
 class PiShockCredentials:
@@ -21,6 +40,114 @@ class PiShockCredentials:
     name: str = "CyberpunkBridge"
 
 
+@dataclass(frozen=True)
+class TransportConfig:
+    """Pooled HTTP client settings for PiShock dispatch."""
+
+    url: str = "https://do.pishock.com/api/apioperate"
+    # Per-request deadline; a slow upstream fails the action after this.
+    timeout_s: float = 5.0
+    max_connections: int = 4
+    max_keepalive_connections: int = 4
+    keepalive_expiry_s: float = 30.0
+    # Attempts per action (1 = no retry). Only failures where the request was
+    # provably not processed (connect errors, HTTP 429/503) are retried.
+    max_attempts: int = 3
+    # Full-jitter exponential backoff between attempts: uniform(0, min(max, base * 2**n)).
+    backoff_ms: int = 100
+    backoff_max_ms: int = 1000
+    # Consecutive upstream failures that open the endpoint's circuit breaker,
+    # and how long it fails fast before letting a probe through.
+    breaker_failures: int = 5
+    breaker_reset_s: float = 10.0
+
+
+@dataclass(frozen=True)
+class DispatchConfig:
+    """Bounded background queue settings between `/event` and PiShock."""
+
+    queue_size: int = 16
+    workers_per_target: int = 1
+    # One of: reject, drop_oldest, drop_lowest_priority.
+    overflow: str = "drop_oldest"
+    drain_timeout_s: float = 5.0
+    # Actions not delivered within this long after their event arrived are
+    # dropped instead of sent late; 0 disables.
+    deadline_ms: int = 2000
+
+
+@dataclass(frozen=True)
+class BucketSpec:
+    """Token bucket: up to `burst` actuations at once, refilled at `per_minute`."""
+
+    burst: int
+    per_minute: float
+
+
+@dataclass(frozen=True)
+class RateLimitConfig:
+    """Optional token-bucket limits applied on top of per-mapping cooldowns."""
+
+    # Keyed by (event_type, target).
+    per_event: BucketSpec | None = None
+    # Keyed by target device, e.g. "no more than 10 actuations per minute per device".
+    per_target: BucketSpec | None = None
+    # One bucket shared by every event and target (YAML key: `global`).
+    overall: BucketSpec | None = None
+
+
+@dataclass(frozen=True)
+class CooldownBackendConfig:
+    """Cooldown storage; `mmap`/`sqlite` share cooldowns between processes."""
+
+    # One of: memory, mmap, sqlite.
+    kind: str = "memory"
+    # State file for mmap/sqlite; every process sharing cooldowns uses the same one.
+    path: str | None = None
+    # Fixed slot count of the mmap table (set when the file is created).
+    slots: int = 1024
+
+
+@dataclass(frozen=True)
+class JournalConfig:
+    """Binary decision journal (see `middleware.journal`)."""
+
+    enabled: bool = False
+    # Directory holding segment files, the string table and the index.
+    path: str = "journal"
+    # A segment is sealed and a new one started past this size.
+    segment_mb: int = 16
+    # Records waiting for the writer thread; beyond this they are dropped and counted.
+    queue_size: int = 10_000
+
+
+@dataclass(frozen=True)
+class DedupeConfig:
+    """Replay protection keyed by the emitter's `session_id`/`seq` (see `middleware.dedupe`)."""
+
+    enabled: bool = True
+    # Directory for the persisted index (one file per ingress path). Unset:
+    # the file ingester keeps it next to its offset file, the app in memory.
+    path: str | None = None
+    # How far (in seq numbers) an event may arrive out of order and still count.
+    window: int = 256
+    # Sessions tracked; the least recently seen is forgotten beyond this.
+    max_sessions: int = 64
+
+
+@dataclass(frozen=True)
+class DatagramConfig:
+    """Local datagram ingress (see `middleware.datagram`); off unless a listener is set."""
+
+    # Loopback UDP listener; 0 disables it.
+    udp_port: int = 0
+    udp_host: str = "127.0.0.1"
+    # Unix domain datagram socket (not available on Windows); unset disables it.
+    unix_path: str | None = None
+    # Answer each datagram from a sender with an address with "<status> <reason>".
+    reply: bool = True
+
+
 @dataclass(frozen=True)
 class ServiceConfig:
     """Top-level service configuration loaded from YAML."""
@@ -38,6 +165,245 @@ class ServiceConfig:
     session_max_shock_level: int
     pishock: PiShockCredentials
     event_mappings: dict[str, dict[str, Any]]
+    transport: TransportConfig = field(default_factory=TransportConfig)
+    dispatch: DispatchConfig = field(default_factory=DispatchConfig)
+    rate_limits: RateLimitConfig = field(default_factory=RateLimitConfig)
+    cooldown_backend: CooldownBackendConfig = field(default_factory=CooldownBackendConfig)
+    journal: JournalConfig = field(default_factory=JournalConfig)
+    dedupe: DedupeConfig = field(default_factory=DedupeConfig)
+    datagram: DatagramConfig = field(default_factory=DatagramConfig)
+
+
+@dataclass(frozen=True, slots=True)
+class MappingRule:
+    """One `event_mappings` entry compiled for the policy hot path.
+
+    Intensity and duration are already clamped to the service caps, the target
+    is resolved, and `damage_scaled` marks `player_damaged -> shock` mappings
+    whose intensity is computed from the event instead. `max_age_ms` (0 = no
+    limit) drops events that are older than that when decided.
+    """
+
+    event_type: str
+    mode: str
+    intensity: int
+    duration_ms: int
+    target: str
+    cooldown_ms: int
+    priority: int
+    coalesce_window_ms: int
+    damage_scaled: bool
+    max_age_ms: int = 0
+
+
+def _int_field(event_type: str, mapping: dict[str, Any], name: str, default: int) -> int:
+    value = mapping.get(name, default)
+    if isinstance(value, bool):
+        raise ConfigError(f"event_mappings.{event_type}.{name}: expected an integer, got {value!r}")
+    try:
+        return int(value)
+    except (TypeError, ValueError) as exc:
+        raise ConfigError(f"event_mappings.{event_type}.{name}: expected an integer, got {value!r}") from exc
+
+
+def compile_event_mappings(config: ServiceConfig) -> dict[str, MappingRule]:
+    """Validate `config.event_mappings` and compile it into `MappingRule`s.
+
+    Raises `ConfigError` naming the offending mapping key.
+    """
+
+    if not isinstance(config.event_mappings, dict):
+        raise ConfigError("event_mappings: expected a mapping of event_type -> settings")
+
+    rules: dict[str, MappingRule] = {}
+    for event_type, mapping in config.event_mappings.items():
+        if not isinstance(mapping, dict):
+            raise ConfigError(f"event_mappings.{event_type}: expected a mapping, got {type(mapping).__name__}")
+        unknown = set(mapping) - MAPPING_KEYS
+        if unknown:
+            raise ConfigError(f"event_mappings.{event_type}: unknown key(s) {', '.join(sorted(map(str, unknown)))}")
+
+        mode = mapping.get("mode", "beep")
+        if mode not in MAPPING_MODES:
+            raise ConfigError(f"event_mappings.{event_type}.mode: expected one of {MAPPING_MODES}, got {mode!r}")
+
+        intensity = _int_field(event_type, mapping, "intensity", 1)
+        duration_ms = _int_field(event_type, mapping, "duration_ms", 300)
+        cooldown_ms = _int_field(event_type, mapping, "cooldown_ms", config.default_cooldown_ms)
+        coalesce_window_ms = _int_field(event_type, mapping, "coalesce_window_ms", 0)
+        max_age_ms = _int_field(event_type, mapping, "max_age_ms", 0)
+        if cooldown_ms < 0 or coalesce_window_ms < 0 or max_age_ms < 0:
+            raise ConfigError(f"event_mappings.{event_type}: cooldown_ms/coalesce_window_ms/max_age_ms must be >= 0")
+
+        rules[event_type] = MappingRule(
+            event_type=event_type,
+            mode=mode,
+            # Hard caps prevent unsafe or invalid values from config mistakes.
+            intensity=min(max(1, intensity), config.max_intensity),
+            duration_ms=min(max(100, duration_ms), config.max_duration_ms),
+            target=str(mapping.get("target", config.pishock.code)),
+            cooldown_ms=cooldown_ms,
+            priority=_int_field(event_type, mapping, "priority", 0),
+            coalesce_window_ms=coalesce_window_ms,
+            damage_scaled=mode == "shock" and event_type == "player_damaged",
+            max_age_ms=max_age_ms,
+        )
+    return rules
+
+
+def _unique_key_loader(yaml: Any) -> type:
+    """SafeLoader variant that rejects duplicate mapping keys instead of keeping the last.
+
+    Built on the libyaml-backed `CSafeLoader` when PyYAML was compiled with it.
+    """
+
+    class UniqueKeyLoader(getattr(yaml, "CSafeLoader", yaml.SafeLoader)):  # pylint: disable=too-many-ancestors
+        pass
+
+    def construct_mapping(loader: Any, node: Any, deep: bool = False) -> dict[Any, Any]:
+        seen: set[Any] = set()
+        for key_node, _ in node.value:
+            key = loader.construct_object(key_node, deep=deep)
+            if key in seen:
+                raise ConfigError(f"duplicate key {key!r} at line {key_node.start_mark.line + 1}")
+            seen.add(key)
+        return yaml.constructor.SafeConstructor.construct_mapping(loader, node, deep=deep)
+
+    UniqueKeyLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, construct_mapping)
+    return UniqueKeyLoader
+
+
+def _bucket_spec(section: str, raw: Any) -> BucketSpec | None:
+    if raw is None:
+        return None
+    try:
+        spec = BucketSpec(burst=int(raw["burst"]), per_minute=float(raw["per_minute"]))
+    except (KeyError, TypeError, ValueError) as exc:
+        raise ConfigError(f"rate_limits.{section}: expected numeric burst and per_minute") from exc
+    if spec.burst < 1 or spec.per_minute < 0:
+        raise ConfigError(f"rate_limits.{section}: burst must be >= 1 and per_minute >= 0")
+    return spec
+
+
+def _rate_limit_config(raw: dict[str, Any]) -> RateLimitConfig:
+    unknown = set(raw) - {"per_event", "per_target", "global"}
+    if unknown:
+        raise ConfigError(f"rate_limits: unknown key(s) {', '.join(sorted(map(str, unknown)))}")
+    return RateLimitConfig(
+        per_event=_bucket_spec("per_event", raw.get("per_event")),
+        per_target=_bucket_spec("per_target", raw.get("per_target")),
+        overall=_bucket_spec("global", raw.get("global")),
+    )
+
+
+def _require_int(section: str, value: Any, key: str, minimum: int) -> None:
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise ConfigError(f"{section}.{key} must be an integer >= {minimum}, got {value!r}")
+
+
+def _require_seconds(section: str, value: Any, key: str, *, positive: bool) -> None:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0 or (positive and value == 0):
+        raise ConfigError(f"{section}.{key} must be a number {'>' if positive else '>='} 0, got {value!r}")
+
+
+def _transport_config(raw: dict[str, Any]) -> TransportConfig:
+    try:
+        transport = TransportConfig(**raw)
+    except TypeError as exc:
+        raise ConfigError(f"transport: {exc}") from exc
+    if not isinstance(transport.url, str) or not transport.url:
+        raise ConfigError(f"transport.url must be a non-empty URL, got {transport.url!r}")
+    for key, minimum in (
+        ("max_connections", 1),
+        ("max_keepalive_connections", 0),
+        ("max_attempts", 1),
+        ("backoff_ms", 0),
+        ("backoff_max_ms", 0),
+        ("breaker_failures", 1),
+    ):
+        _require_int("transport", getattr(transport, key), key, minimum)
+    _require_seconds("transport", transport.timeout_s, "timeout_s", positive=True)
+    _require_seconds("transport", transport.keepalive_expiry_s, "keepalive_expiry_s", positive=False)
+    _require_seconds("transport", transport.breaker_reset_s, "breaker_reset_s", positive=False)
+    return transport
+
+
+def _dispatch_config(raw: dict[str, Any]) -> DispatchConfig:
+    try:
+        dispatch = DispatchConfig(**raw)
+    except TypeError as exc:
+        raise ConfigError(f"dispatch: {exc}") from exc
+    if dispatch.overflow not in OVERFLOW_POLICIES:
+        raise ConfigError(f"dispatch.overflow must be one of {OVERFLOW_POLICIES}, got {dispatch.overflow!r}")
+    _require_int("dispatch", dispatch.queue_size, "queue_size", 1)
+    _require_int("dispatch", dispatch.workers_per_target, "workers_per_target", 1)
+    _require_int("dispatch", dispatch.deadline_ms, "deadline_ms", 0)
+    _require_seconds("dispatch", dispatch.drain_timeout_s, "drain_timeout_s", positive=False)
+    return dispatch
+
+
+def _cooldown_backend_config(raw: dict[str, Any]) -> CooldownBackendConfig:
+    try:
+        backend = CooldownBackendConfig(**raw)
+    except TypeError as exc:
+        raise ConfigError(f"cooldown_backend: {exc}") from exc
+    if backend.kind not in COOLDOWN_BACKENDS:
+        raise ConfigError(f"cooldown_backend.kind must be one of {COOLDOWN_BACKENDS}, got {backend.kind!r}")
+    if backend.kind != "memory" and not backend.path:
+        raise ConfigError(f"cooldown_backend.path is required for kind {backend.kind!r}")
+    if int(backend.slots) < 1:
+        raise ConfigError("cooldown_backend.slots must be >= 1")
+    return backend
+
+
+def _journal_config(raw: dict[str, Any]) -> JournalConfig:
+    try:
+        journal = JournalConfig(**raw)
+    except TypeError as exc:
+        raise ConfigError(f"journal: {exc}") from exc
+    if not isinstance(journal.enabled, bool):
+        raise ConfigError(f"journal.enabled must be true or false, got {journal.enabled!r}")
+    if not journal.path:
+        raise ConfigError("journal.path must not be empty")
+    for key in ("segment_mb", "queue_size"):
+        _require_int("journal", getattr(journal, key), key, 1)
+    return journal
+
+
+def _dedupe_config(raw: dict[str, Any]) -> DedupeConfig:
+    try:
+        dedupe = DedupeConfig(**raw)
+    except TypeError as exc:
+        raise ConfigError(f"dedupe: {exc}") from exc
+    if not isinstance(dedupe.enabled, bool):
+        raise ConfigError(f"dedupe.enabled must be true or false, got {dedupe.enabled!r}")
+    for key in ("window", "max_sessions"):
+        _require_int("dedupe", getattr(dedupe, key), key, 1)
+    return dedupe
+
+
+def _datagram_config(raw: dict[str, Any]) -> DatagramConfig:
+    # Imported here: only a full (uncached) load validates the section.
+    import ipaddress  # pylint: disable=import-outside-toplevel
+
+    try:
+        datagram = DatagramConfig(**raw)
+    except TypeError as exc:
+        raise ConfigError(f"datagram: {exc}") from exc
+    port = datagram.udp_port
+    if isinstance(port, bool) or not isinstance(port, int) or not 0 <= port <= 65535:
+        raise ConfigError(f"datagram.udp_port must be an integer from 0 to 65535, got {port!r}")
+    try:
+        loopback = datagram.udp_host == "localhost" or ipaddress.ip_address(datagram.udp_host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise ConfigError(f"datagram.udp_host must be a loopback address, got {datagram.udp_host!r}")
+    if datagram.unix_path is not None and (not isinstance(datagram.unix_path, str) or not datagram.unix_path):
+        raise ConfigError(f"datagram.unix_path must be a non-empty path, got {datagram.unix_path!r}")
+    if not isinstance(datagram.reply, bool):
+        raise ConfigError(f"datagram.reply must be true or false, got {datagram.reply!r}")
+    return datagram
 
 
 def load_config(path: str | Path) -> ServiceConfig:
@@ -52,12 +418,14 @@ def load_config(path: str | Path) -> ServiceConfig:
     except ModuleNotFoundError as exc:
         raise RuntimeError("PyYAML is required to load middleware config files") from exc
 
-    raw = yaml.safe_load(Path(path).read_text(encoding="utf-8"))
+    raw = yaml.load(Path(path).read_text(encoding="utf-8"), Loader=_unique_key_loader(yaml))
 
     pishock = PiShockCredentials(**raw["pishock"])
     service = raw["service"]
+    transport = _transport_config(raw.get("transport") or {})
+    dispatch = _dispatch_config(raw.get("dispatch") or {})
 
-    return ServiceConfig(
+    config = ServiceConfig(
         bind_host=service.get("bind_host", "127.0.0.1"),
         bind_port=int(service.get("bind_port", 8787)),
         shared_secret=service["shared_secret"],
@@ -69,4 +437,106 @@ def load_config(path: str | Path) -> ServiceConfig:
         session_max_shock_level=int(service.get("session_max_shock_level", 100)),
         pishock=pishock,
         event_mappings=raw.get("event_mappings", {}),
+        transport=transport,
+        dispatch=dispatch,
+        rate_limits=_rate_limit_config(raw.get("rate_limits") or {}),
+        cooldown_backend=_cooldown_backend_config(raw.get("cooldown_backend") or {}),
+        journal=_journal_config(raw.get("journal") or {}),
+        dedupe=_dedupe_config(raw.get("dedupe") or {}),
+        datagram=_datagram_config(raw.get("datagram") or {}),
+    )
+    # Surface mapping mistakes at startup rather than on the first matching event.
+    compile_event_mappings(config)
+    return config
+
+
+def _config_from_dict(raw: dict[str, Any]) -> ServiceConfig:
+    limits = raw["rate_limits"]
+    return ServiceConfig(
+        **{
+            **raw,
+            "pishock": PiShockCredentials(**raw["pishock"]),
+            "transport": TransportConfig(**raw["transport"]),
+            "dispatch": DispatchConfig(**raw["dispatch"]),
+            "rate_limits": RateLimitConfig(**{k: BucketSpec(**v) if v else None for k, v in limits.items()}),
+            "cooldown_backend": CooldownBackendConfig(**raw["cooldown_backend"]),
+            "journal": JournalConfig(**raw["journal"]),
+            "dedupe": DedupeConfig(**raw["dedupe"]),
+            "datagram": DatagramConfig(**raw["datagram"]),
+        }
     )
+
+
+def _cache_key(source: bytes) -> str:
+    # This module's own source is part of the key: a new field, default or
+    # validation rule invalidates every cached config.
+    digest = hashlib.sha256(Path(__file__).read_bytes())
+    digest.update(source)
+    return digest.hexdigest()
+
+
+def cache_dir() -> Path:
+    """Per-user directory for cached configs: `MIDDLEWARE_CACHE_DIR`, else the platform cache dir.
+
+    The cache holds the same secrets as the config, so it is kept out of the
+    config's directory (often a git checkout).
+    """
+
+    override = os.getenv("MIDDLEWARE_CACHE_DIR")
+    if override:
+        return Path(override)
+    if os.name == "nt":
+        base = os.getenv("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    else:
+        base = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "pishock-middleware"
+
+
+def default_cache_path(path: str | Path) -> Path:
+    """`config-<hash of the resolved config path>.json` under `cache_dir()`."""
+
+    path = Path(path).resolve()
+    digest = hashlib.sha256(str(path).encode("utf-8")).hexdigest()[:16]
+    return cache_dir() / f"config-{digest}.json"
+
+
+def load_config_cached(path: str | Path, cache_path: str | Path | None = None) -> ServiceConfig:
+    """`load_config`, reusing a validated copy while the file content is unchanged.
+
+    The cache is keyed by a hash of the file content (mtime alone misses
+    same-second edits) and of this module's source. It is written with
+    owner-only permissions under `cache_dir()`; a missing, stale or unwritable
+    cache just falls back to a full `load_config`.
+    """
+
+    path = Path(path)
+    cache_path = Path(cache_path) if cache_path is not None else default_cache_path(path)
+    key = _cache_key(path.read_bytes())
+    try:
+        cached = json.loads(cache_path.read_bytes())
+        if cached["key"] == key:
+            return _config_from_dict(cached["config"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    config = load_config(path)
+    try:
+        raw = json.loads(json.dumps(asdict(config)))
+    except (TypeError, ValueError):
+        return config
+    # Only cache what survives the JSON round trip unchanged (e.g. no YAML dates).
+    if _config_from_dict(raw) == config:
+        _write_private(cache_path, json.dumps({"key": key, "config": raw}, separators=(",", ":")).encode("utf-8"))
+    return config
+
+
+def _write_private(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        pass
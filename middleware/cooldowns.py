@@ -0,0 +1,387 @@
+"""Pluggable cooldown backends, including cross-process shared state.
+
+Every backend offers the same atomic check-and-set, `try_acquire`, so several
+processes (uvicorn `--workers N`, or the HTTP app next to
+`middleware-file-ingest`) enforce one cooldown per (event_type, target)
+instead of one each.
+
+- `memory`: in-process `CooldownStore` (default; single process only).
+- `mmap`: fixed-size hashed slot table in a memory-mapped file; each
+  check-and-set runs under an exclusive file lock.
+- `sqlite`: one-row-per-key table in a WAL-mode SQLite database; the
+  check-and-set is a single conditional UPSERT.
+
+The shared backends also hold the token buckets of `rate_limits`
+(`try_acquire_all`), taking a token from each bucket and the cooldown in one
+atomic step, so the limits apply across processes too.
+
+Timestamps are `time.monotonic_ns()`, which is system-wide (not per process)
+on Linux, Windows and macOS, so processes on one machine compare them safely.
+It restarts near 0 at boot, though, so the shared backends record which boot
+wrote their state (`boot_id`) and start empty when opened after a reboot. As a
+backstop, an entry stamped well in the future of `now_ns` counts as expired.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import struct
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Protocol
+
+from .config import CooldownBackendConfig
+from .ratelimit import CooldownStore, Gate
+
+CooldownKey = tuple[str, str]
+
+# Processes race between reading the clock and taking the lock, so an entry may
+# be slightly newer than a caller's `now_ns`; only one beyond this is from an
+# earlier boot.
+FUTURE_SLACK_NS = 1_000_000_000
+# Estimated boot times (no Linux boot_id) within this many seconds are one boot.
+BOOT_TOLERANCE_S = 60
+
+
+class CooldownBackend(Protocol):
+    """Interface shared by all cooldown stores."""
+
+    # Entries older than this can no longer block a fire; updated on config reload.
+    ttl_ns: int
+
+    def remaining_ns(self, key: CooldownKey, cooldown_ns: int, now_ns: int) -> int:
+        """Nanoseconds until `key` may fire again (0 if it may fire now)."""
+
+    def try_acquire(self, key: CooldownKey, cooldown_ns: int, now_ns: int) -> int:
+        """Atomically record a fire at `now_ns` if the cooldown has expired.
+
+        Returns 0 when acquired, otherwise the remaining ns (nothing recorded).
+        """
+
+    def last_fired_ns(self, key: CooldownKey) -> int | None:
+        """Last recorded fire time for `key`, if still tracked."""
+
+    def close(self) -> None:
+        """Release files/connections."""
+
+
+def _key_hash(key: CooldownKey) -> int:
+    digest = hashlib.blake2b("\x1f".join(key).encode("utf-8"), digest_size=8).digest()
+    # 0 marks an empty slot in the mmap table.
+    return int.from_bytes(digest, "little") or 1
+
+
+def boot_id() -> str:
+    """Identifies the current boot: Linux's random `boot_id`, else the boot time in whole seconds.
+
+    The fallback is wall clock minus monotonic clock, which NTP adjustments and
+    sleep move slightly; `same_boot` allows for that.
+    """
+
+    try:
+        with open("/proc/sys/kernel/random/boot_id", encoding="ascii") as fh:
+            return fh.read().strip()
+    except OSError:
+        return str(round((time.time_ns() - time.monotonic_ns()) / 1e9))
+
+
+def same_boot(stored: str, current: str) -> bool:
+    if stored == current:
+        return True
+    try:
+        return abs(int(stored) - int(current)) <= BOOT_TOLERANCE_S
+    except ValueError:
+        return False
+
+
+def _expired(last_ns: int, cooldown_ns: int, now_ns: int) -> bool:
+    return now_ns - last_ns >= cooldown_ns or last_ns - now_ns > FUTURE_SLACK_NS
+
+
+def _gate_wait(gate: Gate, empty_ns: int | None, now_ns: int) -> int:
+    """Nanoseconds until `gate` has a token (0 if it has one now)."""
+
+    if empty_ns is None or _expired(empty_ns, gate.burst * gate.interval_ns, now_ns):
+        return 0
+    return max(0, empty_ns + gate.interval_ns - now_ns)
+
+
+def _gate_taken(gate: Gate, empty_ns: int | None, now_ns: int) -> int:
+    """The stored timestamp once `gate` gave up a token at `now_ns` (never later than `now_ns`)."""
+
+    if empty_ns is None or _expired(empty_ns, gate.burst * gate.interval_ns, now_ns):
+        # Absent means full: empty one whole horizon ago.
+        empty_ns = now_ns - gate.burst * gate.interval_ns
+    return empty_ns + gate.interval_ns
+
+
+@contextmanager
+def file_lock(fd: int) -> Iterator[None]:
+    """Exclusive advisory lock on `fd` for the duration of the block."""
+
+    if os.name == "nt":
+        import msvcrt  # pylint: disable=import-outside-toplevel
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl  # pylint: disable=import-outside-toplevel
+
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class MmapCooldowns:
+    """Shared cooldown table: open addressing over fixed 16-byte slots.
+
+    File layout: 64-byte header (`magic`, slot count, `boot_id` of the boot
+    that last opened it) followed by `slots` records of (key_hash: u64,
+    last_fired_ns: i64). Slots are never emptied; a slot whose entry is older
+    than `ttl_ns` is reused by the next new key that probes past it, so the
+    table holds every key active within the TTL. When no slot is free the
+    backend fails closed (reports the key as cooling down) rather than dropping
+    a live cooldown. Opening the table after a reboot clears every slot.
+    """
+
+    _MAGIC = b"PSCOOL02"
+    # Tables written before the header recorded a boot id; they are recreated.
+    _OLD_MAGIC = b"PSCOOL01"
+    _HEADER = struct.Struct("<8sQ48s")
+    _SLOT = struct.Struct("<Qq")
+
+    def __init__(self, path: Path, ttl_ns: int, slots: int = 1024) -> None:
+        self.ttl_ns = ttl_ns
+        self._map: mmap.mmap | None = None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        boot = boot_id()
+        with file_lock(self._fd):
+            magic = None
+            if os.fstat(self._fd).st_size:
+                self._map = mmap.mmap(self._fd, 0)
+                magic = self._map[: len(self._MAGIC)]
+            if magic in (None, self._OLD_MAGIC):
+                if self._map is not None:
+                    self._map.close()
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self._HEADER.size + slots * self._SLOT.size)
+                self._map = mmap.mmap(self._fd, 0)
+                self._HEADER.pack_into(self._map, 0, self._MAGIC, slots, boot.encode("ascii"))
+            elif magic == self._MAGIC:
+                _, table_slots, stored = self._HEADER.unpack_from(self._map, 0)
+                if not same_boot(stored.rstrip(b"\0").decode("ascii", errors="replace"), boot):
+                    # Every timestamp is from the previous boot's monotonic clock.
+                    self._map[self._HEADER.size :] = bytes(len(self._map) - self._HEADER.size)
+                    self._HEADER.pack_into(self._map, 0, self._MAGIC, table_slots, boot.encode("ascii"))
+        if magic not in (None, self._OLD_MAGIC, self._MAGIC):
+            self.close()
+            raise ValueError(f"{path} is not a cooldown table")
+        self.slots = self._HEADER.unpack_from(self._map, 0)[1]
+
+    def _find(self, key_hash: int, now_ns: int) -> tuple[int | None, int | None]:
+        """Return (slot holding key, first reusable slot) for `key_hash`."""
+
+        reusable = None
+        start = key_hash % self.slots
+        for i in range(self.slots):
+            index = (start + i) % self.slots
+            offset = self._HEADER.size + index * self._SLOT.size
+            slot_hash, last = self._SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                return index, reusable
+            if slot_hash == 0:
+                return None, index if reusable is None else reusable
+            if reusable is None and _expired(last, self.ttl_ns, now_ns):
+                reusable = index
+        return None, reusable
+
+    def _read(self, index: int) -> tuple[int, int]:
+        return self._SLOT.unpack_from(self._map, self._HEADER.size + index * self._SLOT.size)
+
+    def _write(self, index: int, key_hash: int, now_ns: int) -> None:
+        self._SLOT.pack_into(self._map, self._HEADER.size + index * self._SLOT.size, key_hash, now_ns)
+
+    def remaining_ns(self, key: CooldownKey, cooldown_ns: int, now_ns: int) -> int:
+        key_hash = _key_hash(key)
+        with file_lock(self._fd):
+            index, _ = self._find(key_hash, now_ns)
+            if index is None:
+                return 0
+            last = self._read(index)[1]
+            return 0 if _expired(last, cooldown_ns, now_ns) else last + cooldown_ns - now_ns
+
+    def try_acquire(self, key: CooldownKey, cooldown_ns: int, now_ns: int) -> int:
+        key_hash = _key_hash(key)
+        with file_lock(self._fd):
+            index, reusable = self._find(key_hash, now_ns)
+            if index is not None:
+                last = self._read(index)[1]
+                if not _expired(last, cooldown_ns, now_ns):
+                    return last + cooldown_ns - now_ns
+            else:
+                index = reusable
+                if index is None:
+                    # Table full of live cooldowns: fail closed.
+                    return cooldown_ns or 1
+            self._write(index, key_hash, now_ns)
+            return 0
+
+    def try_acquire_all(self, gates: Sequence[Gate], now_ns: int) -> list[int]:
+        """Take a token from every gate, or from none; returns each gate's wait (all 0 when taken)."""
+
+        hashes = [_key_hash(gate.key) for gate in gates]
+        with file_lock(self._fd):
+            stored: list[int | None] = []
+            for key_hash in hashes:
+                index, _ = self._find(key_hash, now_ns)
+                stored.append(None if index is None else self._read(index)[1])
+            waits = [_gate_wait(gate, empty_ns, now_ns) for gate, empty_ns in zip(gates, stored)]
+            if any(waits):
+                return waits
+            written: list[tuple[int, tuple[int, int]]] = []
+            for i, (gate, key_hash, empty_ns) in enumerate(zip(gates, hashes, stored)):
+                # Found again per gate: an earlier gate may have taken the reusable slot.
+                index, reusable = self._find(key_hash, now_ns)
+                index = index if index is not None else reusable
+                if index is None:
+                    # Table full of live entries: fail closed, undoing the gates already taken.
+                    for undo, previous in reversed(written):
+                        self._write(undo, *previous)
+                    waits[i] = gate.interval_ns or 1
+                    return waits
+                written.append((index, self._read(index)))
+                self._write(index, key_hash, _gate_taken(gate, empty_ns, now_ns))
+            return waits
+
+    def last_fired_ns(self, key: CooldownKey) -> int | None:
+        key_hash = _key_hash(key)
+        with file_lock(self._fd):
+            index, _ = self._find(key_hash, -(2**62))
+            return None if index is None else self._read(index)[1]
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class SqliteCooldowns:
+    """Shared cooldown table in a WAL-mode SQLite database."""
+
+    # Expired rows are purged every this many successful acquisitions.
+    PURGE_EVERY = 256
+
+    def __init__(self, path: Path, ttl_ns: int) -> None:
+        # Imported here so processes on the memory/mmap backends never load it.
+        import sqlite3  # pylint: disable=import-outside-toplevel
+
+        self.ttl_ns = ttl_ns
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS cooldowns (key TEXT PRIMARY KEY, last_ns INTEGER NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        boot = boot_id()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute("SELECT value FROM meta WHERE name = 'boot_id'").fetchone()
+            if row is None or not same_boot(row[0], boot):
+                # Every timestamp is from the previous boot's monotonic clock.
+                self._db.execute("DELETE FROM cooldowns")
+                self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('boot_id', ?)", (boot,))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._acquired = 0
+
+    @staticmethod
+    def _key(key: CooldownKey) -> str:
+        return "\x1f".join(key)
+
+    def remaining_ns(self, key: CooldownKey, cooldown_ns: int, now_ns: int) -> int:
+        row = self._db.execute("SELECT last_ns FROM cooldowns WHERE key = ?", (self._key(key),)).fetchone()
+        return 0 if row is None or _expired(row[0], cooldown_ns, now_ns) else row[0] + cooldown_ns - now_ns
+
+    def try_acquire(self, key: CooldownKey, cooldown_ns: int, now_ns: int) -> int:
+        # Single statement = atomic check-and-set across connections.
+        cur = self._db.execute(
+            "INSERT INTO cooldowns (key, last_ns) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET last_ns = excluded.last_ns "
+            "WHERE excluded.last_ns - cooldowns.last_ns >= ? OR cooldowns.last_ns - excluded.last_ns > ?",
+            (self._key(key), now_ns, cooldown_ns, FUTURE_SLACK_NS),
+        )
+        if cur.rowcount != 1:
+            return max(1, self.remaining_ns(key, cooldown_ns, now_ns))
+
+        self._acquired += 1
+        if self._acquired % self.PURGE_EVERY == 0:
+            self._purge(now_ns)
+        return 0
+
+    def try_acquire_all(self, gates: Sequence[Gate], now_ns: int) -> list[int]:
+        """Take a token from every gate, or from none; returns each gate's wait (all 0 when taken)."""
+
+        keys = [self._key(gate.key) for gate in gates]
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            stored = []
+            for key in keys:
+                row = self._db.execute("SELECT last_ns FROM cooldowns WHERE key = ?", (key,)).fetchone()
+                stored.append(None if row is None else row[0])
+            waits = [_gate_wait(gate, empty_ns, now_ns) for gate, empty_ns in zip(gates, stored)]
+            if not any(waits):
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO cooldowns (key, last_ns) VALUES (?, ?)",
+                    [(key, _gate_taken(gate, empty_ns, now_ns)) for key, gate, empty_ns in zip(keys, gates, stored)],
+                )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        if not any(waits):
+            self._acquired += 1
+            if self._acquired % self.PURGE_EVERY == 0:
+                self._purge(now_ns)
+        return waits
+
+    def _purge(self, now_ns: int) -> None:
+        self._db.execute(
+            "DELETE FROM cooldowns WHERE last_ns < ? OR last_ns > ?",
+            (now_ns - self.ttl_ns, now_ns + FUTURE_SLACK_NS),
+        )
+
+    def last_fired_ns(self, key: CooldownKey) -> int | None:
+        row = self._db.execute("SELECT last_ns FROM cooldowns WHERE key = ?", (self._key(key),)).fetchone()
+        return None if row is None else row[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def open_cooldown_backend(config: CooldownBackendConfig, ttl_ns: int) -> CooldownBackend:
+    """Build the backend selected by `cooldown_backend.kind`."""
+
+    if config.kind == "memory":
+        return CooldownStore(ttl_ns=ttl_ns)
+    if config.kind == "mmap":
+        return MmapCooldowns(Path(config.path), ttl_ns=ttl_ns, slots=config.slots)
+    if config.kind == "sqlite":
+        return SqliteCooldowns(Path(config.path), ttl_ns=ttl_ns)
+    raise ValueError(f"Unsupported cooldown backend: {config.kind}")
@@ -0,0 +1,226 @@
+"""Local datagram ingress: a Unix domain datagram socket and a loopback UDP port.
+
+Each datagram carries one event in the outbox line format
+(`<sig_hex>\\t<json_body>`, trailing newline optional). The event loop hands
+it straight from `datagram_received` to the shared verify -> parse -> decide
+path, so there is no HTTP parsing, connection or request object per event.
+A sender with an address (any UDP sender, or a Unix sender that bound its
+socket) gets a reply datagram `<status> <reason>` with the same status codes
+as `POST /event`, e.g. `202 accepted` or `401 invalid_signature`.
+
+Both listeners are local-only: UDP binds a loopback address, and the Unix
+socket is made owner-only. `DatagramSender` is the matching client:
+
+    python -m middleware.datagram --udp 8788 --secret change-me '{"event_type":"player_healed"}'
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import stat
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from .config import DatagramConfig
+from .security import SignatureVerifier
+
+# `handle(line, arrived_ns) -> (status, reason)`, where `arrived_ns` is `time.monotonic_ns()`.
+Handler = Callable[[bytes, int], tuple[int, str]]
+
+
+class DatagramIngress(asyncio.DatagramProtocol):
+    """Feeds every datagram to `handle` and answers senders that have an address."""
+
+    def __init__(self, handle: Handler, *, reply: bool = True, logger: logging.Logger | None = None) -> None:
+        self._handle = handle
+        self._reply = reply
+        self._logger = logger or logging.getLogger("middleware.datagram")
+        self.transport: asyncio.DatagramTransport | None = None
+        self.received = 0
+        self.errors = 0
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        arrived_ns = time.monotonic_ns()
+        self.received += 1
+        try:
+            status, reason = self._handle(data, arrived_ns)
+        except Exception:  # pylint: disable=broad-except
+            # One bad datagram must not take the listener down.
+            self.errors += 1
+            self._logger.exception("datagram_error")
+            status, reason = 500, "error"
+        if self._reply and addr:
+            self.transport.sendto(f"{status} {reason}".encode("ascii"), addr)
+
+    def error_received(self, exc: Exception) -> None:
+        self.errors += 1
+        self._logger.warning("datagram_socket_error", extra={"detail": str(exc)})
+
+
+class DatagramListeners:
+    """The listeners `DatagramConfig` asks for, opened on the running event loop."""
+
+    def __init__(self) -> None:
+        self.protocols: dict[str, DatagramIngress] = {}
+        self.addresses: dict[str, str] = {}
+        self._unix_path: Path | None = None
+
+    @classmethod
+    async def open(
+        cls, config: DatagramConfig, handle: Handler, logger: logging.Logger | None = None
+    ) -> DatagramListeners:
+        """Bind every configured listener. Raises `OSError` if one cannot be bound."""
+
+        listeners = cls()
+        loop = asyncio.get_running_loop()
+        try:
+            if config.udp_port:
+                _, protocol = await loop.create_datagram_endpoint(
+                    lambda: DatagramIngress(handle, reply=config.reply, logger=logger),
+                    local_addr=(config.udp_host, config.udp_port),
+                )
+                host, port = protocol.transport.get_extra_info("sockname")[:2]
+                listeners.protocols["udp"] = protocol
+                listeners.addresses["udp"] = f"{host}:{port}"
+            if config.unix_path:
+                if not hasattr(socket, "AF_UNIX"):
+                    raise OSError("datagram.unix_path: Unix domain sockets are not available on this platform")
+                path = Path(config.unix_path)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _remove_stale_socket(path)
+                _, protocol = await loop.create_datagram_endpoint(
+                    lambda: DatagramIngress(handle, reply=config.reply, logger=logger),
+                    local_addr=str(path),
+                    family=socket.AF_UNIX,
+                )
+                listeners._unix_path = path
+                os.chmod(path, 0o600)
+                listeners.protocols["unix"] = protocol
+                listeners.addresses["unix"] = str(path)
+        except BaseException:
+            listeners.close()
+            raise
+        return listeners
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            kind: {"address": self.addresses[kind], "received": protocol.received, "errors": protocol.errors}
+            for kind, protocol in self.protocols.items()
+        }
+
+    def close(self) -> None:
+        for protocol in self.protocols.values():
+            if protocol.transport is not None:
+                protocol.transport.close()
+        self.protocols.clear()
+        if self._unix_path is not None:
+            _remove_stale_socket(self._unix_path)
+            self._unix_path = None
+
+
+def _remove_stale_socket(path: Path) -> None:
+    """Remove a socket left by an earlier run; refuse to delete anything else."""
+
+    try:
+        mode = path.lstat().st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f"datagram.unix_path exists and is not a socket: {path}")
+    path.unlink()
+
+
+class DatagramSender:
+    """Blocking client for a datagram listener: signs events and sends one per datagram.
+
+    `target` is a `(host, port)` pair for UDP or a socket path for Unix. With
+    `reply`, `send` waits up to `timeout_s` for the listener's answer; a Unix
+    sender then binds its own temporary socket so the listener can answer it.
+    """
+
+    def __init__(
+        self, target: tuple[str, int] | str, secret: str, *, reply: bool = True, timeout_s: float = 1.0
+    ) -> None:
+        self.target = target
+        self.reply = reply
+        self._verifier = SignatureVerifier(secret)
+        self._tmpdir: str | None = None
+        if isinstance(target, tuple):
+            self._sock = socket.socket(socket.AF_INET6 if ":" in target[0] else socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            if reply:
+                self._tmpdir = tempfile.mkdtemp(prefix="pishock-sender-")
+                self._sock.bind(os.path.join(self._tmpdir, "reply.sock"))
+        self._sock.settimeout(timeout_s)
+        # connect() fixes the peer once, so each send skips the address lookup.
+        self._sock.connect(target)
+
+    def send(self, event: dict[str, Any] | bytes) -> tuple[int, str] | None:
+        """Sign and send one event (a dict, or an already encoded JSON body).
+
+        Returns the listener's `(status, reason)`, or None without `reply`.
+        Raises `TimeoutError` if no answer arrives in time.
+        """
+
+        body = event if isinstance(event, bytes) else json.dumps(event, separators=(",", ":")).encode("utf-8")
+        return self.send_line(self._verifier.sign(body).encode("ascii") + b"\t" + body)
+
+    def send_line(self, line: bytes) -> tuple[int, str] | None:
+        """Send one already signed outbox line, e.g. replayed from `events.log`."""
+
+        self._sock.send(line)
+        if not self.reply:
+            return None
+        status, _, reason = self._sock.recv(256).decode("ascii", errors="replace").partition(" ")
+        return int(status), reason
+
+    def close(self) -> None:
+        self._sock.close()
+        if self._tmpdir is not None:
+            for name in os.listdir(self._tmpdir):
+                os.unlink(os.path.join(self._tmpdir, name))
+            os.rmdir(self._tmpdir)
+            self._tmpdir = None
+
+    def __enter__(self) -> DatagramSender:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Send one signed event to the middleware's datagram listener")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--udp", metavar="[HOST:]PORT", help="Loopback UDP listener, e.g. 8788 or 127.0.0.1:8788")
+    target.add_argument("--unix", metavar="PATH", help="Unix domain datagram socket")
+    parser.add_argument("--secret", required=True, help="service.shared_secret")
+    parser.add_argument("--no-reply", action="store_true", help="Do not wait for the listener's answer")
+    parser.add_argument("event", help="JSON event body")
+    args = parser.parse_args()
+
+    if args.udp:
+        host, _, port = args.udp.rpartition(":")
+        address: tuple[str, int] | str = (host or "127.0.0.1", int(port))
+    else:
+        address = args.unix
+    with DatagramSender(address, args.secret, reply=not args.no_reply) as sender:
+        answer = sender.send(args.event.encode("utf-8"))
+    if answer is not None:
+        print(f"{answer[0]} {answer[1]}")
+
+
+if __name__ == "__main__":
+    main()
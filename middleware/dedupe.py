@@ -0,0 +1,201 @@
+"""Replay protection keyed by the emitter's `(session_id, seq)`.
+
+The emitter numbers events with a `seq` that increases within a session, so a
+replayed outbox (lost `outbox.offset`) or a retried `POST /event` repeats a
+pair already seen. `DedupeIndex.admit` answers "seen before?" in O(1) with
+constant memory per session, like an IPsec anti-replay window: the highest
+`seq` seen plus a bitmap of the `window` seqs below it, so events arriving out
+of order within the window still count once. A seq older than the window is
+treated as a replay.
+
+At most `max_sessions` sessions are tracked (least recently seen forgotten
+first). The index is persisted as one small binary file; `flush` merges it
+with the file under a lock, so processes sharing the file keep each other's
+sessions.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from .config import DedupeConfig
+from .cooldowns import file_lock
+
+MAGIC = b"PSDEDUP1"
+HEADER = struct.Struct("<8sII")
+# session_id length, highest seq, last seen (epoch ms); then the bitmap and the id.
+SESSION = struct.Struct("<Hqq")
+
+
+class _Session:
+    __slots__ = ("high", "bits", "seen_ms")
+
+    def __init__(self, high: int, bits: int, seen_ms: int) -> None:
+        self.high = high
+        # Bit i set: seq `high - i` was seen.
+        self.bits = bits
+        self.seen_ms = seen_ms
+
+
+class DedupeIndex:
+    """Per-session high-watermark plus sliding bitmap; thread-safe."""
+
+    def __init__(self, *, window: int = 256, max_sessions: int = 64, path: str | Path | None = None) -> None:
+        self.window = window
+        self.max_sessions = max_sessions
+        self.path = Path(path) if path is not None else None
+        self._mask = (1 << window) - 1
+        self._bitmap_bytes = (window + 7) // 8
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.duplicates = 0
+        self.flushes = 0
+        if self.path is not None:
+            self._merge(self._read())
+
+    def admit(self, session_id: str, seq: int) -> bool:
+        """Record `(session_id, seq)`; False if it was already seen (or is older than the window)."""
+
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                if len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                self._sessions[session_id] = _Session(seq, 1, time.time_ns() // 1_000_000)
+                self._dirty = True
+                return True
+            self._sessions.move_to_end(session_id)
+            state.seen_ms = time.time_ns() // 1_000_000
+            if seq > state.high:
+                shift = seq - state.high
+                state.bits = ((state.bits << shift) | 1) & self._mask if shift < self.window else 1
+                state.high = seq
+                self._dirty = True
+                return True
+            offset = state.high - seq
+            if offset >= self.window or state.bits >> offset & 1:
+                self.duplicates += 1
+                return False
+            state.bits |= 1 << offset
+            self._dirty = True
+            return True
+
+    def forget(self, session_id: str, seq: int) -> None:
+        """Undo `admit(session_id, seq)` for an event that was refused downstream, so its retry is admitted."""
+
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return
+            offset = state.high - seq
+            if 0 <= offset < self.window and state.bits >> offset & 1:
+                state.bits &= ~(1 << offset)
+                self._dirty = True
+
+    def _merge(self, sessions: dict[str, _Session]) -> None:
+        """Fold `sessions` (e.g. read from disk) into memory: union of seen seqs."""
+
+        with self._lock:
+            for session_id, other in sessions.items():
+                state = self._sessions.get(session_id)
+                if state is None:
+                    self._sessions[session_id] = _Session(other.high, other.bits & self._mask, other.seen_ms)
+                    continue
+                high = max(state.high, other.high)
+                state.bits = self._aligned(state, high) | self._aligned(other, high)
+                state.high = high
+                state.seen_ms = max(state.seen_ms, other.seen_ms)
+            # Restore least-recently-seen order and the session bound.
+            ordered = sorted(self._sessions.items(), key=lambda item: item[1].seen_ms)
+            self._sessions = OrderedDict(ordered[-self.max_sessions :])
+
+    def _aligned(self, state: _Session, high: int) -> int:
+        shift = high - state.high
+        return (state.bits << shift) & self._mask if shift < self.window else 0
+
+    def _read(self) -> dict[str, _Session]:
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            return {}
+        sessions: dict[str, _Session] = {}
+        if len(data) < HEADER.size:
+            return sessions
+        magic, window, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            return sessions
+        bitmap_bytes = (window + 7) // 8
+        offset = HEADER.size
+        for _ in range(count):
+            if offset + SESSION.size > len(data):
+                break
+            id_len, high, seen_ms = SESSION.unpack_from(data, offset)
+            offset += SESSION.size
+            bits = int.from_bytes(data[offset : offset + bitmap_bytes], "little")
+            offset += bitmap_bytes
+            session_id = data[offset : offset + id_len].decode("utf-8", errors="replace")
+            offset += id_len
+            sessions[session_id] = _Session(high, bits, seen_ms)
+        return sessions
+
+    def _encode(self) -> bytes:
+        with self._lock:
+            sessions = [(sid.encode("utf-8")[:0xFFFF], s.high, s.bits, s.seen_ms) for sid, s in self._sessions.items()]
+        parts = [HEADER.pack(MAGIC, self.window, len(sessions))]
+        for raw_id, high, bits, seen_ms in sessions:
+            parts.append(SESSION.pack(len(raw_id), high, seen_ms))
+            parts.append(bits.to_bytes(self._bitmap_bytes, "little"))
+            parts.append(raw_id)
+        return b"".join(parts)
+
+    def flush(self) -> None:
+        """Persist the index if it changed (temp file + rename, merged under a lock)."""
+
+        if self.path is None or not self._dirty:
+            return
+        self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_fd = os.open(self.path.with_name(self.path.name + ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with file_lock(lock_fd):
+                self._merge(self._read())
+                tmp = self.path.with_name(self.path.name + ".tmp")
+                tmp.write_bytes(self._encode())
+                os.replace(tmp, self.path)
+        except OSError:
+            self._dirty = True
+            raise
+        finally:
+            os.close(lock_fd)
+        self.flushes += 1
+
+    def close(self) -> None:
+        self.flush()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "window": self.window,
+            "duplicates": self.duplicates,
+            "path": str(self.path) if self.path is not None else None,
+        }
+
+
+def open_dedupe(config: DedupeConfig, source: str, default_path: Path | None = None) -> DedupeIndex | None:
+    """The index for one ingress path (`http`/`file`), or None when dedupe is disabled.
+
+    Persisted as `<config.path>/<source>.dedupe`, or at `default_path` when
+    `config.path` is unset (memory only if both are unset).
+    """
+
+    if not config.enabled:
+        return None
+    path = Path(config.path) / f"{source}.dedupe" if config.path else default_path
+    return DedupeIndex(window=config.window, max_sessions=config.max_sessions, path=path)
@@ -0,0 +1,269 @@
+"""Background actuation dispatcher.
+
+`/event` admits a policy-approved `Action` onto a bounded per-target queue and
+returns immediately; worker tasks drain each queue against the PiShock client.
+Game-facing latency is then admission cost only, while the remote round trip
+happens off the request path.
+
+Overflow policies when a target queue is full:
+- `reject`: refuse the new action (`QueueFullError`, surfaced as HTTP 503).
+- `drop_oldest`: evict the oldest queued action; fresher feedback wins.
+- `drop_lowest_priority`: evict the lowest-priority action, oldest first on
+  ties; the new action itself is refused if nothing queued ranks below it.
+
+With `deadline_ms`, each action must be delivered within that long of its
+event's arrival: an action still queued past its deadline is dropped unsent,
+and a send (retries included) still running at the deadline is cancelled.
+Both count as `expired`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from .config import OVERFLOW_POLICIES
+from .metrics import Metrics
+from .policy import Action
+from .resilience import CircuitOpenError
+
+if TYPE_CHECKING:
+    # Typing only: importing the client pulls in httpx.
+    from .pishock_http import PiShockResult
+
+
+class QueueFullError(Exception):
+    """Raised when an action cannot be admitted to its target queue."""
+
+
+@dataclass
+class _Item:
+    action: Action
+    enqueued_ns: int
+    seq: int
+    deadline_ns: int | None = None
+    emitted_ns: int | None = None
+
+
+@dataclass
+class _TargetQueue:
+    items: deque[_Item] = field(default_factory=deque)
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    workers: list[asyncio.Task] = field(default_factory=list)
+    in_flight: int = 0
+
+
+class ActionDispatcher:
+    """Bounded per-target queues drained by background worker tasks."""
+
+    def __init__(
+        self,
+        send: Callable[[Action], Awaitable[PiShockResult]],
+        *,
+        queue_size: int = 16,
+        workers_per_target: int = 1,
+        overflow: str = "drop_oldest",
+        deadline_ms: int | None = None,
+        logger: logging.Logger | None = None,
+        metrics: Metrics | None = None,
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unsupported overflow policy: {overflow}")
+        if queue_size < 1 or workers_per_target < 1:
+            raise ValueError("queue_size and workers_per_target must be >= 1")
+
+        self._send = send
+        self.queue_size = queue_size
+        self.workers_per_target = workers_per_target
+        self.overflow = overflow
+        self.deadline_ns = deadline_ms * 1_000_000 if deadline_ms else None
+        self._logger = logger or logging.getLogger("middleware.dispatcher")
+        self._metrics = metrics
+        self._queues: dict[str, _TargetQueue] = {}
+        self._seq = itertools.count()
+        self._closing = False
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.expired = 0
+        self.circuit_open = 0
+
+    def submit(self, action: Action, arrived_ns: int | None = None, emitted_ns: int | None = None) -> None:
+        """Admit an action without blocking; raise `QueueFullError` if refused.
+
+        `arrived_ns` (`time.monotonic_ns()`, default now) is when the event
+        behind the action arrived; the deadline counts from it. With
+        `emitted_ns` (`Outcome.emitted_ns`), delivery records the event's
+        end-to-end lag.
+        """
+
+        if self._closing:
+            raise QueueFullError("Dispatcher is shutting down")
+
+        queue = self._queues.get(action.target)
+        if queue is None:
+            queue = self._queues[action.target] = _TargetQueue()
+            queue.workers = [
+                asyncio.create_task(self._worker(action.target, queue)) for _ in range(self.workers_per_target)
+            ]
+
+        now_ns = time.monotonic_ns()
+        deadline_ns = None
+        if self.deadline_ns is not None:
+            deadline_ns = (now_ns if arrived_ns is None else arrived_ns) + self.deadline_ns
+        item = _Item(
+            action=action, enqueued_ns=now_ns, seq=next(self._seq), deadline_ns=deadline_ns, emitted_ns=emitted_ns
+        )
+        if len(queue.items) >= self.queue_size:
+            self._make_room(queue, item)
+
+        queue.items.append(item)
+        queue.ready.set()
+
+    def _make_room(self, queue: _TargetQueue, incoming: _Item) -> None:
+        if self.overflow == "reject":
+            self.rejected += 1
+            raise QueueFullError(f"Dispatch queue full for target={incoming.action.target}")
+
+        if self.overflow == "drop_oldest":
+            victim = queue.items.popleft()
+        else:
+            victim = min(queue.items, key=lambda it: (it.action.priority, it.seq))
+            if victim.action.priority >= incoming.action.priority:
+                self.rejected += 1
+                raise QueueFullError(f"Dispatch queue full of higher-priority actions for target={victim.action.target}")
+            queue.items.remove(victim)
+
+        self.dropped += 1
+        self._logger.warning(
+            "dispatch_dropped",
+            extra={
+                "target": victim.action.target,
+                "mode": victim.action.mode,
+                "priority": victim.action.priority,
+                "age_ms": (time.monotonic_ns() - victim.enqueued_ns) // 1_000_000,
+            },
+        )
+
+    async def _worker(self, target: str, queue: _TargetQueue) -> None:
+        while True:
+            while not queue.items:
+                queue.ready.clear()
+                await queue.ready.wait()
+
+            item = queue.items.popleft()
+            started_ns = time.monotonic_ns()
+            metrics = self._metrics
+            if metrics is not None:
+                metrics.observe("queue", started_ns - item.enqueued_ns)
+            if item.deadline_ns is not None and started_ns >= item.deadline_ns:
+                self._expire(item, "dispatch_expired")
+                continue
+
+            queue.in_flight += 1
+            result_label = "error"
+            try:
+                if item.deadline_ns is None:
+                    result = await self._send(item.action)
+                else:
+                    result = await asyncio.wait_for(self._send(item.action), (item.deadline_ns - started_ns) / 1e9)
+            except TimeoutError:
+                self._expire(item, "dispatch_deadline_exceeded")
+                result_label = "expired"
+            except CircuitOpenError as exc:
+                self.circuit_open += 1
+                result_label = "circuit_open"
+                self._logger.warning("dispatch_circuit_open", extra={"target": target, "detail": str(exc)})
+            except Exception:  # pylint: disable=broad-except
+                self.failed += 1
+                self._logger.exception("dispatch_error", extra={"target": target, "mode": item.action.mode})
+            else:
+                if result.ok:
+                    self.sent += 1
+                    result_label = "ok"
+                    if metrics is not None and item.emitted_ns is not None:
+                        metrics.observe_lag("dispatch", time.monotonic_ns() - item.emitted_ns)
+                else:
+                    self.failed += 1
+                    result_label = "upstream_error"
+                self._logger.info(
+                    "pishock_response",
+                    extra={
+                        "ok": result.ok,
+                        "status": result.status_code,
+                        "queue_ms": (time.monotonic_ns() - item.enqueued_ns) // 1_000_000,
+                        "body": result.body,
+                    },
+                )
+            finally:
+                queue.in_flight -= 1
+                if metrics is not None:
+                    metrics.observe("dispatch", time.monotonic_ns() - started_ns)
+                    metrics.count_dispatch(target, result_label)
+
+    def _expire(self, item: _Item, message: str) -> None:
+        self.expired += 1
+        self._logger.warning(
+            message,
+            extra={
+                "target": item.action.target,
+                "mode": item.action.mode,
+                "age_ms": (time.monotonic_ns() - item.enqueued_ns) // 1_000_000,
+            },
+        )
+        if message == "dispatch_expired" and self._metrics is not None:
+            # A send cut off mid-flight is counted by the worker's `finally`.
+            self._metrics.count_dispatch(item.action.target, "expired")
+
+    def depth(self) -> dict[str, int]:
+        """Queued (not yet sent) actions per target."""
+
+        return {target: len(q.items) for target, q in self._queues.items()}
+
+    def stats(self) -> dict[str, object]:
+        """Snapshot for health/metrics endpoints and queue sizing."""
+
+        return {
+            "queue_size": self.queue_size,
+            "overflow": self.overflow,
+            "depth": self.depth(),
+            "in_flight": sum(q.in_flight for q in self._queues.values()),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "circuit_open": self.circuit_open,
+            "deadline_ms": self.deadline_ns // 1_000_000 if self.deadline_ns is not None else None,
+        }
+
+    def _idle(self) -> bool:
+        return all(not q.items and q.in_flight == 0 for q in self._queues.values())
+
+    async def shutdown(self, drain_timeout_s: float = 5.0) -> int:
+        """Stop admitting, drain queues until the deadline, then cancel workers.
+
+        Returns the number of queued actions abandoned at the deadline.
+        """
+
+        self._closing = True
+        deadline = time.monotonic() + drain_timeout_s
+        while not self._idle() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+        abandoned = sum(len(q.items) for q in self._queues.values())
+        workers = [task for q in self._queues.values() for task in q.workers]
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        if abandoned:
+            self._logger.warning("dispatch_drain_timeout", extra={"abandoned": abandoned})
+        return abandoned
@@ -0,0 +1,132 @@
+"""Shared event decoder and JSON codec for every ingress path.
+
+`decode_event` parses the exact bytes whose signature was verified (once) and
+validates them into a slotted `Event`. JSON goes through the fastest backend
+installed: orjson, then msgspec, then the stdlib `json` module. `dumps` uses
+the same backend for responses.
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from typing import Any
+
+
+class EventFormatError(ValueError):
+    """Raised when a body is not JSON or not a valid event object.
+
+    `reason` is the pipeline outcome: `invalid_json` when the bytes did not
+    parse, `invalid_event` when they parsed but failed validation.
+    """
+
+    def __init__(self, message: str, reason: str = "invalid_event") -> None:
+        super().__init__(message)
+        self.reason = reason
+
+
+def _select_backend() -> tuple[str, Callable[[bytes], Any], Callable[[Any], bytes], type[Exception]]:
+    try:
+        import orjson  # pylint: disable=import-outside-toplevel
+
+        return "orjson", orjson.loads, orjson.dumps, orjson.JSONDecodeError
+    except ModuleNotFoundError:
+        pass
+    try:
+        import msgspec  # pylint: disable=import-outside-toplevel
+
+        return "msgspec", msgspec.json.decode, msgspec.json.encode, msgspec.DecodeError
+    except ModuleNotFoundError:
+        pass
+
+    def stdlib_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    return "json", json.loads, stdlib_dumps, ValueError
+
+
+JSON_BACKEND, _loads, _dumps, _DecodeError = _select_backend()
+
+# `ts_ms` is Unix epoch milliseconds. Older emitters stamped `os.clock()`
+# instead; values below this (2001-09-09) cannot be aged and are treated as
+# having no timestamp.
+WALL_CLOCK_MIN_MS = 1_000_000_000_000
+
+
+def loads(data: bytes) -> Any:
+    """Parse JSON bytes; raises `EventFormatError` on invalid JSON or UTF-8."""
+
+    try:
+        return _loads(data)
+    except (_DecodeError, UnicodeDecodeError, ValueError) as exc:
+        raise EventFormatError(f"invalid JSON: {exc}", "invalid_json") from exc
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes."""
+
+    return _dumps(obj)
+
+
+@dataclass(frozen=True, slots=True)
+class Event:
+    """One validated game event (see "Event payload expected by `/event`")."""
+
+    event_type: str
+    ts_ms: int | None = None
+    session_id: str | None = None
+    seq: int | None = None
+    armed: bool = False
+    context: Mapping[str, Any] = field(default_factory=dict)
+
+    def emitted_ns(self, now_ns: int, wall_ns: int) -> int | None:
+        """When the emitter stamped the event, on the `time.monotonic_ns()` clock.
+
+        `now_ns` and `wall_ns` are `time.monotonic_ns()` and `time.time_ns()`
+        read together. None without a wall-clock `ts_ms`; an emitter clock
+        running ahead is clamped to `now_ns`.
+        """
+
+        ts_ms = self.ts_ms
+        if ts_ms is None or ts_ms < WALL_CLOCK_MIN_MS:
+            return None
+        return now_ns - max(0, wall_ns - ts_ms * 1_000_000)
+
+    @classmethod
+    def from_mapping(cls, raw: Any) -> Event:
+        """Validate a parsed JSON object; unknown top-level keys are ignored."""
+
+        if not isinstance(raw, Mapping):
+            raise EventFormatError(f"event must be a JSON object, got {type(raw).__name__}")
+        event_type = raw.get("event_type")
+        if not isinstance(event_type, str) or not event_type:
+            raise EventFormatError("event_type must be a non-empty string")
+
+        ts_ms = raw.get("ts_ms")
+        session_id = raw.get("session_id")
+        seq = raw.get("seq")
+        armed = raw.get("armed", False)
+        context = raw.get("context")
+        # bool is an int subclass; a boolean timestamp or seq is a client bug.
+        if ts_ms is not None and (not isinstance(ts_ms, int) or isinstance(ts_ms, bool)):
+            raise EventFormatError("ts_ms must be an integer")
+        if session_id is not None and not isinstance(session_id, str):
+            raise EventFormatError("session_id must be a string")
+        if seq is not None and (not isinstance(seq, int) or isinstance(seq, bool)):
+            raise EventFormatError("seq must be an integer")
+        if not isinstance(armed, bool):
+            raise EventFormatError("armed must be a boolean")
+        # json_min.lua cannot tell an empty table from an empty array and writes `[]`.
+        if context is None or context == []:
+            context = {}
+        elif not isinstance(context, Mapping):
+            raise EventFormatError("context must be an object")
+
+        return cls(event_type, ts_ms, session_id, seq, armed, context)
+
+
+def decode_event(body: bytes) -> Event:
+    """Parse and validate one event body; raises `EventFormatError`."""
+
+    return Event.from_mapping(loads(body))
@@ -1,6 +1,7 @@
 """File-based event ingester for CET outbox lines.
 
-Reads lines in the format: <sig_hex>\t<json_body>\n
+Reads lines in the format: <sig_hex>\t<json_body>\n, from a single outbox file
+or from its numbered segments (see `middleware.outbox`).
 The ingester reuses middleware security/policy/PiShock modules so behavior matches
 POST /event processing.
 """
@@ -8,121 +9,672 @@ POST /event processing.
 from __future__ import annotations
 
 import argparse
-import json
 import logging
 import os
+import threading
 import time
+from collections.abc import Callable
+from dataclasses import dataclass, fields
 from pathlib import Path
+from typing import BinaryIO
 
-from .config import load_config
-from .policy import CooldownError, PolicyEngine, PolicyError
-from .security import verify_signature
+from .checkpoint import Checkpointer, CheckpointState, load_checkpoint, write_checkpoint
+from .config import load_config_cached
+from .dedupe import DedupeIndex, open_dedupe
+from .journal import Journal, open_journal
+from .logs import configure_logging, log_metric_lines, log_pipeline
+from .metrics import Metrics, serve_metrics
+from .outbox import OutboxLayout
+from .pipeline import Outcome, evaluate_line, evaluate_verified, split_signed_line
+from .policy import Action, PolicyEngine
+from .resilience import CircuitOpenError, DeadlineExceeded, resilience_for
+from .security import verifier_for
+from .watch import TAIL_MODES, open_waiter
 
 
 def _load_offset(path: Path) -> int:
-    if not path.exists():
-        return 0
-    try:
-        return int(path.read_text(encoding="utf-8").strip() or "0")
-    except ValueError:
-        return 0
+    return load_checkpoint(path).offset
 
 
 def _save_offset(path: Path, offset: int) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(str(offset), encoding="utf-8")
+    write_checkpoint(path, CheckpointState(offset=offset))
 
 
-def _process_line(line: str, policy: PolicyEngine, config, logger: logging.Logger) -> bool:
-    line = line.rstrip("\n")
+def _process_line(
+    line: str | bytes,
+    policy: PolicyEngine,
+    config,
+    logger: logging.Logger,
+    metrics: Metrics | None = None,
+    journal: Journal | None = None,
+    dedupe: DedupeIndex | None = None,
+    horizon_ms: int | None = None,
+) -> bool:
+    arrived_ns = time.monotonic_ns()
+    if isinstance(line, str):
+        line = line.encode("utf-8")
+    line = line.rstrip(b"\r\n")
     if not line:
         return False
 
-    try:
-        sig_hex, json_body = line.split("\t", 1)
-    except ValueError:
-        logger.warning("ingest_skip malformed_line")
-        return False
+    outcome = evaluate_line(
+        line, policy, config, metrics=metrics, arrived_ns=arrived_ns, dedupe=dedupe, horizon_ms=horizon_ms
+    )
+    return _handle_outcome(outcome, config, logger, metrics, journal, arrived_ns)
 
-    body_bytes = json_body.encode("utf-8")
-    if not verify_signature(body_bytes, sig_hex, config.shared_secret):
-        logger.warning("ingest_skip invalid_signature")
-        return False
 
-    try:
-        event = json.loads(json_body)
-        action = policy.decide(event)
-    except json.JSONDecodeError:
-        logger.warning("ingest_skip invalid_json")
-        return False
-    except CooldownError as exc:
-        logger.warning("ingest_skip cooldown detail=%s", str(exc))
-        return False
-    except (PolicyError, KeyError, TypeError, ValueError) as exc:
-        logger.warning("ingest_skip policy_error detail=%s", str(exc))
+def _handle_outcome(
+    outcome: Outcome,
+    config,
+    logger: logging.Logger,
+    metrics: Metrics | None,
+    journal: Journal | None,
+    arrived_ns: int,
+) -> bool:
+    if journal is not None:
+        journal.record(outcome)
+    if outcome.reason == "coalesced":
+        logger.info("ingest_coalesced", extra={"event_type": outcome.event_type, "detail": outcome.detail})
+        return True
+    if not outcome.accepted:
+        logger.warning(
+            "ingest_skip", extra={"event_type": outcome.event_type, "reason": outcome.reason, "detail": outcome.detail}
+        )
         return False
 
+    return _dispatch_action(outcome.action, outcome.event_type, config, logger, metrics, arrived_ns, outcome.emitted_ns)
+
+
+def _dispatch_action(
+    action: Action,
+    event_type: str | None,
+    config,
+    logger: logging.Logger,
+    metrics: Metrics | None = None,
+    arrived_ns: int | None = None,
+    emitted_ns: int | None = None,
+) -> bool:
+    """Send `action` with the transport's retries and breaker.
+
+    The dispatch deadline counts from `arrived_ns` (default now); an action
+    that cannot be sent before it is dropped. With `emitted_ns`, delivery
+    records the event's end-to-end lag.
+    """
+
     if config.dry_run:
-        logger.info(
-            "ingest_dry_run event_type=%s mode=%s intensity=%s duration_ms=%s",
-            event.get("event_type"),
-            action.mode,
-            action.intensity,
-            action.duration_ms,
-        )
+        logger.info("ingest_dry_run", extra={"event_type": event_type, "action": action.__dict__})
         return True
 
     from .pishock_http import send_pishock_http
 
-    result = send_pishock_http(
-        mode=action.mode,
-        intensity=action.intensity,
-        duration_ms=action.duration_ms,
-        username=config.pishock.username,
-        apikey=config.pishock.apikey,
-        code=action.target,
-        name=config.pishock.name,
-    )
+    started_ns = time.monotonic_ns()
+    deadline_ns = None
+    if config.dispatch.deadline_ms:
+        deadline_ns = (started_ns if arrived_ns is None else arrived_ns) + config.dispatch.deadline_ms * 1_000_000
+    try:
+        result = resilience_for(config.transport).run_blocking(
+            lambda timeout_s: send_pishock_http(
+                mode=action.mode,
+                intensity=action.intensity,
+                duration_ms=action.duration_ms,
+                username=config.pishock.username,
+                apikey=config.pishock.apikey,
+                code=action.target,
+                name=config.pishock.name,
+                timeout_s=timeout_s,
+                url=config.transport.url,
+                transport=config.transport,
+            ),
+            deadline_ns,
+        )
+    except (CircuitOpenError, DeadlineExceeded) as exc:
+        if metrics is not None:
+            label = "circuit_open" if isinstance(exc, CircuitOpenError) else "expired"
+            metrics.count_dispatch(action.target, label)
+        logger.warning("ingest_dispatch_skipped", extra={"event_type": event_type, "detail": str(exc)})
+        return False
+    if metrics is not None:
+        metrics.observe("dispatch", time.monotonic_ns() - started_ns)
+        metrics.count_dispatch(action.target, "ok" if result.ok else "upstream_error")
     if not result.ok:
-        logger.warning("ingest_pishock_failed status=%s body=%s", result.status_code, result.body)
+        logger.warning(
+            "ingest_pishock_failed", extra={"event_type": event_type, "status": result.status_code, "body": result.body}
+        )
         return False
+    if metrics is not None and emitted_ns is not None:
+        metrics.observe_lag("dispatch", time.monotonic_ns() - emitted_ns)
 
-    logger.info("ingest_sent event_type=%s mode=%s intensity=%s", event.get("event_type"), action.mode, action.intensity)
+    logger.info("ingest_sent", extra={"event_type": event_type, "action": action.__dict__})
     return True
 
 
+def _flush_coalesced(
+    policy: PolicyEngine,
+    config,
+    logger: logging.Logger,
+    metrics: Metrics | None = None,
+    journal: Journal | None = None,
+) -> None:
+    for action in policy.flush_due():
+        if journal is not None:
+            journal.record_action(action)
+        _dispatch_action(action, "coalesced", config, logger, metrics)
+
+
 def _get_logger() -> logging.Logger:
-    logger = logging.getLogger("middleware.file_ingest")
-    if logger.handlers:
-        return logger
-    logger.setLevel(logging.INFO)
-    logger.addHandler(logging.StreamHandler())
-    return logger
+    # A child of the `middleware` logger: `main` routes it through the queued
+    # JSON pipeline; embedders keep their own logging setup.
+    return logging.getLogger("middleware.file_ingest")
 
 
-def run_ingest_loop(outbox: Path, offset_file: Path, poll_interval_s: float = 0.25) -> None:
-    logger = _get_logger()
-    cfg_path = os.getenv("MIDDLEWARE_CONFIG", "middleware/config.example.yaml")
-    config = load_config(cfg_path)
-    policy = PolicyEngine(config)
+def _max_wait_s(policy: PolicyEngine, cap_s: float) -> float:
+    """Wait cap, shortened so an open coalescing window closes on time."""
 
-    outbox.parent.mkdir(parents=True, exist_ok=True)
-    outbox.touch(exist_ok=True)
+    due_ns = policy.next_flush_ns()
+    if due_ns is None:
+        return cap_s
+    return max(0.0, min(cap_s, (due_ns - time.monotonic_ns()) / 1e9))
 
-    offset = _load_offset(offset_file)
 
+def _drain(
+    handle: BinaryIO,
+    policy: PolicyEngine,
+    config,
+    logger: logging.Logger,
+    checkpointer: Checkpointer,
+    metrics: Metrics | None = None,
+    journal: Journal | None = None,
+    dedupe: DedupeIndex | None = None,
+    horizon_ms: int | None = None,
+) -> tuple[int, int]:
+    """Process every complete line after the current position.
+
+    Returns `(line_count, first_dispatch_ns)` where the second value is the
+    `perf_counter_ns` reading right after the first line was handled (0 if
+    none). A trailing partial line (writer mid-append) is left unread until its
+    newline arrives. With `horizon_ms`, older events are answered `stale`
+    without being decided, as in `catch_up`.
+    """
+
+    lines = 0
+    first_dispatch_ns = 0
+    stat = os.fstat(handle.fileno())
     while True:
-        with outbox.open("r", encoding="utf-8") as handle:
-            handle.seek(offset)
-            while True:
-                line = handle.readline()
-                if not line:
-                    break
-                _process_line(line, policy, config, logger)
-                offset = handle.tell()
-                _save_offset(offset_file, offset)
+        start = handle.tell()
+        raw = handle.readline()
+        if not raw:
+            break
+        if not raw.endswith(b"\n"):
+            handle.seek(start)
+            break
+        _process_line(raw, policy, config, logger, metrics, journal, dedupe, horizon_ms)
+        if not lines:
+            first_dispatch_ns = time.perf_counter_ns()
+        checkpointer.update(handle.tell(), stat.st_ino, stat.st_size)
+        lines += 1
+    # Reaching the end of the file is the idle point: commit what we have.
+    checkpointer.flush()
+    return lines, first_dispatch_ns
+
+
+@dataclass
+class CatchupReport:
+    """What one catch-up pass over the unread backlog did, and how fast."""
+
+    bytes: int = 0
+    lines: int = 0
+    accepted: int = 0
+    # Older than the horizon: journaled and counted as `stale`, never decided.
+    fast_forwarded: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+
+    def add(self, other: CatchupReport) -> CatchupReport:
+        """Totals over two passes (e.g. consecutive outbox segments)."""
+
+        return CatchupReport(*(getattr(self, f.name) + getattr(other, f.name) for f in fields(self)))
+
+    @property
+    def bytes_per_s(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    @property
+    def events_per_s(self) -> float:
+        return self.lines / self.seconds if self.seconds else 0.0
+
+
+def catch_up(
+    handle: BinaryIO,
+    policy: PolicyEngine,
+    config,
+    logger: logging.Logger,
+    checkpointer: Checkpointer,
+    metrics: Metrics | None = None,
+    journal: Journal | None = None,
+    dedupe: DedupeIndex | None = None,
+    *,
+    horizon_ms: int = 5000,
+    workers: int = 4,
+    chunk_bytes: int = 4 << 20,
+) -> CatchupReport:
+    """Work through the backlog between the current position and end of file.
+
+    Same outcomes as line-by-line `_drain`, but built for a multi-hundred-MB
+    backlog: the file is memory-mapped and split `chunk_bytes` at a time, each
+    chunk's signatures are checked in one `verify_many` call (across `workers`
+    threads), and events older than `horizon_ms` (0: no horizon) are journaled
+    as `stale` without being decided, so nothing from a past session is
+    actuated. Events without a wall-clock `ts_ms` cannot be aged and are
+    decided as usual. The checkpoint advances once per chunk. On return the
+    handle is positioned after the last complete line.
+    """
+
+    import mmap  # pylint: disable=import-outside-toplevel
+
+    report = CatchupReport()
+    start = handle.tell()
+    stat = os.fstat(handle.fileno())
+    if stat.st_size <= start:
+        return report
+
+    started = time.perf_counter()
+    verifier = verifier_for(config.shared_secret)
+    executor = None
+    if workers > 1:
+        # Imported here: only a catch-up pass needs the thread pool.
+        from concurrent.futures import ThreadPoolExecutor  # pylint: disable=import-outside-toplevel
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="catchup-verify")
+    view = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        # A trailing partial line (writer mid-append) is left to the live tail.
+        stop = view.rfind(b"\n", start, stat.st_size) + 1
+        pos = start
+        while pos < stop:
+            cut = view.rfind(b"\n", pos, min(stop, pos + chunk_bytes)) + 1
+            if cut <= pos:
+                # One line longer than a chunk.
+                cut = view.find(b"\n", pos, stop) + 1
+            _catch_up_chunk(
+                view[pos:cut], policy, config, logger, metrics, journal, dedupe, verifier, executor, horizon_ms, report
+            )
+            _flush_coalesced(policy, config, logger, metrics, journal)
+            checkpointer.update(cut, stat.st_ino, stat.st_size)
+            report.bytes += cut - pos
+            pos = cut
+        handle.seek(max(start, stop))
+    finally:
+        view.close()
+        if executor is not None:
+            executor.shutdown()
+    checkpointer.flush()
+
+    report.seconds = time.perf_counter() - started
+    logger.info(
+        "ingest_catchup",
+        extra={
+            "bytes": report.bytes,
+            "lines": report.lines,
+            "accepted": report.accepted,
+            "fast_forwarded": report.fast_forwarded,
+            "duplicates": report.duplicates,
+            "rejected": report.rejected,
+            "seconds": round(report.seconds, 3),
+            "bytes_per_s": round(report.bytes_per_s),
+            "events_per_s": round(report.events_per_s),
+        },
+    )
+    return report
+
+
+def _catch_up_chunk(
+    chunk: bytes,
+    policy: PolicyEngine,
+    config,
+    logger: logging.Logger,
+    metrics: Metrics | None,
+    journal: Journal | None,
+    dedupe: DedupeIndex | None,
+    verifier,
+    executor,
+    horizon_ms: int,
+    report: CatchupReport,
+) -> None:
+    arrived_ns = time.monotonic_ns()
+    pairs: list[tuple[bytes, str | None]] = []
+    # In file order: a body to decide, or a malformed line (bytes) to report where it stood.
+    lines: list[bytes | None] = []
+    for raw in chunk.split(b"\n"):
+        line = raw.rstrip(b"\r")
+        if not line:
+            continue
+        try:
+            signature, body = split_signed_line(line)
+        except ValueError:
+            lines.append(line)
+            continue
+        pairs.append((body, signature))
+        lines.append(None)
+
+    verify_started = time.perf_counter_ns()
+    valid = iter(verifier.verify_many(pairs, executor=executor))
+    verify_ns = (time.perf_counter_ns() - verify_started) // max(1, len(pairs))
+    bodies = iter(pairs)
+
+    for malformed in lines:
+        report.lines += 1
+        if malformed is not None:
+            # Counted and reported like any other malformed line.
+            outcome = evaluate_line(malformed, policy, config, metrics=metrics, arrived_ns=arrived_ns)
+            _handle_outcome(outcome, config, logger, metrics, journal, arrived_ns)
+            report.rejected += 1
+            continue
+        body, _ = next(bodies)
+        outcome = evaluate_verified(
+            body, next(valid), policy, metrics, arrived_ns, dedupe, verify_ns=verify_ns, horizon_ms=horizon_ms
+        )
+        if outcome.reason in ("stale", "duplicate"):
+            # Expected in bulk while catching up: journal them, skip the per-event log line.
+            if journal is not None:
+                journal.record(outcome)
+            if outcome.reason == "stale":
+                report.fast_forwarded += 1
+            else:
+                report.duplicates += 1
+        else:
+            _handle_outcome(outcome, config, logger, metrics, journal, arrived_ns)
+            if outcome.accepted:
+                report.accepted += 1
+            else:
+                report.rejected += 1
+
+
+def _reopen_if_replaced(handle: BinaryIO, outbox: Path, logger: logging.Logger) -> BinaryIO:
+    """Follow truncation in place and replacement of the outbox path."""
+
+    try:
+        path_stat = outbox.stat()
+    except FileNotFoundError:
+        return handle
+    handle_stat = os.fstat(handle.fileno())
+    if (path_stat.st_ino, path_stat.st_dev) != (handle_stat.st_ino, handle_stat.st_dev):
+        logger.warning("ingest_outbox_replaced", extra={"offset": 0})
+        handle.close()
+        return outbox.open("rb")
+    if handle_stat.st_size < handle.tell():
+        logger.warning("ingest_outbox_truncated", extra={"size": handle_stat.st_size, "offset": handle.tell()})
+        handle.seek(0)
+    return handle
+
+
+def _wait_until(ready: Callable[[], bool], stop: threading.Event | None, poll_s: float) -> bool:
+    """Poll `ready` every `poll_s`; False if `stop` was set first."""
+
+    while not ready():
+        if stop is None:
+            time.sleep(poll_s)
+        elif stop.wait(poll_s):
+            return False
+    return True
+
+
+def _open_segment(
+    layout: OutboxLayout,
+    segment: int,
+    checkpointer: Checkpointer,
+    stop: threading.Event | None = None,
+    poll_s: float = 0.25,
+) -> BinaryIO | None:
+    """Open `segment` from its start and commit that position; None if stopped first.
+
+    The emitter may not have created the segment yet. It is waited for, never
+    created here, so the ingester cannot race the emitter's own rollover.
+    """
+
+    path = layout.segment_path(segment)
+    if not _wait_until(path.exists, stop, poll_s):
+        return None
+    handle = path.open("rb")
+    stat = os.fstat(handle.fileno())
+    checkpointer.switch(segment, stat.st_ino, stat.st_size)
+    return handle
+
+
+def _open_outbox(
+    layout: OutboxLayout,
+    checkpointer: Checkpointer,
+    logger: logging.Logger,
+    stop: threading.Event | None = None,
+    poll_s: float = 0.25,
+) -> tuple[BinaryIO | None, int | None]:
+    """Open the outbox where the checkpoint left off; returns `(handle, segment)`.
+
+    `segment` is None while reading the single-file outbox. That is also where
+    reading starts if the checkpoint still points into it and the file has
+    data, even when the emitter has since switched to segments. Until the
+    emitter has written anything (e.g. the game was not started yet) this
+    waits; the handle is None if `stop` is set meanwhile.
+    """
+
+    resume = checkpointer.committed
+    legacy = layout.path
+    if not layout.segmented() and not legacy.exists():
+        logger.info("ingest_waiting_for_outbox", extra={"path": str(legacy)})
+        if not _wait_until(lambda: layout.segmented() or legacy.exists(), stop, poll_s):
+            return None, None
+    legacy_unread = resume.segment is None and legacy.exists() and legacy.stat().st_size > 0
+    if not layout.segmented() or legacy_unread:
+        handle = legacy.open("rb")
+        segment = None
+    elif resume.segment is not None and layout.segment_path(resume.segment).exists():
+        segment = resume.segment
+        handle = layout.segment_path(segment).open("rb")
+    else:
+        segment = layout.first_segment()
+        if resume.segment is not None:
+            logger.warning("ingest_segment_missing", extra={"segment": resume.segment, "reading_from": segment})
+        return _open_segment(layout, segment, checkpointer, stop, poll_s), segment
+
+    if resume.segment == segment and resume.matches(os.fstat(handle.fileno())):
+        handle.seek(resume.offset)
+    else:
+        logger.warning("ingest_checkpoint_mismatch", extra={"offset": resume.offset, "inode": resume.inode})
+        if segment is None:
+            checkpointer.segment = None
+    return handle, segment
+
+
+def run_ingest_loop(
+    outbox: Path,
+    offset_file: Path,
+    poll_interval_s: float = 0.25,
+    tail_mode: str = "auto",
+    checkpoint_every_lines: int = 64,
+    checkpoint_every_ms: int = 250,
+    checkpoint_fsync: bool = False,
+    metrics_port: int | None = None,
+    *,
+    policy: PolicyEngine | None = None,
+    metrics: Metrics | None = None,
+    stop: threading.Event | None = None,
+    journal: Journal | None = None,
+    catchup_min_bytes: int = 1 << 20,
+    catchup_horizon_ms: int = 5000,
+    catchup_workers: int | None = None,
+    archive_dir: Path | None = None,
+) -> CatchupReport | None:
+    """Tail `outbox` forever, waking on file events (inotify) or adaptive polls.
+
+    When the emitter writes a segmented outbox (see `middleware.outbox`), the
+    checkpoint is a `(segment, offset)` pair: the loop follows the emitter onto
+    each new segment once the current one is complete, and deletes consumed
+    segments (or moves them into `archive_dir`).
+    `poll_interval_s` is the idle ceiling for the polling fallback. Each batch
+    logs `wake_to_dispatch_us`: time from wake-up to the first line handled.
+    Offsets are group-committed every `checkpoint_every_lines` lines or
+    `checkpoint_every_ms`, and always when the tail goes idle or stops.
+    With `metrics_port`, the same `/metrics` series as the HTTP app are served
+    on 127.0.0.1. Already-seen `(session_id, seq)` pairs are skipped, so a lost
+    or reset offset file replays nothing; the dedupe index is saved before
+    every offset commit, next to `offset_file` unless `dedupe.path` is set.
+
+    Events in the backlog unread at startup that are older than
+    `catchup_horizon_ms` (0: no horizon) are fast-forwarded past as `stale`
+    rather than decided, however small the backlog. A backlog of at least
+    `catchup_min_bytes` (0: never) is worked through by `catch_up`, which
+    verifies on `catchup_workers` threads (default: one per CPU, up to 4); its
+    report is logged and returned once the loop stops.
+
+    Embedders (e.g. `middleware.bench`) may pass their own `policy` (its config
+    is used instead of `MIDDLEWARE_CONFIG`), `metrics` and `journal`, and end
+    the loop by setting `stop`. Otherwise a journal is opened when
+    `journal.enabled` is set in the config.
+    """
 
-        time.sleep(poll_interval_s)
+    logger = _get_logger()
+    owns_policy = policy is None
+    if policy is None:
+        policy = PolicyEngine(load_config_cached(os.getenv("MIDDLEWARE_CONFIG", "middleware/config.example.yaml")))
+    config = policy.config
+    metrics = metrics or Metrics(config.event_mappings)
+    metrics_server = serve_metrics(metrics, "127.0.0.1", metrics_port) if metrics_port else None
+    owns_journal = journal is None
+    if journal is None:
+        journal = open_journal(config.journal, "file")
+    if journal is not None:
+        metrics.add_gauges(journal.metric_lines)
+    if log_pipeline() is not None:
+        metrics.add_gauges(log_metric_lines)
+    if not config.dry_run:
+        metrics.add_gauges(resilience_for(config.transport).metric_lines)
+    dedupe = open_dedupe(config.dedupe, "file", default_path=offset_file.with_suffix(".dedupe"))
+
+    checkpointer = Checkpointer(
+        offset_file,
+        every_lines=checkpoint_every_lines,
+        every_ms=checkpoint_every_ms,
+        fsync=checkpoint_fsync,
+        before_commit=dedupe.flush if dedupe is not None else None,
+    )
+    layout = OutboxLayout(outbox)
+    handle = waiter = None
+    report = None
+    try:
+        handle, segment = _open_outbox(layout, checkpointer, logger, stop, poll_interval_s)
+        if handle is None:
+            return None
+        if segment is not None:
+            # Segments the last run consumed but stopped before removing.
+            layout.compact(segment, archive_dir, logger)
+
+        waiter = open_waiter(Path(handle.name), tail_mode, poll_interval_s)
+        # With inotify the timeout only bounds how late rotation is noticed.
+        idle_cap_s = max(1.0, poll_interval_s) if waiter.kind == "inotify" else poll_interval_s
+        logger.info("ingest_tail_mode", extra={"mode": waiter.kind})
+
+        workers = catchup_workers if catchup_workers is not None else min(4, os.cpu_count() or 1)
+        # Catch up on each segment of the startup backlog, until the live one goes idle.
+        catching_up = True
+
+        def catch_up_if_behind() -> None:
+            nonlocal report
+            if not catching_up or catchup_min_bytes <= 0:
+                return
+            if os.fstat(handle.fileno()).st_size - handle.tell() >= catchup_min_bytes:
+                part = catch_up(
+                    handle,
+                    policy,
+                    config,
+                    logger,
+                    checkpointer,
+                    metrics,
+                    journal,
+                    dedupe,
+                    horizon_ms=catchup_horizon_ms,
+                    workers=workers,
+                )
+                report = part if report is None else report.add(part)
+
+        catch_up_if_behind()
+        while stop is None or not stop.is_set():
+            woke_ns = time.perf_counter_ns()
+            horizon_ms = catchup_horizon_ms if catching_up else None
+            lines, first_ns = _drain(handle, policy, config, logger, checkpointer, metrics, journal, dedupe, horizon_ms)
+            if lines:
+                waiter.activity()
+                done_ns = time.perf_counter_ns()
+                logger.info(
+                    "ingest_batch",
+                    extra={
+                        "mode": waiter.kind,
+                        "lines": lines,
+                        "wake_to_dispatch_us": (first_ns - woke_ns) // 1000,
+                        "batch_us": (done_ns - woke_ns) // 1000,
+                    },
+                )
+
+            _flush_coalesced(policy, config, logger, metrics, journal)
+            if segment is None:
+                replaced = _reopen_if_replaced(handle, outbox, logger)
+                if replaced is not handle:
+                    handle = replaced
+                    waiter.rewatch()
+                    continue
+                if layout.segmented():
+                    # The emitter switched to segments; the single file is drained.
+                    handle.close()
+                    segment = layout.first_segment()
+                    logger.warning("ingest_outbox_segmented", extra={"segment": segment})
+                    handle = _open_segment(layout, segment, checkpointer, stop, poll_interval_s)
+                    if handle is None:
+                        break
+                    waiter.rewatch(Path(handle.name))
+                    continue
+            else:
+                following = layout.next_segment(segment)
+                if following is not None:
+                    # Segment complete: read what was appended before the emitter moved on.
+                    _drain(handle, policy, config, logger, checkpointer, metrics, journal, dedupe, horizon_ms)
+                    leftover = os.fstat(handle.fileno()).st_size - handle.tell()
+                    if leftover:
+                        logger.warning("ingest_segment_partial_line", extra={"segment": segment, "bytes": leftover})
+                    handle.close()
+                    segment = following
+                    handle = _open_segment(layout, segment, checkpointer, stop, poll_interval_s)
+                    if handle is None:
+                        break
+                    removed = layout.compact(segment, archive_dir, logger)
+                    logger.info("ingest_segment_rolled", extra={"segment": segment, "compacted": len(removed)})
+                    waiter.rewatch(Path(handle.name))
+                    catch_up_if_behind()
+                    continue
+                if layout.pending:
+                    # Retry segments the game still held open at the last roll.
+                    layout.compact(segment, archive_dir, logger)
+            catching_up = False
+            waiter.wait(_max_wait_s(policy, idle_cap_s))
+    finally:
+        checkpointer.flush()
+        if dedupe is not None:
+            dedupe.close()
+        if handle is not None:
+            handle.close()
+        if waiter is not None:
+            waiter.close()
+        if not config.dry_run:
+            # Imported here: dry runs never load the HTTP client (httpx).
+            from .pishock_http import close_client  # pylint: disable=import-outside-toplevel
+
+            close_client(config.transport)
+        if owns_policy:
+            policy.close()
+        if owns_journal and journal is not None:
+            journal.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+    return report
 
 
 def main() -> None:
@@ -130,17 +682,70 @@ def main() -> None:
     parser.add_argument(
         "--outbox",
         default="emitter/cet/mods/pishock_emitter/outbox/events.log",
-        help="Path to emitter outbox log file",
+        help="Emitter outbox_path; its segments and manifest are found next to it",
     )
     parser.add_argument(
         "--offset-file",
         default="middleware/state/outbox.offset",
         help="Path to file offset state",
     )
-    parser.add_argument("--poll-interval", type=float, default=0.25)
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=0.25,
+        help="Longest sleep between polls when idle (polling fallback)",
+    )
+    parser.add_argument(
+        "--tail-mode",
+        choices=TAIL_MODES,
+        default="auto",
+        help="auto: inotify on Linux, adaptive polling elsewhere",
+    )
+    parser.add_argument("--checkpoint-every-lines", type=int, default=64)
+    parser.add_argument("--checkpoint-every-ms", type=int, default=250)
+    parser.add_argument("--fsync", action="store_true", help="fsync each checkpoint commit (crash-durable)")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serve Prometheus /metrics on 127.0.0.1:PORT")
+    parser.add_argument(
+        "--archive-dir",
+        default=None,
+        help="Move consumed outbox segments here instead of deleting them",
+    )
+    parser.add_argument(
+        "--catchup-min-bytes",
+        type=int,
+        default=1 << 20,
+        help="Unread backlog at startup that triggers a catch-up pass (0 disables)",
+    )
+    parser.add_argument(
+        "--catchup-horizon-ms",
+        type=int,
+        default=5000,
+        help="During catch-up, skip events older than this without actuating them (0: no horizon)",
+    )
+    parser.add_argument(
+        "--catchup-workers",
+        type=int,
+        default=None,
+        help="Signature verification threads during catch-up (default: one per CPU, up to 4)",
+    )
     args = parser.parse_args()
 
-    run_ingest_loop(Path(args.outbox), Path(args.offset_file), args.poll_interval)
+    # Its own file: RotatingFileHandler cannot share one with the app's process.
+    configure_logging(log_name="file_ingest.log")
+    run_ingest_loop(
+        Path(args.outbox),
+        Path(args.offset_file),
+        args.poll_interval,
+        args.tail_mode,
+        checkpoint_every_lines=args.checkpoint_every_lines,
+        checkpoint_every_ms=args.checkpoint_every_ms,
+        checkpoint_fsync=args.fsync,
+        metrics_port=args.metrics_port,
+        catchup_min_bytes=args.catchup_min_bytes,
+        catchup_horizon_ms=args.catchup_horizon_ms,
+        catchup_workers=args.catchup_workers,
+        archive_dir=Path(args.archive_dir) if args.archive_dir else None,
+    )
 
 
 if __name__ == "__main__":
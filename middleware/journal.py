@@ -0,0 +1,484 @@
+"""Append-only binary journal of every policy decision.
+
+Each writer (the app, or one file ingester run) owns a *stream* directory
+under the journal root, named `<YYYYmmdd-HHMMSS>-<source>-<pid>` so streams
+sort chronologically and concurrent processes never share files:
+
+- `seg-000001.jrn`, ...: a 32-byte header, then fixed 64-byte records
+  (`RECORD`). A segment is sealed once it reaches `segment_bytes`.
+- `strings.txt`: interned strings (event types, session ids, targets), one
+  JSON string per line; id N is line N, 0 means absent.
+- `index.bin`: one `INDEX_ENTRY` per sealed segment (segment number, record
+  count, first/last `recorded_ns`), so time-range scans skip whole segments.
+
+`Journal.record` only timestamps the outcome and puts it on a bounded queue;
+a background thread extracts the fields, interns strings, and appends records
+in batches. A full queue drops records (counted) instead of blocking.
+`JournalReader` memory-maps segments and unpacks them with
+`struct.iter_unpack`.
+
+    python -m middleware.journal summary journal/
+    python -m middleware.journal dump journal/ --since-ms 1700000000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from .config import MAPPING_MODES, JournalConfig
+from .events import WALL_CLOCK_MIN_MS
+from .pipeline import Outcome
+from .policy import Action
+
+MAGIC = b"PSJRNL01"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIq8x")
+# recorded_ns, ts_ms, seq, event_type, session_id, target, outcome, mode,
+# intensity, flags, duration_ms, status, damage, max_health, verify_ns,
+# parse_ns, decide_ns.
+RECORD = struct.Struct("<qqqIIIBBBBHHffIII")
+INDEX_ENTRY = struct.Struct("<IIqq")
+
+# Decision outcomes plus actions emitted when a damage coalescing window closes.
+# Positions are the on-disk codes: append only, never derived from metrics.OUTCOMES.
+JOURNAL_OUTCOMES = (
+    "accepted",
+    "coalesced",
+    "cooldown",
+    "policy_error",
+    "invalid_signature",
+    "invalid_json",
+    "invalid_event",
+    "malformed_line",
+    "queue_full",
+    "window_closed",
+    "stale",
+    "duplicate",
+)
+MODES = ("", *MAPPING_MODES)
+SOURCES = ("http", "file")
+
+FLAG_ARMED = 0x01
+FLAG_SOURCE_FILE = 0x02
+
+_OUTCOME_CODE = {name: i for i, name in enumerate(JOURNAL_OUTCOMES)}
+_MODE_CODE = {name: i for i, name in enumerate(MODES)}
+_I64_MIN, _I64_MAX = -(2**63), 2**63 - 1
+_U32_MAX = 2**32 - 1
+_STOP = object()
+
+
+class JournalRecord(NamedTuple):
+    """One decoded journal record; absent values are None (NaN for numerics)."""
+
+    recorded_ns: int
+    ts_ms: int | None
+    seq: int | None
+    event_type: str | None
+    session_id: str | None
+    target: str | None
+    outcome: str
+    mode: str | None
+    intensity: int
+    armed: bool
+    source: str
+    duration_ms: int
+    status: int
+    damage: float
+    max_health: float
+    verify_ns: int
+    parse_ns: int
+    decide_ns: int
+
+
+def _i64(value: Any) -> int:
+    if isinstance(value, int) and not isinstance(value, bool) and _I64_MIN < value <= _I64_MAX:
+        return value
+    return -1
+
+
+def _f32(value: Any) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            struct.pack("<f", value)
+            return float(value)
+        except OverflowError:
+            pass
+    return math.nan
+
+
+def _segment_name(number: int) -> str:
+    return f"seg-{number:06d}.jrn"
+
+
+class Journal:
+    """Background, batching journal writer for one process."""
+
+    def __init__(
+        self,
+        root: str | Path,
+        source: str,
+        *,
+        segment_bytes: int = 16 << 20,
+        queue_size: int = 10_000,
+        batch_size: int = 512,
+    ) -> None:
+        if source not in SOURCES:
+            raise ValueError(f"source must be one of {SOURCES}, got {source!r}")
+        self.source = source
+        self.segment_bytes = max(segment_bytes, HEADER.size + RECORD.size)
+        self.batch_size = batch_size
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.path = Path(root) / f"{stamp}-{source}-{os.getpid()}"
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._flags = FLAG_SOURCE_FILE if source == "file" else 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+
+        self._strings: dict[str, int] = {}
+        self._strings_fh = (self.path / "strings.txt").open("a", encoding="utf-8")
+        self._index_fh = (self.path / "index.bin").open("ab")
+        self._segment_no = 0
+        self._segment_fh: Any = None
+        self._segment_size = self._segment_count = 0
+        self._segment_first_ns = self._segment_last_ns = 0
+        self._open_segment()
+
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+        self._closed = False
+
+    # -- caller side -------------------------------------------------------
+
+    def record(self, outcome: Outcome, reason: str | None = None) -> None:
+        """Journal one evaluated event; `reason` overrides `outcome.reason` (e.g. queue_full)."""
+
+        self._put((time.time_ns(), outcome, reason or outcome.reason))
+
+    def record_action(self, action: Action, reason: str = "window_closed") -> None:
+        """Journal an action that did not come straight from one event (coalescing)."""
+
+        self._put((time.time_ns(), action, reason))
+
+    def _put(self, item: tuple) -> None:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    # -- writer thread -----------------------------------------------------
+
+    def _open_segment(self) -> None:
+        self._segment_no += 1
+        self._segment_fh = (self.path / _segment_name(self._segment_no)).open("wb")
+        self._segment_fh.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self._segment_no, time.time_ns()))
+        self._segment_size = HEADER.size
+        self._segment_count = 0
+        self._segment_first_ns = 0
+        self._segment_last_ns = 0
+
+    def _seal_segment(self) -> None:
+        self._segment_fh.close()
+        if self._segment_count:
+            self._index_fh.write(
+                INDEX_ENTRY.pack(self._segment_no, self._segment_count, self._segment_first_ns, self._segment_last_ns)
+            )
+            self._index_fh.flush()
+
+    def _intern(self, value: str | None, new: list[str]) -> int:
+        if value is None:
+            return 0
+        string_id = self._strings.get(value)
+        if string_id is None:
+            string_id = self._strings[value] = len(self._strings) + 1
+            new.append(json.dumps(value))
+        return string_id
+
+    def _pack(self, item: tuple, new_strings: list[str]) -> bytes:
+        recorded_ns, subject, reason = item
+        outcome_code = _OUTCOME_CODE.get(reason, _OUTCOME_CODE["policy_error"])
+        if isinstance(subject, Action):
+            target = self._intern(subject.target, new_strings)
+            mode = _MODE_CODE.get(subject.mode, 0)
+            intensity, duration_ms = min(subject.intensity, 255), min(subject.duration_ms, 0xFFFF)
+            return RECORD.pack(
+                *(recorded_ns, -1, -1, 0, 0, target, outcome_code, mode, intensity, self._flags, duration_ms, 202),
+                *(math.nan, math.nan, 0, 0, 0),
+            )
+
+        event, action = subject.event, subject.action
+        flags = self._flags
+        ts_ms = seq = -1
+        event_type = session_id = 0
+        damage = max_health = math.nan
+        if event is not None:
+            ts_ms, seq = _i64(event.ts_ms), _i64(event.seq)
+            event_type = self._intern(event.event_type, new_strings)
+            session_id = self._intern(event.session_id, new_strings)
+            flags |= FLAG_ARMED if event.armed else 0
+            damage, max_health = _f32(event.context.get("damage")), _f32(event.context.get("max_health"))
+        target = mode = intensity = duration_ms = 0
+        if action is not None:
+            target = self._intern(action.target, new_strings)
+            mode = _MODE_CODE.get(action.mode, 0)
+            intensity, duration_ms = min(action.intensity, 255), min(action.duration_ms, 0xFFFF)
+        status = 503 if reason == "queue_full" else subject.status
+        stages = (*(min(ns, _U32_MAX) for ns in subject.stage_ns), 0, 0, 0)[:3]
+        return RECORD.pack(
+            *(recorded_ns, ts_ms, seq, event_type, session_id, target, outcome_code, mode, intensity, flags),
+            *(duration_ms, status, damage, max_health, *stages),
+        )
+
+    def _write(self, batch: list[tuple]) -> None:
+        new_strings: list[str] = []
+        records = [(item[0], self._pack(item, new_strings)) for item in batch]
+        # Strings first: a record on disk never references an unwritten id.
+        if new_strings:
+            self._strings_fh.write("\n".join(new_strings) + "\n")
+            self._strings_fh.flush()
+
+        chunk = bytearray()
+        for recorded_ns, packed in records:
+            if self._segment_size + len(chunk) + RECORD.size > self.segment_bytes:
+                self._segment_fh.write(chunk)
+                self._segment_size += len(chunk)
+                chunk.clear()
+                self._seal_segment()
+                self._open_segment()
+            chunk += packed
+            if not self._segment_count:
+                self._segment_first_ns = recorded_ns
+            self._segment_last_ns = recorded_ns
+            self._segment_count += 1
+        self._segment_fh.write(chunk)
+        self._segment_fh.flush()
+        self._segment_size += len(chunk)
+        self.written += len(records)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            # Whatever queued up while the last batch was written goes out together.
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write(batch)
+                except (OSError, ValueError):
+                    # Disk full or similar: lose this batch, keep serving events.
+                    self.write_errors += 1
+        self._seal_segment()
+        self._index_fh.close()
+        self._strings_fh.close()
+
+    def close(self, timeout_s: float = 5.0) -> None:
+        """Write everything queued, seal the segment and stop the thread (idempotent)."""
+
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout_s)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+            "queued": self._queue.qsize(),
+        }
+
+    def metric_lines(self) -> list[str]:
+        """Journal counters for `Metrics.add_gauges`."""
+
+        return [
+            "# HELP middleware_journal_records_total Decision journal records written.",
+            "# TYPE middleware_journal_records_total counter",
+            f"middleware_journal_records_total {self.written}",
+            "# HELP middleware_journal_dropped_total Decision journal records dropped because the queue was full.",
+            "# TYPE middleware_journal_dropped_total counter",
+            f"middleware_journal_dropped_total {self.dropped}",
+        ]
+
+
+def open_journal(config: JournalConfig, source: str) -> Journal | None:
+    """Start a writer for `config`, or None when the journal is disabled."""
+
+    if not config.enabled:
+        return None
+    return Journal(
+        config.path, source, segment_bytes=int(config.segment_mb) << 20, queue_size=int(config.queue_size)
+    )
+
+
+def _iter_segment(path: Path) -> Iterator[tuple]:
+    with open(path, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if size < HEADER.size + RECORD.size:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, version, record_size, _, _ = HEADER.unpack_from(mapped)
+            if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+                raise ValueError(f"{path}: not a version {VERSION} journal segment")
+            # A writer may be mid-append: ignore a trailing partial record.
+            end = HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size
+            view = memoryview(mapped)[HEADER.size : end]
+            rows = RECORD.iter_unpack(view)
+            try:
+                yield from rows
+            finally:
+                # Drop every buffer export before the mapping closes.
+                del rows
+                view.release()
+
+
+class JournalReader:
+    """Scan one stream directory, or every stream under a journal root."""
+
+    def __init__(self, path: str | Path) -> None:
+        path = Path(path)
+        if (path / "strings.txt").exists():
+            self.streams = [path]
+        else:
+            self.streams = sorted(p for p in path.iterdir() if (p / "strings.txt").exists())
+
+    @staticmethod
+    def _index(stream: Path) -> dict[int, tuple[int, int, int]]:
+        try:
+            data = (stream / "index.bin").read_bytes()
+        except FileNotFoundError:
+            return {}
+        usable = len(data) // INDEX_ENTRY.size * INDEX_ENTRY.size
+        return {no: (count, first, last) for no, count, first, last in INDEX_ENTRY.iter_unpack(data[:usable])}
+
+    def raw(self, start_ns: int | None = None, end_ns: int | None = None) -> Iterator[tuple[Path, tuple]]:
+        """`(stream, RECORD tuple)` pairs with `start_ns <= recorded_ns < end_ns`, undecoded."""
+
+        for stream in self.streams:
+            index = self._index(stream)
+            for segment in sorted(stream.glob("seg-*.jrn")):
+                entry = index.get(int(segment.stem.split("-")[1]))
+                # Sealed segments entirely outside the range are skipped unread.
+                if entry is not None and (
+                    (start_ns is not None and entry[2] < start_ns) or (end_ns is not None and entry[1] >= end_ns)
+                ):
+                    continue
+                for row in _iter_segment(segment):
+                    if (start_ns is None or row[0] >= start_ns) and (end_ns is None or row[0] < end_ns):
+                        yield stream, row
+
+    def records(self, start_ns: int | None = None, end_ns: int | None = None) -> Iterator[JournalRecord]:
+        """Decoded records, stream by stream in file order."""
+
+        strings: dict[Path, list[str | None]] = {}
+        for stream, row in self.raw(start_ns, end_ns):
+            table = strings.get(stream)
+            if table is None or max(row[3:6]) >= len(table):
+                lines = (stream / "strings.txt").read_text(encoding="utf-8").splitlines()
+                table = strings[stream] = [None, *(json.loads(line) for line in lines)]
+            outcome, mode, flags = row[6], row[7], row[9]
+            yield JournalRecord(
+                recorded_ns=row[0],
+                ts_ms=None if row[1] == -1 else row[1],
+                seq=None if row[2] == -1 else row[2],
+                event_type=table[row[3]],
+                session_id=table[row[4]],
+                target=table[row[5]],
+                outcome=JOURNAL_OUTCOMES[outcome] if outcome < len(JOURNAL_OUTCOMES) else f"unknown:{outcome}",
+                mode=(MODES[mode] or None) if mode < len(MODES) else None,
+                intensity=row[8],
+                armed=bool(flags & FLAG_ARMED),
+                source="file" if flags & FLAG_SOURCE_FILE else "http",
+                duration_ms=row[10],
+                status=row[11],
+                damage=row[12],
+                max_health=row[13],
+                verify_ns=row[14],
+                parse_ns=row[15],
+                decide_ns=row[16],
+            )
+
+
+def summarize(records: Iterator[JournalRecord]) -> dict[str, Any]:
+    """Counts per event type and outcome, p50/p99 decide time (us) and event lag (ms).
+
+    Lag is emitter `ts_ms` to the decision, for records with a wall-clock `ts_ms`.
+    """
+
+    counts: dict[str, dict[str, int]] = {}
+    decide_ns: list[int] = []
+    lag_ms: list[int] = []
+    total = 0
+    for rec in records:
+        total += 1
+        per_type = counts.setdefault(rec.event_type or "-", {})
+        per_type[rec.outcome] = per_type.get(rec.outcome, 0) + 1
+        if rec.decide_ns:
+            decide_ns.append(rec.decide_ns)
+        if rec.ts_ms is not None and rec.ts_ms >= WALL_CLOCK_MIN_MS:
+            lag_ms.append(max(0, rec.recorded_ns // 1_000_000 - rec.ts_ms))
+
+    def pct(samples: list[int], q: float, scale: float) -> float | None:
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))] / scale, 2) if samples else None
+
+    decide_ns.sort()
+    lag_ms.sort()
+    return {
+        "records": total,
+        "outcomes": counts,
+        "decide_us": {"p50": pct(decide_ns, 0.50, 1000), "p99": pct(decide_ns, 0.99, 1000)},
+        "lag_ms": {"p50": pct(lag_ms, 0.50, 1), "p99": pct(lag_ms, 0.99, 1)},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect a binary decision journal")
+    parser.add_argument("command", choices=("summary", "dump"))
+    parser.add_argument("path", type=Path, help="journal root or one stream directory")
+    parser.add_argument("--since-ms", type=int, default=None, help="wall-clock epoch ms lower bound")
+    parser.add_argument("--until-ms", type=int, default=None, help="wall-clock epoch ms upper bound")
+    args = parser.parse_args()
+
+    start_ns = args.since_ms * 1_000_000 if args.since_ms is not None else None
+    end_ns = args.until_ms * 1_000_000 if args.until_ms is not None else None
+    records = JournalReader(args.path).records(start_ns, end_ns)
+    if args.command == "summary":
+        print(json.dumps(summarize(records), indent=2))
+        return
+    for rec in records:
+        row = rec._asdict()
+        for key in ("damage", "max_health"):
+            if math.isnan(row[key]):
+                row[key] = None
+        sys.stdout.write(json.dumps(row) + "\n")
+
+
+if __name__ == "__main__":
+    main()
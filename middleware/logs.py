@@ -0,0 +1,145 @@
+"""Structured JSON logging, written off the event loop.
+
+`configure_logging` routes the `middleware` logger through a bounded
+`QueueHandler`; a `QueueListener` thread formats each record once and writes
+it to stdout and the rotating log file. Callers never block on stdout, disk or
+log rotation: when the queue is full the record is dropped and counted.
+
+Log structured fields as `extra` rather than interpolating them into the
+message, e.g. `logger.info("event_accepted", extra={"event_type": et})`; they
+are emitted as top-level JSON keys.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Any
+
+# Attributes every LogRecord has; anything else on a record came from `extra`.
+_RESERVED = frozenset(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime"}
+# Set on a record once serialized, so several handlers share one json.dumps.
+_CACHE_ATTR = "_json_line"
+# `json.dumps(..., default=str)` builds a new encoder per call; reuse one.
+_ENCODER = json.JSONEncoder(default=str)
+
+
+class JsonFormatter(logging.Formatter):
+    """Serialize log records as JSON for easier filtering and ingestion."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        cached = record.__dict__.get(_CACHE_ATTR)
+        if cached is not None:
+            return cached
+
+        payload: dict[str, Any] = {
+            "level": record.levelname,
+            "logger": record.name,
+            # Plain messages skip %-formatting entirely.
+            "message": record.getMessage() if record.args else str(record.msg),
+            "ts": int(record.created * 1000),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and key != _CACHE_ATTR:
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+
+        line = _ENCODER.encode(payload)
+        record.__dict__[_CACHE_ATTR] = line
+        return line
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Non-blocking `QueueHandler` that counts records dropped on a full queue."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same-process queue: hand the record over as-is and let the listener
+        # thread do all formatting (the default prepare() formats here).
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """The queue handler and listener thread behind an async logger."""
+
+    def __init__(self, handlers: list[logging.Handler], queue_size: int) -> None:
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        self._running = True
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped
+
+    def stop(self) -> None:
+        """Flush queued records and stop the listener thread (idempotent)."""
+
+        if self._running:
+            self._running = False
+            self.listener.stop()
+
+
+_pipeline: LogPipeline | None = None
+
+
+def log_pipeline() -> LogPipeline | None:
+    """The active pipeline set up by `configure_logging`, if any."""
+
+    return _pipeline
+
+
+def log_metric_lines() -> list[str]:
+    """Prometheus lines for records dropped on a full log queue."""
+
+    pipeline = _pipeline
+    return [
+        "# HELP middleware_log_dropped_total Log records dropped because the log queue was full.",
+        "# TYPE middleware_log_dropped_total counter",
+        f"middleware_log_dropped_total {pipeline.dropped if pipeline else 0}",
+    ]
+
+
+def configure_logging(
+    queue_size: int = 10_000, log_dir: str | Path = "logs", log_name: str = "middleware.log"
+) -> logging.Logger:
+    """Configure stdout + rotating `<log_dir>/<log_name>` logs behind a bounded background queue.
+
+    Handler setup is idempotent to avoid duplicate logs when app reloads.
+    """
+
+    global _pipeline  # pylint: disable=global-statement
+
+    logger = logging.getLogger("middleware")
+    logger.setLevel(logging.INFO)
+    if logger.handlers:
+        return logger
+
+    formatter = JsonFormatter()
+    sh = logging.StreamHandler()
+    sh.setFormatter(formatter)
+
+    Path(log_dir).mkdir(exist_ok=True)
+    fh = RotatingFileHandler(Path(log_dir) / log_name, maxBytes=1_000_000, backupCount=3)
+    fh.setFormatter(formatter)
+
+    _pipeline = LogPipeline([sh, fh], queue_size)
+    logger.addHandler(_pipeline.handler)
+    # Drain what is still queued when the interpreter exits.
+    atexit.register(_pipeline.stop)
+    return logger
@@ -0,0 +1,255 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+No client library: a histogram is a preallocated list of bucket counts plus a
+sum, and a counter is a slot in a preallocated list, so recording on the hot
+path is a `bisect` and a couple of integer increments. There are no locks;
+each process records from one thread (the event loop, or the ingest loop),
+and scrapes only read.
+
+Series:
+- `middleware_stage_seconds{stage}`: histogram per pipeline stage
+  (verify, parse, dedupe, decide, queue, dispatch).
+- `middleware_event_lag_seconds{hop}`: event age, from the emitter's `ts_ms`,
+  on arrival (ingest), once decided (decide) and once delivered (dispatch).
+- `middleware_events_total{event_type,outcome}`: one per evaluated event.
+- `middleware_dispatch_total{target,result}`: PiShock sends (ok, upstream_error,
+  error, expired, circuit_open).
+- `middleware_queue_depth{target}`, `middleware_dispatch_in_flight`,
+  `middleware_requests_in_flight`: gauges.
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+STAGES = ("verify", "parse", "dedupe", "decide", "queue", "dispatch")
+OUTCOMES = (
+    "accepted",
+    "coalesced",
+    "cooldown",
+    "policy_error",
+    "invalid_signature",
+    "invalid_json",
+    "invalid_event",
+    "malformed_line",
+    "queue_full",
+    "stale",
+    "duplicate",
+)
+DISPATCH_RESULTS = ("ok", "upstream_error", "error", "expired", "circuit_open")
+
+# Upper bounds in seconds, from sub-100us policy work to multi-second upstream calls.
+BUCKETS_S = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LAG_HOPS = ("ingest", "decide", "dispatch")
+# Event age spans a same-frame file tail to a replayed backlog minutes old.
+LAG_BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Label for events whose type is unknown (bad signature/JSON) or not mapped,
+# so label cardinality is bounded by the config.
+UNMAPPED = "unmapped"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_OUTCOME_INDEX = {name: i for i, name in enumerate(OUTCOMES)}
+_RESULT_INDEX = {name: i for i, name in enumerate(DISPATCH_RESULTS)}
+
+
+class Histogram:
+    """Fixed-bucket latency histogram recorded in nanoseconds."""
+
+    __slots__ = ("bounds_ns", "counts", "sum_ns")
+
+    def __init__(self, buckets_s: Iterable[float] = BUCKETS_S) -> None:
+        self.bounds_ns = [int(b * 1e9) for b in buckets_s]
+        # Last slot is the +Inf bucket.
+        self.counts = [0] * (len(self.bounds_ns) + 1)
+        self.sum_ns = 0
+
+    def observe_ns(self, value_ns: int) -> None:
+        self.counts[bisect_left(self.bounds_ns, value_ns)] += 1
+        self.sum_ns += value_ns
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound (seconds) of the bucket holding the `q` quantile; None if empty or in +Inf."""
+
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for bound_ns, count in zip(self.bounds_ns, counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound_ns / 1e9
+        return None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _histogram_lines(name: str, label: str, histograms: dict[str, Histogram]) -> list[str]:
+    lines = []
+    for value, hist in histograms.items():
+        counts = list(hist.counts)
+        cumulative = 0
+        for bound_ns, count in zip(hist.bounds_ns, counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label}="{value}",le="{bound_ns / 1e9:g}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{name}_bucket{{{label}="{value}",le="+Inf"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label}="{value}"}} {hist.sum_ns / 1e9:.9f}')
+        lines.append(f'{name}_count{{{label}="{value}"}} {cumulative}')
+    return lines
+
+
+class Metrics:
+    """All series for one process; pass the same instance to every ingress path."""
+
+    def __init__(self, event_types: Iterable[str] = ()) -> None:
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.lag = {hop: Histogram(LAG_BUCKETS_S) for hop in LAG_HOPS}
+        self._events: dict[str, list[int]] = {}
+        self.add_event_types((*event_types, UNMAPPED))
+        self._dispatch: dict[str, list[int]] = {}
+        self.requests_in_flight = 0
+        self._gauges: list[Callable[[], Iterable[str]]] = []
+
+    def add_event_types(self, event_types: Iterable[str]) -> None:
+        """Give event types (e.g. mappings added by a config reload) their own series."""
+
+        for event_type in event_types:
+            self._events.setdefault(event_type, [0] * len(OUTCOMES))
+
+    def observe(self, stage: str, elapsed_ns: int) -> None:
+        self.stages[stage].observe_ns(elapsed_ns)
+
+    def observe_lag(self, hop: str, age_ns: int) -> None:
+        self.lag[hop].observe_ns(age_ns)
+
+    def count_event(self, event_type: str | None, outcome: str) -> None:
+        counts = self._events.get(event_type) if isinstance(event_type, str) else None
+        if counts is None:
+            counts = self._events[UNMAPPED]
+        counts[_OUTCOME_INDEX[outcome]] += 1
+
+    def count_dispatch(self, target: str, result: str) -> None:
+        counts = self._dispatch.get(target)
+        if counts is None:
+            # Targets come from config, so this allocates once per device.
+            counts = self._dispatch[target] = [0] * len(DISPATCH_RESULTS)
+        counts[_RESULT_INDEX[result]] += 1
+
+    def events(self, event_type: str, outcome: str) -> int:
+        return self._events[event_type][_OUTCOME_INDEX[outcome]]
+
+    def outcome_totals(self) -> dict[str, int]:
+        """Event counts per outcome, summed over event types."""
+
+        totals = dict.fromkeys(OUTCOMES, 0)
+        for counts in list(self._events.values()):
+            for outcome, count in zip(OUTCOMES, counts):
+                totals[outcome] += count
+        return totals
+
+    def dispatches(self, target: str, result: str) -> int:
+        counts = self._dispatch.get(target)
+        return counts[_RESULT_INDEX[result]] if counts else 0
+
+    def add_gauges(self, render: Callable[[], Iterable[str]]) -> None:
+        """Register a callback yielding extra exposition lines at scrape time."""
+
+        self._gauges.append(render)
+
+    def render(self) -> str:
+        """Prometheus text exposition (format 0.0.4) of every series."""
+
+        lines = [
+            "# HELP middleware_stage_seconds Time spent per pipeline stage.",
+            "# TYPE middleware_stage_seconds histogram",
+            *_histogram_lines("middleware_stage_seconds", "stage", self.stages),
+            "# HELP middleware_event_lag_seconds Event age since the emitter stamped it, per hop.",
+            "# TYPE middleware_event_lag_seconds histogram",
+            *_histogram_lines("middleware_event_lag_seconds", "hop", self.lag),
+        ]
+
+        lines += [
+            "# HELP middleware_events_total Evaluated events by event type and outcome.",
+            "# TYPE middleware_events_total counter",
+        ]
+        for event_type, counts in list(self._events.items()):
+            label = _escape(event_type)
+            for outcome, count in zip(OUTCOMES, counts):
+                lines.append(f'middleware_events_total{{event_type="{label}",outcome="{outcome}"}} {count}')
+
+        lines += [
+            "# HELP middleware_dispatch_total PiShock sends by target and result.",
+            "# TYPE middleware_dispatch_total counter",
+        ]
+        for target, counts in list(self._dispatch.items()):
+            label = _escape(target)
+            for result, count in zip(DISPATCH_RESULTS, counts):
+                lines.append(f'middleware_dispatch_total{{target="{label}",result="{result}"}} {count}')
+
+        lines += [
+            "# HELP middleware_requests_in_flight HTTP ingest requests being processed.",
+            "# TYPE middleware_requests_in_flight gauge",
+            f"middleware_requests_in_flight {self.requests_in_flight}",
+        ]
+        for render in self._gauges:
+            lines.extend(render())
+        return "\n".join(lines) + "\n"
+
+
+def dispatcher_gauge_lines(stats: dict[str, object]) -> list[str]:
+    """Queue depth and in-flight gauges from an `ActionDispatcher.stats()` snapshot."""
+
+    lines = [
+        "# HELP middleware_queue_depth Actions waiting in the dispatch queue per target.",
+        "# TYPE middleware_queue_depth gauge",
+    ]
+    for target, depth in stats["depth"].items():
+        lines.append(f'middleware_queue_depth{{target="{_escape(target)}"}} {depth}')
+    lines += [
+        "# HELP middleware_dispatch_in_flight PiShock sends awaiting a response.",
+        "# TYPE middleware_dispatch_in_flight gauge",
+        f"middleware_dispatch_in_flight {stats['in_flight']}",
+    ]
+    return lines
+
+
+def serve_metrics(metrics: Metrics, host: str, port: int) -> ThreadingHTTPServer:
+    """Expose `GET /metrics` from a daemon thread (for processes without FastAPI)."""
+
+    # Imported here: http.server is a sizeable import most processes never need.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # pylint: disable=import-outside-toplevel
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802 - http.server naming
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:  # pylint: disable=redefined-builtin
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
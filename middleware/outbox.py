@@ -0,0 +1,122 @@
+"""On-disk layout of the CET outbox: one log file or numbered segments.
+
+The emitter (`lib/outbox.lua`) writes to `outbox_path` (e.g.
+`outbox/events.log`). With `segment_bytes` set it instead writes numbered
+segments next to it, plus a manifest naming the one being appended to:
+
+    outbox/events.000001.log
+    outbox/events.000002.log
+    outbox/events.manifest     {"version":1,"active":2,"segment_bytes":4194304}
+
+A segment is only ever appended to while it is active. The emitter opens
+segment N+1 before it closes N, so once N+1 exists N is complete, and a reader
+that finishes N has missed nothing. Segments are never reopened by the
+emitter, so the ingester deletes (or archives) each one once its checkpoint has
+moved past it; disk use stays at about one segment plus the unread backlog.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import shutil
+from pathlib import Path
+from typing import Any
+
+MANIFEST_SUFFIX = ".manifest"
+
+
+class OutboxLayout:
+    """Segment and manifest paths for the outbox configured as `path`."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.manifest_path = path.with_suffix(MANIFEST_SUFFIX)
+        # Segments the last `compact` could not remove yet.
+        self.pending: list[int] = []
+        self._pattern = re.compile(rf"{re.escape(path.stem)}\.(\d+){re.escape(path.suffix)}")
+
+    def segment_path(self, segment: int) -> Path:
+        return self.path.with_name(f"{self.path.stem}.{segment:06d}{self.path.suffix}")
+
+    def segmented(self) -> bool:
+        """Whether the emitter writes segments (it keeps a manifest)."""
+
+        return self.manifest_path.exists()
+
+    def manifest(self) -> dict[str, Any] | None:
+        """The manifest, or None while it is missing or mid-rewrite."""
+
+        try:
+            raw = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return raw if isinstance(raw, dict) else None
+
+    def segments(self) -> list[int]:
+        """Numbers of the segments on disk, oldest first."""
+
+        found = []
+        for entry in self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}"):
+            match = self._pattern.fullmatch(entry.name)
+            if match:
+                found.append(int(match.group(1)))
+        return sorted(found)
+
+    def first_segment(self) -> int:
+        """Oldest segment on disk, else the manifest's active one (1 without a manifest)."""
+
+        segments = self.segments()
+        if segments:
+            return segments[0]
+        manifest = self.manifest() or {}
+        active = manifest.get("active")
+        return active if isinstance(active, int) and active > 0 else 1
+
+    def next_segment(self, segment: int) -> int | None:
+        """The segment after `segment` if the emitter has started it (so `segment` is complete)."""
+
+        if self.segment_path(segment + 1).exists():
+            return segment + 1
+        # Normally consecutive; the manifest reveals a gap (e.g. a segment
+        # deleted by hand) without listing the directory on every idle pass.
+        active = (self.manifest() or {}).get("active")
+        if not isinstance(active, int) or active <= segment + 1:
+            return None
+        later = [n for n in self.segments() if n > segment]
+        return later[0] if later else None
+
+    def compact(
+        self, before: int, archive_dir: Path | None = None, logger: logging.Logger | None = None
+    ) -> list[int]:
+        """Delete, or move into `archive_dir`, every segment numbered below `before`.
+
+        Call only once the checkpoint points into `before` or later. Returns the
+        segments removed. A segment that cannot be removed yet (on Windows, one
+        the game still has open) is kept and listed in `pending`; call again on
+        a later pass to retry.
+        """
+
+        removed = []
+        pending = []
+        for segment in self.segments():
+            if segment >= before:
+                break
+            path = self.segment_path(segment)
+            try:
+                if archive_dir is None:
+                    path.unlink()
+                else:
+                    archive_dir.mkdir(parents=True, exist_ok=True)
+                    shutil.move(path, archive_dir / path.name)
+            except FileNotFoundError:
+                continue
+            except OSError as exc:
+                if logger is not None and segment not in self.pending:
+                    logger.warning("outbox_compact_deferred", extra={"segment": segment, "detail": str(exc)})
+                pending.append(segment)
+                continue
+            removed.append(segment)
+        self.pending = pending
+        return removed
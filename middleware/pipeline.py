@@ -0,0 +1,249 @@
+"""Shared verify -> parse -> decide path for every ingress transport.
+
+`POST /event`, `POST /events` and the file ingester all funnel raw signed
+events through `evaluate`, so signature handling, JSON parsing, and policy
+error classification are identical regardless of how an event arrived. The
+verified bytes are parsed exactly once, by `events.decode_event`.
+
+Outbox/batch line format: `<sig_hex>\\t<json_body>`.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+
+from .config import ServiceConfig
+from .dedupe import DedupeIndex
+from .events import Event, EventFormatError, decode_event
+from .metrics import Metrics
+from .policy import Action, CooldownError, EventCoalesced, PolicyEngine, PolicyError, StaleEventError
+from .security import SignatureVerifier, verifier_for
+
+# Stages timed by `evaluate`, in order; a subset of `metrics.STAGES`. The
+# replay check between parse and decide is reported separately (`dedupe_ns`).
+PIPELINE_STAGES = ("verify", "parse", "decide")
+# Event age recorded by `evaluate`, in order; a subset of `metrics.LAG_HOPS`.
+PIPELINE_LAG_HOPS = ("ingest", "decide")
+
+
+@dataclass
+class Outcome:
+    """Result of evaluating one signed event.
+
+    `status` uses HTTP semantics so every transport can report it directly:
+    202 accepted/coalesced, 400 malformed, invalid event or policy error,
+    401 bad signature, 409 `(session_id, seq)` already seen, 410 older than the
+    mapping's `max_age_ms`, 429 cooldown.
+    """
+
+    status: int
+    reason: str
+    action: Action | None = None
+    event: Event | None = None
+    detail: str = ""
+    # Nanoseconds spent in each of `PIPELINE_STAGES` that was reached.
+    stage_ns: tuple[int, ...] = ()
+    # Nanoseconds spent in the replay check, when one ran (the "dedupe" stage).
+    dedupe_ns: int | None = None
+    # When the emitter stamped the event (`time.monotonic_ns()` clock), and its
+    # age at each of `PIPELINE_LAG_HOPS`; unset without a wall-clock `ts_ms`.
+    emitted_ns: int | None = None
+    lag_ns: tuple[int, ...] = ()
+
+    @property
+    def accepted(self) -> bool:
+        return self.status == 202
+
+    @property
+    def event_type(self) -> str | None:
+        return self.event.event_type if self.event is not None else None
+
+
+def split_signed_line(line: bytes) -> tuple[str, bytes]:
+    """Split `<sig_hex>\\t<json_body>` into signature and raw body bytes.
+
+    Raises `ValueError` when the tab separator is missing.
+    """
+
+    line = line.rstrip(b"\r\n")
+    sig, sep, body = line.partition(b"\t")
+    if not sep:
+        raise ValueError("missing tab separator")
+    return sig.decode("ascii", errors="replace"), body
+
+
+def evaluate(
+    body: bytes,
+    signature: str | None,
+    policy: PolicyEngine,
+    config: ServiceConfig,
+    verifier: SignatureVerifier | None = None,
+    metrics: Metrics | None = None,
+    arrived_ns: int | None = None,
+    dedupe: DedupeIndex | None = None,
+    *,
+    horizon_ms: int | None = None,
+) -> Outcome:
+    """Verify, parse and decide one event. Never raises for bad input.
+
+    Long-lived callers pass the `verifier` they built from config once; the
+    default looks up a cached one for `config.shared_secret`. With `metrics`,
+    per-stage latency, event lag and the outcome are recorded. `arrived_ns`
+    (`time.monotonic_ns()`, default now) is when the transport received the
+    event; its age is measured from the emitter's `ts_ms`. With `dedupe`, an
+    event whose `(session_id, seq)` was already seen is skipped before the
+    policy decides it. With `horizon_ms`, see `evaluate_verified`.
+    """
+
+    if arrived_ns is None:
+        arrived_ns = time.monotonic_ns()
+    verifier = verifier or verifier_for(config.shared_secret)
+    start = time.perf_counter_ns()
+    valid = verifier.verify(body, signature)
+    verify_ns = time.perf_counter_ns() - start
+    return _record(_evaluate(body, valid, policy, arrived_ns, dedupe, verify_ns, horizon_ms), metrics)
+
+
+def evaluate_verified(
+    body: bytes,
+    valid: bool,
+    policy: PolicyEngine,
+    metrics: Metrics | None = None,
+    arrived_ns: int | None = None,
+    dedupe: DedupeIndex | None = None,
+    *,
+    verify_ns: int = 0,
+    horizon_ms: int | None = None,
+) -> Outcome:
+    """`evaluate` for a body whose signature the caller already checked.
+
+    For batch callers that verify many events at once (`verify_many`): `valid`
+    is the verification result and `verify_ns` its per-event share of the time.
+    With `horizon_ms`, an event older than that is answered `410 stale` without
+    being decided, so it spends no cooldown and is never actuated.
+    """
+
+    if arrived_ns is None:
+        arrived_ns = time.monotonic_ns()
+    return _record(_evaluate(body, valid, policy, arrived_ns, dedupe, verify_ns, horizon_ms), metrics)
+
+
+def _record(outcome: Outcome, metrics: Metrics | None) -> Outcome:
+    if metrics is not None:
+        for stage, elapsed_ns in zip(PIPELINE_STAGES, outcome.stage_ns):
+            metrics.observe(stage, elapsed_ns)
+        if outcome.dedupe_ns is not None:
+            metrics.observe("dedupe", outcome.dedupe_ns)
+        for hop, age_ns in zip(PIPELINE_LAG_HOPS, outcome.lag_ns):
+            metrics.observe_lag(hop, age_ns)
+        metrics.count_event(outcome.event_type, outcome.reason)
+    return outcome
+
+
+def _evaluate(
+    body: bytes,
+    valid: bool,
+    policy: PolicyEngine,
+    arrived_ns: int,
+    dedupe: DedupeIndex | None,
+    verify_ns: int,
+    horizon_ms: int | None = None,
+) -> Outcome:
+    if not valid:
+        return Outcome(401, "invalid_signature", detail="Invalid signature", stage_ns=(verify_ns,))
+
+    verified = time.perf_counter_ns()
+    try:
+        event = decode_event(body)
+    except EventFormatError as exc:
+        parsed = time.perf_counter_ns()
+        return Outcome(400, exc.reason, detail=str(exc), stage_ns=(verify_ns, parsed - verified))
+    parsed = time.perf_counter_ns()
+
+    dedupe_ns = None
+    if dedupe is not None and event.session_id is not None and event.seq is not None and 0 <= event.seq < 2**63:
+        admitted = dedupe.admit(event.session_id, event.seq)
+        dedupe_ns = time.perf_counter_ns() - parsed
+        if not admitted:
+            return Outcome(
+                409,
+                "duplicate",
+                event=event,
+                detail=f"Already processed session_id={event.session_id} seq={event.seq}",
+                stage_ns=(verify_ns, parsed - verified),
+                dedupe_ns=dedupe_ns,
+            )
+    # The decide stage starts after the replay check, which is timed on its own.
+    deciding = time.perf_counter_ns()
+
+    emitted_ns = age_ms = None
+    if event.ts_ms is not None:
+        now_ns = time.monotonic_ns()
+        emitted_ns = event.emitted_ns(now_ns, time.time_ns())
+        if emitted_ns is not None:
+            age_ms = (now_ns - emitted_ns) // 1_000_000
+
+    if horizon_ms and age_ms is not None and age_ms > horizon_ms:
+        return Outcome(
+            410,
+            "stale",
+            event=event,
+            detail=f"Event is {age_ms} ms old, past the {horizon_ms} ms catch-up horizon",
+            stage_ns=(verify_ns, parsed - verified),
+            dedupe_ns=dedupe_ns,
+            emitted_ns=emitted_ns,
+            lag_ns=(max(0, arrived_ns - emitted_ns),),
+        )
+
+    action: Action | None = None
+    detail = ""
+    try:
+        action = policy.decide(event, age_ms)
+        status, reason = 202, "accepted"
+    except EventCoalesced as exc:
+        status, reason, detail = 202, "coalesced", str(exc)
+    except StaleEventError as exc:
+        status, reason, detail = 410, "stale", str(exc)
+    except CooldownError as exc:
+        status, reason, detail = 429, "cooldown", str(exc)
+    except (PolicyError, KeyError, TypeError, ValueError) as exc:
+        status, reason, detail = 400, "policy_error", str(exc)
+
+    stage_ns = (verify_ns, parsed - verified, time.perf_counter_ns() - deciding)
+    lag_ns: tuple[int, ...] = ()
+    if emitted_ns is not None:
+        lag_ns = (max(0, arrived_ns - emitted_ns), time.monotonic_ns() - emitted_ns)
+    return Outcome(
+        status,
+        reason,
+        action=action,
+        event=event,
+        detail=detail,
+        stage_ns=stage_ns,
+        dedupe_ns=dedupe_ns,
+        emitted_ns=emitted_ns,
+        lag_ns=lag_ns,
+    )
+
+
+def evaluate_line(
+    line: bytes,
+    policy: PolicyEngine,
+    config: ServiceConfig,
+    verifier: SignatureVerifier | None = None,
+    metrics: Metrics | None = None,
+    arrived_ns: int | None = None,
+    dedupe: DedupeIndex | None = None,
+    *,
+    horizon_ms: int | None = None,
+) -> Outcome:
+    """`evaluate` for one outbox-format line."""
+
+    try:
+        signature, body = split_signed_line(line)
+    except ValueError as exc:
+        if metrics is not None:
+            metrics.count_event(None, "malformed_line")
+        return Outcome(400, "malformed_line", detail=str(exc))
+    return evaluate(body, signature, policy, config, verifier, metrics, arrived_ns, dedupe, horizon_ms=horizon_ms)
@@ -2,29 +2,51 @@
 
 The middleware currently targets the documented legacy `apioperate` endpoint,
 while enforcing safety in higher layers (policy engine).
+
+Two entry points share one payload builder:
+- `AsyncPiShockClient`: long-lived pooled client owned by the FastAPI app so
+  actuations never block the event loop and reuse keep-alive connections.
+- `PiShockClient` / `send_pishock_http`: blocking client used by the file
+  ingester, pooled per `TransportConfig` and closed when the ingester stops.
 """
 
 from __future__ import annotations
 
+import threading
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import httpx
 
-import requests
+if TYPE_CHECKING:
+    from .config import TransportConfig
 
 
 # Operation mapping for PiShock legacy API: shock=0, vibrate=1, beep=2.
 OPERATION_MAP = {"shock": 0, "vibrate": 1, "beep": 2}
 
+APIOPERATE_URL = "https://do.pishock.com/api/apioperate"
+
+
+# Responses that mean the command was not carried out, so a retry cannot
+# double-actuate: rate limited, or the service refused it outright.
+RETRYABLE_STATUS = frozenset({429, 503})
+
 
 @dataclass
 class PiShockResult:
-    """Normalized HTTP result for logging and error handling."""
+    """Normalized HTTP result for logging and error handling.
+
+    `retryable` marks failures where the request provably was not processed.
+    """
 
     ok: bool
     status_code: int
     body: str
+    retryable: bool = False
 
 
-def send_pishock_http(
+def build_payload(
     *,
     mode: str,
     intensity: int,
@@ -33,22 +55,13 @@ def send_pishock_http(
     apikey: str,
     code: str,
     name: str,
-    timeout_s: float = 5.0,
-) -> PiShockResult:
-    """Send a single PiShock command via legacy HTTP endpoint.
-
-    Args:
-        mode: One of `shock`, `vibrate`, or `beep`.
-        intensity: Intensity value expected by the endpoint.
-        duration_ms: Duration in milliseconds. Converted to whole seconds.
-        username, apikey, code, name: PiShock auth and metadata fields.
-        timeout_s: Request timeout.
-    """
+) -> dict[str, Any]:
+    """Build the JSON body for a single `apioperate` call."""
 
     if mode not in OPERATION_MAP:
         raise ValueError(f"Unsupported PiShock mode: {mode}")
 
-    payload = {
+    return {
         "Username": username,
         "Apikey": apikey,
         "Code": code,
@@ -59,9 +72,221 @@ def send_pishock_http(
         "Duration": max(1, int(round(duration_ms / 1000))),
     }
 
-    resp = requests.post(
-        "https://do.pishock.com/api/apioperate",
-        json=payload,
-        timeout=timeout_s,
+
+def _to_result(resp: httpx.Response) -> PiShockResult:
+    return PiShockResult(
+        ok=resp.is_success, status_code=resp.status_code, body=resp.text, retryable=resp.status_code in RETRYABLE_STATUS
+    )
+
+
+def _transport_failure(exc: httpx.HTTPError) -> PiShockResult:
+    # Status 0 marks "no HTTP response" (connect error, timeout, reset). Only
+    # a failure to connect (or to get a pooled connection) is known to have
+    # sent nothing; a read timeout may have actuated already.
+    not_sent = isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+    return PiShockResult(ok=False, status_code=0, body=f"{type(exc).__name__}: {exc}", retryable=not_sent)
+
+
+def _limits(max_connections: int, max_keepalive_connections: int, keepalive_expiry_s: float) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(max_keepalive_connections, max_connections),
+        keepalive_expiry=keepalive_expiry_s,
+    )
+
+
+class AsyncPiShockClient:
+    """Pooled, keep-alive async client for the `apioperate` endpoint.
+
+    Create once at app startup and `aclose()` at shutdown. Concurrent sends
+    share a bounded connection pool, so a burst costs queue + RTT per request
+    instead of a fresh TCP/TLS handshake each time.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout_s: float = 5.0,
+        max_connections: int = 4,
+        max_keepalive_connections: int = 4,
+        keepalive_expiry_s: float = 30.0,
+        url: str = APIOPERATE_URL,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.timeout_s = timeout_s
+        self.url = url
+        self._client = httpx.AsyncClient(
+            timeout=timeout_s,
+            limits=_limits(max_connections, max_keepalive_connections, keepalive_expiry_s),
+            transport=transport,
+        )
+
+    async def send(
+        self,
+        *,
+        mode: str,
+        intensity: int,
+        duration_ms: int,
+        username: str,
+        apikey: str,
+        code: str,
+        name: str,
+        timeout_s: float | None = None,
+    ) -> PiShockResult:
+        """Send one command; `timeout_s` overrides the client deadline for this call."""
+
+        payload = build_payload(
+            mode=mode,
+            intensity=intensity,
+            duration_ms=duration_ms,
+            username=username,
+            apikey=apikey,
+            code=code,
+            name=name,
+        )
+        timeout = self.timeout_s if timeout_s is None else timeout_s
+        try:
+            resp = await self._client.post(self.url, json=payload, timeout=timeout)
+        except httpx.HTTPError as exc:
+            return _transport_failure(exc)
+        return _to_result(resp)
+
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+
+        await self._client.aclose()
+
+
+class PiShockClient:
+    """Blocking counterpart of `AsyncPiShockClient`, used by the file ingester.
+
+    Takes the same pool settings; `close()` it when the ingester stops.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout_s: float = 5.0,
+        max_connections: int = 4,
+        max_keepalive_connections: int = 4,
+        keepalive_expiry_s: float = 30.0,
+        url: str = APIOPERATE_URL,
+        transport: httpx.BaseTransport | None = None,
+    ) -> None:
+        self.timeout_s = timeout_s
+        self.url = url
+        self._client = httpx.Client(
+            timeout=timeout_s,
+            limits=_limits(max_connections, max_keepalive_connections, keepalive_expiry_s),
+            transport=transport,
+        )
+
+    def send(
+        self,
+        *,
+        mode: str,
+        intensity: int,
+        duration_ms: int,
+        username: str,
+        apikey: str,
+        code: str,
+        name: str,
+        timeout_s: float | None = None,
+        url: str | None = None,
+    ) -> PiShockResult:
+        """Send one command; `timeout_s` and `url` override the client defaults for this call."""
+
+        payload = build_payload(
+            mode=mode,
+            intensity=intensity,
+            duration_ms=duration_ms,
+            username=username,
+            apikey=apikey,
+            code=code,
+            name=name,
+        )
+        timeout = self.timeout_s if timeout_s is None else timeout_s
+        try:
+            resp = self._client.post(url or self.url, json=payload, timeout=timeout)
+        except httpx.HTTPError as exc:
+            return _transport_failure(exc)
+        return _to_result(resp)
+
+    def close(self) -> None:
+        """Close pooled connections."""
+
+        self._client.close()
+
+
+# One blocking client per transport settings for the process, so the file
+# ingester's per-line sends share a pool; created lazily so importing this
+# module never opens sockets.
+_sync_clients: dict[TransportConfig | None, PiShockClient] = {}
+_sync_client_lock = threading.Lock()
+
+
+def client_for(transport: TransportConfig | None = None) -> PiShockClient:
+    """The process-wide blocking client built from `transport` (default settings without one)."""
+
+    with _sync_client_lock:
+        client = _sync_clients.get(transport)
+        if client is None:
+            if transport is None:
+                client = PiShockClient()
+            else:
+                client = PiShockClient(
+                    url=transport.url,
+                    timeout_s=transport.timeout_s,
+                    max_connections=transport.max_connections,
+                    max_keepalive_connections=transport.max_keepalive_connections,
+                    keepalive_expiry_s=transport.keepalive_expiry_s,
+                )
+            _sync_clients[transport] = client
+        return client
+
+
+def close_client(transport: TransportConfig | None = None) -> None:
+    """Close and forget the client `client_for(transport)` returned, if any."""
+
+    with _sync_client_lock:
+        client = _sync_clients.pop(transport, None)
+    if client is not None:
+        client.close()
+
+
+def send_pishock_http(
+    *,
+    mode: str,
+    intensity: int,
+    duration_ms: int,
+    username: str,
+    apikey: str,
+    code: str,
+    name: str,
+    timeout_s: float = 5.0,
+    url: str = APIOPERATE_URL,
+    transport: TransportConfig | None = None,
+) -> PiShockResult:
+    """Send a single PiShock command via legacy HTTP endpoint (blocking).
+
+    Args:
+        mode: One of `shock`, `vibrate`, or `beep`.
+        intensity: Intensity value expected by the endpoint.
+        duration_ms: Duration in milliseconds. Converted to whole seconds.
+        username, apikey, code, name: PiShock auth and metadata fields.
+        timeout_s: Request timeout.
+        url: Endpoint override (local stand-ins, tests).
+        transport: Pool settings; the pooled client for them is reused across calls.
+    """
+
+    return client_for(transport).send(
+        mode=mode,
+        intensity=intensity,
+        duration_ms=duration_ms,
+        username=username,
+        apikey=apikey,
+        code=code,
+        name=name,
+        timeout_s=timeout_s,
+        url=url,
     )
-    return PiShockResult(ok=resp.ok, status_code=resp.status_code, body=resp.text)
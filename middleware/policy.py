@@ -7,10 +7,14 @@ anti-spam cooldowns, and hard caps for intensity/duration.
 from __future__ import annotations
 
 import time
+from collections.abc import Mapping
 from dataclasses import dataclass
 from typing import Any
 
-from .config import ServiceConfig
+from .config import MappingRule, ServiceConfig, compile_event_mappings
+from .cooldowns import open_cooldown_backend
+from .events import Event
+from .ratelimit import NS_PER_MS, Gate, RateLimiter
 
 
 @dataclass(frozen=True)
@@ -21,6 +25,8 @@ class Action:
     intensity: int
     duration_ms: int
     target: str
+    # Used by the dispatcher's drop_lowest_priority overflow policy.
+    priority: int = 0
 
 
 class PolicyError(Exception):
@@ -31,15 +37,102 @@ class CooldownError(PolicyError):
     """Raised when an event is denied due to cooldown/rate-limiting."""
 
 
+class StaleEventError(PolicyError):
+    """Raised when an event is older than its mapping's `max_age_ms`."""
+
+
+class EventCoalesced(Exception):
+    """Raised when an event was absorbed into an open damage coalescing window.
+
+    Not a `PolicyError`: the event was accepted, its action is emitted later by
+    `PolicyEngine.flush_due`.
+    """
+
+
+@dataclass
+class _DamageWindow:
+    """Accumulated damage for one (event_type, target) coalescing window."""
+
+    damage_ratio: float
+    events: int
+    due_ns: int
+    duration_ms: int
+    priority: int
+
+
+def damage_ratio(event: Event) -> float:
+    """Return `context.damage / context.max_health`, clamped to [0, 1]."""
+
+    context = event.context
+    damage = float(context["damage"])
+    max_health = float(context["max_health"])
+    if max_health <= 0:
+        raise PolicyError("context.max_health must be > 0 for damage-based shock")
+
+    return max(0.0, min(1.0, damage / max_health))
+
+
+def _ttl_ns(rules: dict[str, MappingRule], limiter: RateLimiter) -> int:
+    """How long a cooldown backend entry can still affect a decision: a cooldown or a shared bucket refilling."""
+
+    return max(max((rule.cooldown_ms for rule in rules.values()), default=0) * NS_PER_MS, limiter.horizon_ns)
+
+
+@dataclass(frozen=True)
+class _Compiled:
+    """Everything a decision reads from config, swapped as one reference on reload."""
+
+    config: ServiceConfig
+    rules: dict[str, MappingRule]
+    limiter: RateLimiter
+
+
 class PolicyEngine:
     """Applies event mappings, safety constraints, and cooldown logic."""
 
     def __init__(self, config: ServiceConfig) -> None:
-        self.config = config
-        # Keyed by (event_type, target). Value is last accepted timestamp in ms.
-        self._last_fired_ms: dict[tuple[str, str], int] = {}
+        # Compiled once: the hot path is a dict lookup plus arithmetic.
+        rules = compile_event_mappings(config)
+        limiter = RateLimiter(config.rate_limits)
+        self._state = _Compiled(config, rules, limiter)
+        # Keyed by (event_type, target); monotonic ns, evicted once older than
+        # the longest cooldown so memory stays flat over long sessions. Shared
+        # across processes when `cooldown_backend.kind` is mmap or sqlite, and
+        # then holding the rate limit buckets as well.
+        self._cooldowns = open_cooldown_backend(config.cooldown_backend, ttl_ns=_ttl_ns(rules, limiter))
+        self._shared_buckets = config.cooldown_backend.kind != "memory"
+        # Open damage coalescing windows, keyed like cooldowns.
+        self._windows: dict[tuple[str, str], _DamageWindow] = {}
+
+    @property
+    def config(self) -> ServiceConfig:
+        return self._state.config
+
+    @config.setter
+    def config(self, config: ServiceConfig) -> None:
+        self.reload(config)
+
+    def reload(self, config: ServiceConfig) -> None:
+        """Swap in a new config's mappings, caps and rate limits.
+
+        Validation (which raises `ConfigError`) happens before anything changes.
+        Cooldown state, open coalescing windows, and the token buckets of rate
+        limit scopes whose spec is unchanged carry over. The swap is a single
+        reference assignment, so a concurrent `decide` sees the old or the new
+        config, never a mix. `cooldown_backend` itself is not reopened.
+        """
 
-    def _damage_scaled_shock_intensity(self, event: dict[str, Any]) -> int:
+        rules = compile_event_mappings(config)
+        limiter = self._state.limiter.reconfigured(config.rate_limits)
+        self._cooldowns.ttl_ns = _ttl_ns(rules, limiter)
+        self._state = _Compiled(config, rules, limiter)
+
+    def coalesce_window_ms(self) -> int | None:
+        """Shortest configured damage coalescing window, if any mapping has one."""
+
+        return min((r.coalesce_window_ms for r in self._state.rules.values() if r.coalesce_window_ms), default=None)
+
+    def _damage_scaled_shock_intensity(self, event: Event) -> int:
         """Compute shock intensity as damage% * session max shock level.
 
         Expected event context fields:
@@ -49,51 +142,177 @@ class PolicyEngine:
         Example: damage=100, max_health=400, session_max_shock_level=100 -> 25.
         """
 
-        context = event.get("context") or {}
-        damage = float(context["damage"])
-        max_health = float(context["max_health"])
-        if max_health <= 0:
-            raise PolicyError("context.max_health must be > 0 for damage-based shock")
+        return self._ratio_to_intensity(damage_ratio(event), self.config)
 
-        damage_ratio = max(0.0, min(1.0, damage / max_health))
-        return int(round(damage_ratio * self.config.session_max_shock_level))
+    @staticmethod
+    def _ratio_to_intensity(damage_ratio: float, config: ServiceConfig) -> int:
+        return int(round(min(1.0, damage_ratio) * config.session_max_shock_level))
 
-    def decide(self, event: dict[str, Any]) -> Action:
-        """Return an allowed action or raise a policy-related exception."""
+    def decide(self, event: Event | Mapping[str, Any], age_ms: int | None = None) -> Action:
+        """Return an allowed action or raise a policy-related exception.
 
-        event_type = event["event_type"]
-        mapping = self.config.event_mappings.get(event_type)
-        if not mapping:
-            raise PolicyError(f"No mapping for event_type={event_type}")
+        Ingress paths pass an `Event` from `events.decode_event`; a plain mapping
+        is validated into one first. Raises `EventCoalesced` when the event
+        joined a damage coalescing window instead of producing an action
+        immediately. `age_ms` is how long ago the event was emitted (unknown
+        when None); past the mapping's `max_age_ms` it raises `StaleEventError`
+        before any cooldown or rate limit token is spent.
+        """
 
-        mode = mapping.get("mode", "beep")
-        intensity = int(mapping.get("intensity", 1))
-        duration_ms = int(mapping.get("duration_ms", 300))
-        target = mapping.get("target", self.config.pishock.code)
+        if not isinstance(event, Event):
+            event = Event.from_mapping(event)
+        # One read: a concurrent `reload` cannot mix old and new settings here.
+        state = self._state
+        config = state.config
+        event_type = event.event_type
+        rule = state.rules.get(event_type)
+        if rule is None:
+            raise PolicyError(f"No mapping for event_type={event_type}")
+        if rule.max_age_ms and age_ms is not None and age_ms > rule.max_age_ms:
+            raise StaleEventError(f"Event {event_type} is {age_ms} ms old (max_age_ms={rule.max_age_ms})")
 
         # Shock requires explicit global opt-in and per-event armed status.
-        if mode == "shock" and (not self.config.allow_shock or not event.get("armed", False)):
+        if rule.mode == "shock" and (not config.allow_shock or not event.armed):
             raise PolicyError("Shock mode is disabled or event is not armed")
 
+        intensity = rule.intensity
         # For damage events mapped to shock, scale intensity by damage percentage.
-        if mode == "shock" and event_type == "player_damaged":
+        if rule.damage_scaled:
             try:
-                intensity = self._damage_scaled_shock_intensity(event)
+                ratio = damage_ratio(event)
             except (KeyError, TypeError, ValueError) as exc:
                 raise PolicyError(
                     "player_damaged shock requires numeric context.damage and context.max_health"
                 ) from exc
 
-        # Hard caps prevent unsafe or invalid values from config mistakes.
-        intensity = min(max(1, intensity), self.config.max_intensity)
-        duration_ms = min(max(100, duration_ms), self.config.max_duration_ms)
+            if rule.coalesce_window_ms:
+                window = self._coalesce(rule, ratio)
+                raise EventCoalesced(f"Coalesced into {event_type} window ({window.events} events)")
+            intensity = min(max(1, self._ratio_to_intensity(ratio, config)), config.max_intensity)
 
-        cooldown_ms = int(mapping.get("cooldown_ms", self.config.default_cooldown_ms))
-        now_ms = int(time.time() * 1000)
-        key = (event_type, target)
-        last = self._last_fired_ms.get(key)
-        if last is not None and now_ms - last < cooldown_ms:
+        now_ns = time.monotonic_ns()
+        wait_ns, cooldown_ns = self._acquire(state, (event_type, rule.target), rule.cooldown_ms * NS_PER_MS, now_ns)
+        if wait_ns:
+            raise CooldownError(f"Rate limit exceeded for {event_type} (retry in {wait_ns // NS_PER_MS} ms)")
+        if cooldown_ns:
             raise CooldownError(f"Cooldown active for {event_type}")
 
-        self._last_fired_ms[key] = now_ms
-        return Action(mode=mode, intensity=intensity, duration_ms=duration_ms, target=target)
+        return Action(
+            mode=rule.mode,
+            intensity=intensity,
+            duration_ms=rule.duration_ms,
+            target=rule.target,
+            priority=rule.priority,
+        )
+
+    def _acquire(self, state: _Compiled, key: tuple[str, str], cooldown_ns: int, now_ns: int) -> tuple[int, int]:
+        """Take a token from every rate limit bucket and the cooldown for `key`, or neither.
+
+        Returns `(rate_limit_wait_ns, cooldown_wait_ns)`, both 0 when taken.
+        """
+
+        event_type, target = key
+        if self._shared_buckets:
+            gates = state.limiter.gates(event_type, target)
+            if gates:
+                # The backend holds the buckets too: one atomic step across processes.
+                waits = self._cooldowns.try_acquire_all([*gates, Gate(key, cooldown_ns)], now_ns)
+                return max(waits[:-1]), waits[-1]
+        # In-process buckets: check them first without consuming; the cooldown
+        # check-and-set is the (possibly cross-process) atomic step, and tokens
+        # are only taken once it succeeded.
+        wait_ns = state.limiter.wait_ns(event_type, target, now_ns)
+        if wait_ns:
+            return wait_ns, 0
+        cooldown_ns = self._cooldowns.try_acquire(key, cooldown_ns, now_ns)
+        if not cooldown_ns:
+            state.limiter.take(event_type, target, now_ns)
+        return 0, cooldown_ns
+
+    def _coalesce(self, rule: MappingRule, damage_ratio: float) -> _DamageWindow:
+        """Add damage to the (event_type, target) window, opening it if needed.
+
+        The first hit opens a window of `coalesce_window_ms`; hits inside it add
+        their damage ratio. The window never closes before the mapping cooldown
+        expires, so hits that a plain cooldown would discard are folded into the
+        next action instead.
+        """
+
+        key = (rule.event_type, rule.target)
+        window = self._windows.get(key)
+        if window is None:
+            now_ns = time.monotonic_ns()
+            due_ns = now_ns + rule.coalesce_window_ms * NS_PER_MS
+            due_ns += self._cooldowns.remaining_ns(key, rule.cooldown_ms * NS_PER_MS, due_ns)
+            window = self._windows[key] = _DamageWindow(
+                damage_ratio=0.0,
+                events=0,
+                due_ns=due_ns,
+                duration_ms=rule.duration_ms,
+                priority=rule.priority,
+            )
+
+        window.damage_ratio += damage_ratio
+        window.events += 1
+        return window
+
+    def next_flush_ns(self) -> int | None:
+        """`time.monotonic_ns()` value at which the earliest open window closes, if any."""
+
+        if not self._windows:
+            return None
+        return min(window.due_ns for window in self._windows.values())
+
+    def flush_due(self, now_ns: int | None = None, *, force: bool = False) -> list[Action]:
+        """Close due coalescing windows and return one action per window.
+
+        Intensity reflects the summed damage ratio, still capped by
+        `session_max_shock_level` and `max_intensity`. Closing a window counts
+        as a fired action for cooldown and rate-limit purposes; a window whose
+        rate limit is exhausted, or whose cooldown was taken by another process
+        sharing the cooldown backend, stays open until it may fire.
+        `force=True` closes every open window regardless of its due time
+        (shutdown); rate-limited windows are then discarded. Windows whose
+        mapping was removed or stopped being damage-scaled by a reload, or that
+        close after a reload turned `allow_shock` off, are always discarded.
+        """
+
+        if not self._windows:
+            return []
+
+        state = self._state
+        now_ns = time.monotonic_ns() if now_ns is None else now_ns
+        actions: list[Action] = []
+        for key in [k for k, w in self._windows.items() if force or w.due_ns <= now_ns]:
+            event_type, target = key
+            rule = state.rules.get(event_type)
+            # A reload may have removed the mapping, made it non-shock or
+            # turned `allow_shock` off; the window then never fires.
+            if rule is None or not rule.damage_scaled or rule.target != target or not state.config.allow_shock:
+                del self._windows[key]
+                continue
+            wait_ns = max(self._acquire(state, key, rule.cooldown_ms * NS_PER_MS, now_ns))
+            if wait_ns and not force:
+                self._windows[key].due_ns = now_ns + wait_ns
+                continue
+            window = self._windows.pop(key)
+            if wait_ns:
+                continue
+            intensity = min(
+                max(1, self._ratio_to_intensity(window.damage_ratio, state.config)), state.config.max_intensity
+            )
+            actions.append(
+                Action(
+                    mode="shock",
+                    intensity=intensity,
+                    duration_ms=window.duration_ms,
+                    target=target,
+                    priority=window.priority,
+                )
+            )
+        return actions
+
+    def close(self) -> None:
+        """Release the cooldown backend (files/connections for shared backends)."""
+
+        self._cooldowns.close()
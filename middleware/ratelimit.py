@@ -0,0 +1,224 @@
+"""Bounded, monotonic cooldown and token-bucket rate-limit state.
+
+All timestamps are `time.monotonic_ns()` values, so wall-clock jumps (NTP,
+DST, manual changes) can neither unlock nor freeze a cooldown.
+
+Memory stays flat regardless of event cardinality: entries are kept in
+last-touched order and evicted as soon as they can no longer affect a decision
+(a cooldown older than the longest configured cooldown, a bucket that would
+have refilled completely).
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from typing import NamedTuple
+
+from .config import BucketSpec, RateLimitConfig
+
+NS_PER_MS = 1_000_000
+NS_PER_S = 1_000_000_000
+# Stands in for an endless refill interval (`per_minute: 0`) in a `Gate`: a full
+# bucket's horizon of this long keeps its timestamp within an i64.
+NO_REFILL_NS = 1 << 62
+
+
+class Gate(NamedTuple):
+    """One check of a shared backend's all-or-nothing `try_acquire_all`.
+
+    A token bucket holding `burst` tokens and refilled one per `interval_ns`.
+    Stored as one timestamp, the time it was (virtually) empty, so it holds
+    `min(burst, (now - empty) / interval)` tokens; a cooldown is the same with
+    `burst` 1 and the timestamp its last fire.
+    """
+
+    key: tuple[str, str]
+    interval_ns: int
+    burst: int = 1
+
+
+class CooldownStore:
+    """Last-fired timestamps per key with TTL eviction."""
+
+    def __init__(self, ttl_ns: int, max_entries: int = 4096) -> None:
+        self.ttl_ns = ttl_ns
+        self.max_entries = max_entries
+        self._fired: OrderedDict[Hashable, int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._fired)
+
+    def remaining_ns(self, key: Hashable, cooldown_ns: int, now_ns: int) -> int:
+        """Nanoseconds until `key` may fire again (0 if it may fire now)."""
+
+        last = self._fired.get(key)
+        if last is None:
+            return 0
+        return max(0, last + cooldown_ns - now_ns)
+
+    def last_fired_ns(self, key: Hashable) -> int | None:
+        return self._fired.get(key)
+
+    def try_acquire(self, key: Hashable, cooldown_ns: int, now_ns: int) -> int:
+        """Record a fire if the cooldown expired; returns 0 or the remaining ns."""
+
+        last = self._fired.get(key)
+        if last is not None and last + cooldown_ns > now_ns:
+            return last + cooldown_ns - now_ns
+        self.record(key, now_ns)
+        return 0
+
+    def close(self) -> None:
+        """Nothing to release; present for the cooldown backend interface."""
+
+    def record(self, key: Hashable, now_ns: int) -> None:
+        """Mark `key` as fired at `now_ns` and evict expired entries."""
+
+        self._fired[key] = now_ns
+        self._fired.move_to_end(key)
+        self._evict(now_ns)
+
+    def _evict(self, now_ns: int) -> None:
+        fired = self._fired
+        while fired:
+            key, last = next(iter(fired.items()))
+            if now_ns - last < self.ttl_ns and len(fired) <= self.max_entries:
+                break
+            del fired[key]
+
+
+@dataclass(slots=True)
+class _Bucket:
+    tokens: float
+    updated_ns: int
+
+
+class TokenBuckets:
+    """Token bucket per key: `burst` capacity refilled at `per_minute` tokens/min."""
+
+    def __init__(self, spec: BucketSpec, max_entries: int = 4096) -> None:
+        self.spec = spec
+        self.capacity = float(spec.burst)
+        self.refill_per_ns = spec.per_minute / (60 * NS_PER_S)
+        # A bucket untouched this long is full again, i.e. equivalent to absent.
+        self.ttl_ns = int(self.capacity / self.refill_per_ns) if self.refill_per_ns > 0 else None
+        self.interval_ns = int(60 * NS_PER_S / spec.per_minute) if spec.per_minute > 0 else NO_REFILL_NS // spec.burst
+        self.max_entries = max_entries
+        self._buckets: OrderedDict[Hashable, _Bucket] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _level(self, key: Hashable, now_ns: int) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return self.capacity
+        return min(self.capacity, bucket.tokens + (now_ns - bucket.updated_ns) * self.refill_per_ns)
+
+    def wait_ns(self, key: Hashable, now_ns: int) -> int:
+        """Nanoseconds until one token is available for `key` (0 if available now)."""
+
+        missing = 1.0 - self._level(key, now_ns)
+        if missing <= 0:
+            return 0
+        if self.refill_per_ns <= 0:
+            return NS_PER_S * 3600
+        return int(missing / self.refill_per_ns) + 1
+
+    def take(self, key: Hashable, now_ns: int) -> None:
+        """Consume one token; callers check `wait_ns` first."""
+
+        level = self._level(key, now_ns)
+        self._buckets[key] = _Bucket(tokens=level - 1.0, updated_ns=now_ns)
+        self._buckets.move_to_end(key)
+        self._evict(now_ns)
+
+    def _evict(self, now_ns: int) -> None:
+        buckets = self._buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            expired = self.ttl_ns is not None and now_ns - bucket.updated_ns >= self.ttl_ns
+            if not expired and len(buckets) <= self.max_entries:
+                break
+            del buckets[key]
+
+
+class RateLimiter:
+    """Token buckets per (event_type, target), per target, and globally.
+
+    Callers check `wait_ns` first and `take` only once it is 0, so a token is
+    only taken from every configured bucket when all of them have one available.
+    """
+
+    def __init__(self, config: RateLimitConfig) -> None:
+        self.per_event = TokenBuckets(config.per_event) if config.per_event else None
+        self.per_target = TokenBuckets(config.per_target) if config.per_target else None
+        self.overall = TokenBuckets(config.overall) if config.overall else None
+        # Most configs set no rate limits: `wait_ns`/`take` then skip building scopes on the hot path.
+        self.enabled = any(b is not None for b in (self.per_event, self.per_target, self.overall))
+
+    def _scopes(self, event_type: str, target: str) -> list[tuple[TokenBuckets, Hashable]]:
+        scopes = []
+        if self.per_event is not None:
+            scopes.append((self.per_event, (event_type, target)))
+        if self.per_target is not None:
+            scopes.append((self.per_target, target))
+        if self.overall is not None:
+            scopes.append((self.overall, None))
+        return scopes
+
+    def wait_ns(self, event_type: str, target: str, now_ns: int) -> int:
+        """Nanoseconds until every applicable bucket has a token (nothing consumed)."""
+
+        if not self.enabled:
+            return 0
+        return max((buckets.wait_ns(key, now_ns) for buckets, key in self._scopes(event_type, target)), default=0)
+
+    def take(self, event_type: str, target: str, now_ns: int) -> None:
+        """Consume one token from each applicable bucket; callers check `wait_ns` first."""
+
+        if not self.enabled:
+            return
+        for buckets, key in self._scopes(event_type, target):
+            buckets.take(key, now_ns)
+
+    def gates(self, event_type: str, target: str) -> list[Gate]:
+        """Every applicable bucket as a `Gate`, for a shared cooldown backend to hold instead of this process.
+
+        Keys name each scope's spec, so a reload that changes it starts that
+        scope's shared buckets afresh, as `reconfigured` does here.
+        """
+
+        gates = []
+        for scope, buckets, key in (
+            ("per_event", self.per_event, f"{event_type}\x1f{target}"),
+            ("per_target", self.per_target, target),
+            ("global", self.overall, ""),
+        ):
+            if buckets is not None:
+                spec = buckets.spec
+                name = f"rate_limits.{scope} {spec.burst}/{spec.per_minute:g}"
+                gates.append(Gate((name, key), buckets.interval_ns, spec.burst))
+        return gates
+
+    @property
+    def horizon_ns(self) -> int:
+        """How long an untouched bucket takes to fill up again (0 without rate limits)."""
+
+        scopes = (self.per_event, self.per_target, self.overall)
+        return max((b.spec.burst * b.interval_ns for b in scopes if b is not None), default=0)
+
+    def reconfigured(self, config: RateLimitConfig) -> RateLimiter:
+        """A limiter for `config` that keeps the buckets of every scope whose spec is unchanged."""
+
+        limiter = RateLimiter(config)
+        for scope in ("per_event", "per_target", "overall"):
+            old, new = getattr(self, scope), getattr(limiter, scope)
+            if old is not None and new is not None and old.spec == new.spec:
+                setattr(limiter, scope, old)
+        return limiter
+
+    def __len__(self) -> int:
+        return sum(len(b) for b in (self.per_event, self.per_target, self.overall) if b is not None)
@@ -0,0 +1,214 @@
+"""Watch the config file and hot-reload it without restarting the service.
+
+A background thread waits on the file with the same waiters the outbox tailer
+uses (`watch.open_waiter`: inotify, or adaptive polling), and re-checks the
+file's (mtime, size, inode) on every wake and at least every
+`poll_interval_s`, so editors that save by renaming a new file over the old
+one are picked up too. On change it runs `load_config_cached` and hands the
+result to `apply` (normally `PolicyEngine.reload`) off the request path. A
+config that fails to load or validate is rejected and the old one stays live.
+
+Settings that are wired into long-lived objects at startup (listen address,
+shared secret, dry-run, transport, dispatch queue, PiShock credentials,
+cooldown backend, decision journal) are not swapped; a reload that changes them is applied for
+everything else and reports them under `restart_required`.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from .config import ServiceConfig, load_config_cached
+from .watch import open_waiter
+
+RESTART_FIELDS = (
+    "bind_host",
+    "bind_port",
+    "shared_secret",
+    "dry_run",
+    "transport",
+    "dispatch",
+    "cooldown_backend",
+    "journal",
+    "dedupe",
+    "datagram",
+    "pishock.username",
+    "pishock.apikey",
+    "pishock.name",
+)
+
+RELOAD_RESULTS = ("ok", "rejected")
+
+
+def restart_required(old: ServiceConfig, new: ServiceConfig) -> list[str]:
+    """`RESTART_FIELDS` whose value differs between `old` and `new`."""
+
+    changed = []
+    for name in RESTART_FIELDS:
+        section, _, attr = name.rpartition(".")
+        before = getattr(getattr(old, section) if section else old, attr)
+        after = getattr(getattr(new, section) if section else new, attr)
+        if before != after:
+            changed.append(name)
+    return changed
+
+
+def _file_signature(path: Path) -> tuple[int, int, int] | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class ConfigReloader:
+    """Reload `path` into `apply` whenever the file changes."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        config: ServiceConfig,
+        apply: Callable[[ServiceConfig], None],
+        logger: logging.Logger,
+        *,
+        poll_interval_s: float = 0.5,
+        debounce_s: float = 0.05,
+        tail_mode: str = "auto",
+    ) -> None:
+        self.path = Path(path)
+        self.config = config
+        self._apply = apply
+        self._logger = logger
+        self.poll_interval_s = poll_interval_s
+        self.debounce_s = debounce_s
+        self.tail_mode = tail_mode
+        self._signature = _file_signature(self.path)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self.generation = 0
+        self.counts = dict.fromkeys(RELOAD_RESULTS, 0)
+        self.last_result: str | None = None
+        self.last_error: str | None = None
+        self.last_reload_ms: float | None = None
+        self.last_restart_required: list[str] = []
+
+    def check(self) -> bool | None:
+        """Reload if the file changed since the last look.
+
+        Returns None when unchanged (or missing mid-replace), otherwise whether
+        the new config was applied.
+        """
+
+        signature = _file_signature(self.path)
+        if signature is None or signature == self._signature:
+            return None
+        self._signature = signature
+        return self.reload_now()
+
+    def reload_now(self) -> bool:
+        """Load, validate and apply the file; keep the live config on any failure."""
+
+        with self._lock:
+            start = time.perf_counter_ns()
+            try:
+                config = load_config_cached(self.path)
+                self._apply(config)
+            except Exception as exc:  # pylint: disable=broad-except
+                # Anything from YAML syntax to a bad mapping: the old config stays live.
+                elapsed_ms = (time.perf_counter_ns() - start) / 1e6
+                self._record("rejected", elapsed_ms, f"{type(exc).__name__}: {exc}")
+                self._logger.warning(
+                    "config_reload_rejected",
+                    extra={"path": str(self.path), "error": self.last_error, "reload_ms": round(elapsed_ms, 3)},
+                )
+                return False
+
+            elapsed_ms = (time.perf_counter_ns() - start) / 1e6
+            changed = restart_required(self.config, config)
+            self.config = config
+            self.generation += 1
+            self._record("ok", elapsed_ms, None)
+            self.last_restart_required = changed
+            self._logger.info(
+                "config_reloaded",
+                extra={
+                    "path": str(self.path),
+                    "generation": self.generation,
+                    "reload_ms": round(elapsed_ms, 3),
+                    "restart_required": changed,
+                },
+            )
+            return True
+
+    def _record(self, result: str, elapsed_ms: float, error: str | None) -> None:
+        self.counts[result] += 1
+        self.last_result = result
+        self.last_error = error
+        self.last_reload_ms = elapsed_ms
+
+    def _run(self) -> None:
+        waiter = open_waiter(self.path, self.tail_mode, max_poll_interval_s=self.poll_interval_s)
+        try:
+            while not self._stop.is_set():
+                if waiter.wait(self.poll_interval_s):
+                    # Let a multi-write save finish, then follow a renamed-in file.
+                    time.sleep(self.debounce_s)
+                    try:
+                        waiter.rewatch()
+                    except OSError:
+                        pass
+                if not self._stop.is_set():
+                    self.check()
+        finally:
+            waiter.close()
+
+    def start(self) -> ConfigReloader:
+        self._thread = threading.Thread(target=self._run, name="config-reload", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval_s + 1.0)
+            self._thread = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "generation": self.generation,
+            "reloads": dict(self.counts),
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+            "last_reload_ms": None if self.last_reload_ms is None else round(self.last_reload_ms, 3),
+            "restart_required": list(self.last_restart_required),
+        }
+
+    def metric_lines(self) -> list[str]:
+        """Reload counters and the last reload's duration, for `Metrics.add_gauges`."""
+
+        lines = [
+            "# HELP middleware_config_reloads_total Config file reloads by result.",
+            "# TYPE middleware_config_reloads_total counter",
+        ]
+        lines += [f'middleware_config_reloads_total{{result="{r}"}} {self.counts[r]}' for r in RELOAD_RESULTS]
+        lines += [
+            "# HELP middleware_config_generation Number of config reloads applied since start.",
+            "# TYPE middleware_config_generation gauge",
+            f"middleware_config_generation {self.generation}",
+        ]
+        if self.last_reload_ms is not None:
+            lines += [
+                "# HELP middleware_config_reload_seconds Duration of the last config reload attempt.",
+                "# TYPE middleware_config_reload_seconds gauge",
+                f"middleware_config_reload_seconds {self.last_reload_ms / 1000:.6f}",
+            ]
+        return lines
@@ -0,0 +1,273 @@
+"""Retries and a circuit breaker around PiShock sends.
+
+`Resilience` wraps one attempt at sending an action:
+
+- Retries: up to `transport.max_attempts`, with full-jitter exponential
+  backoff, and only for results marked `retryable` (connect errors, HTTP
+  429/503). A timeout or a 5xx may already have actuated the device, so those
+  are never repeated.
+- Circuit breaker, one per endpoint URL: `breaker_failures` consecutive
+  upstream failures (no response, 5xx, 429) open it; while open, sends fail
+  fast with `CircuitOpenError` instead of waiting out the timeout. After
+  `breaker_reset_s` one half-open probe is let through: success closes the
+  breaker, failure re-opens it.
+
+Per-action deadlines are enforced by the caller: the dispatcher drops stale
+actions and bounds the whole retry loop; the blocking path takes a deadline.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import TYPE_CHECKING, Any
+
+from .config import TransportConfig
+
+if TYPE_CHECKING:
+    # Typing only: importing the client pulls in httpx.
+    from .pishock_http import PiShockResult
+
+BREAKER_STATES = ("closed", "open", "half_open")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending while an endpoint's circuit breaker is open."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an action's deadline passed before it could be sent."""
+
+
+def is_upstream_failure(result: PiShockResult) -> bool:
+    """Whether `result` says the endpoint is unhealthy (vs. e.g. a rejected request)."""
+
+    return not result.ok and (result.status_code == 0 or result.status_code == 429 or result.status_code >= 500)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one endpoint; thread-safe."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        *,
+        failure_threshold: int = 5,
+        reset_timeout_s: float = 10.0,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.opened = 0
+        self.short_circuited = 0
+
+    def allow(self) -> bool:
+        """Take permission for one attempt; False (counted) while open."""
+
+        with self._lock:
+            if self.state == "open":
+                if self._clock() - self._opened_at < self.reset_timeout_s:
+                    self.short_circuited += 1
+                    return False
+                self.state = "half_open"
+                self._probes = 0
+            if self.state == "half_open":
+                if self._probes >= self.half_open_probes:
+                    self.short_circuited += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def record(self, healthy: bool) -> None:
+        """Report the outcome of an attempt `allow` permitted."""
+
+        with self._lock:
+            if self.state == "half_open":
+                self._probes = max(0, self._probes - 1)
+            if healthy:
+                self.failures = 0
+                self.state = "closed"
+                return
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self._opened_at = self._clock()
+                self.opened += 1
+
+    def release(self) -> None:
+        """Give back a permitted attempt that never completed (cancelled)."""
+
+        with self._lock:
+            if self.state == "half_open":
+                self._probes = max(0, self._probes - 1)
+
+    def retry_after_s(self) -> float:
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.reset_timeout_s - (self._clock() - self._opened_at))
+
+
+class Resilience:
+    """Retry policy plus the endpoint's breaker; shared by every send to one endpoint."""
+
+    def __init__(
+        self,
+        transport: TransportConfig,
+        *,
+        rng: Callable[[float, float], float] = random.uniform,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.endpoint = transport.url
+        self.timeout_s = transport.timeout_s
+        self.max_attempts = transport.max_attempts
+        self.backoff_ms = transport.backoff_ms
+        self.backoff_max_ms = transport.backoff_max_ms
+        self.breaker = CircuitBreaker(
+            transport.url,
+            failure_threshold=transport.breaker_failures,
+            reset_timeout_s=transport.breaker_reset_s,
+            clock=clock,
+        )
+        self._rng = rng
+        self.attempts = 0
+        self.retries = 0
+
+    def backoff_s(self, attempt: int) -> float:
+        """Full-jitter delay before retry number `attempt` (1-based)."""
+
+        cap_ms = min(self.backoff_max_ms, self.backoff_ms * (2 ** (attempt - 1)))
+        return self._rng(0.0, cap_ms) / 1000
+
+    def _admit(self, last: PiShockResult | None) -> bool:
+        if self.breaker.allow():
+            self.attempts += 1
+            return True
+        if last is None:
+            raise CircuitOpenError(
+                f"Circuit open for {self.endpoint} (retry in {self.breaker.retry_after_s():.1f} s)"
+            )
+        return False
+
+    def _settle(self, result: PiShockResult, attempt: int) -> bool:
+        """Record `result`; True when another attempt should follow."""
+
+        self.breaker.record(not is_upstream_failure(result))
+        if result.ok or not result.retryable or attempt >= self.max_attempts:
+            return False
+        self.retries += 1
+        return True
+
+    async def run(self, send: Callable[[], Awaitable[PiShockResult]]) -> PiShockResult:
+        """Send with retries. Raises `CircuitOpenError` if the first attempt is refused.
+
+        Cancellation (e.g. the dispatcher's deadline) stops the loop at any point.
+        """
+
+        last: PiShockResult | None = None
+        for attempt in range(1, self.max_attempts + 1):
+            if not self._admit(last):
+                break
+            try:
+                last = await send()
+            except BaseException:
+                self.breaker.release()
+                raise
+            if not self._settle(last, attempt):
+                break
+            await asyncio.sleep(self.backoff_s(attempt))
+        return last
+
+    def run_blocking(
+        self, send: Callable[[float], PiShockResult], deadline_ns: int | None = None
+    ) -> PiShockResult:
+        """Blocking `run`; `send` gets the per-attempt timeout, cut short by `deadline_ns`.
+
+        Raises `DeadlineExceeded` if the deadline passed before the first attempt.
+        """
+
+        last: PiShockResult | None = None
+        for attempt in range(1, self.max_attempts + 1):
+            timeout_s = self.timeout_s
+            if deadline_ns is not None:
+                remaining_s = (deadline_ns - time.monotonic_ns()) / 1e9
+                if remaining_s <= 0:
+                    if last is None:
+                        raise DeadlineExceeded(f"Deadline passed before sending to {self.endpoint}")
+                    break
+                timeout_s = min(timeout_s, remaining_s)
+            if not self._admit(last):
+                break
+            try:
+                last = send(timeout_s)
+            except BaseException:
+                self.breaker.release()
+                raise
+            if not self._settle(last, attempt):
+                break
+            time.sleep(self.backoff_s(attempt))
+        return last
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "endpoint": self.endpoint,
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "breaker_opened": self.breaker.opened,
+            "short_circuited": self.breaker.short_circuited,
+            "attempts": self.attempts,
+            "retries": self.retries,
+        }
+
+    def metric_lines(self) -> list[str]:
+        """Breaker state and retry counters for `Metrics.add_gauges`."""
+
+        endpoint = self.endpoint.replace("\\", "\\\\").replace('"', '\\"')
+        lines = [
+            "# HELP middleware_breaker_state Circuit breaker state per endpoint (1 for the current state).",
+            "# TYPE middleware_breaker_state gauge",
+        ]
+        lines += [
+            f'middleware_breaker_state{{endpoint="{endpoint}",state="{state}"}} {int(self.breaker.state == state)}'
+            for state in BREAKER_STATES
+        ]
+        lines += [
+            "# HELP middleware_breaker_opened_total Times the endpoint's circuit breaker opened.",
+            "# TYPE middleware_breaker_opened_total counter",
+            f'middleware_breaker_opened_total{{endpoint="{endpoint}"}} {self.breaker.opened}',
+            "# HELP middleware_breaker_short_circuited_total Sends refused while the breaker was open.",
+            "# TYPE middleware_breaker_short_circuited_total counter",
+            f'middleware_breaker_short_circuited_total{{endpoint="{endpoint}"}} {self.breaker.short_circuited}',
+            "# HELP middleware_dispatch_retries_total PiShock send attempts that were retries.",
+            "# TYPE middleware_dispatch_retries_total counter",
+            f'middleware_dispatch_retries_total{{endpoint="{endpoint}"}} {self.retries}',
+        ]
+        return lines
+
+
+# One per endpoint and settings for the process, so the file ingester's
+# per-line sends share breaker state.
+_registry: dict[TransportConfig, Resilience] = {}
+_registry_lock = threading.Lock()
+
+
+def resilience_for(transport: TransportConfig) -> Resilience:
+    """The process-wide `Resilience` for `transport`'s endpoint and settings."""
+
+    with _registry_lock:
+        resilience = _registry.get(transport)
+        if resilience is None:
+            resilience = _registry[transport] = Resilience(transport)
+        return resilience
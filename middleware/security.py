@@ -2,14 +2,94 @@
 
 from __future__ import annotations
 
+import functools
 import hashlib
 import hmac
+from collections.abc import Iterable, Sequence
+from concurrent.futures import Executor
+
+
+class SignatureVerifier:
+    """HMAC-SHA256 verifier keyed once from the shared secret.
+
+    The keyed HMAC state (inner/outer padded key) is built in `__init__` and
+    cloned per message, instead of re-encoding the secret and re-deriving the
+    pads for every event.
+    """
+
+    def __init__(self, shared_secret: str) -> None:
+        self._keyed = hmac.new(shared_secret.encode("utf-8"), digestmod=hashlib.sha256)
+
+    def sign(self, body: bytes) -> str:
+        """Return the hex HMAC-SHA256 of `body`."""
+
+        mac = self._keyed.copy()
+        mac.update(body)
+        return mac.hexdigest()
+
+    def verify(self, body: bytes, signature: str | None) -> bool:
+        """Validate a hex signature against the raw body (constant-time compare)."""
+
+        if not signature:
+            return False
+        try:
+            return hmac.compare_digest(self.sign(body), signature)
+        except TypeError:
+            # compare_digest rejects non-ASCII str; such a signature can't match.
+            return False
+
+    def verify_many(
+        self,
+        items: Iterable[tuple[bytes, str | None]],
+        *,
+        executor: Executor | None = None,
+        chunk_size: int = 512,
+    ) -> list[bool]:
+        """Verify `(body, signature)` pairs, preserving input order.
+
+        With an `executor`, chunks are verified in parallel. Worth it for large
+        backlogs: hashlib releases the GIL while hashing inputs over ~2 KiB.
+        """
+
+        pairs = items if isinstance(items, Sequence) else list(items)
+        if executor is None or len(pairs) <= chunk_size:
+            return self._verify_chunk(pairs)
+
+        chunks = [pairs[i : i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+        results: list[bool] = []
+        for chunk_result in executor.map(self._verify_chunk, chunks):
+            results.extend(chunk_result)
+        return results
+
+    def _verify_chunk(self, chunk: Sequence[tuple[bytes, str | None]]) -> list[bool]:
+        # Same logic as `verify`, with attribute lookups hoisted out of the loop.
+        copy = self._keyed.copy
+        compare = hmac.compare_digest
+        results = []
+        for body, signature in chunk:
+            if not signature:
+                results.append(False)
+                continue
+            mac = copy()
+            mac.update(body)
+            try:
+                results.append(compare(mac.hexdigest(), signature))
+            except TypeError:
+                results.append(False)
+        return results
+
+
+@functools.lru_cache(maxsize=8)
+def verifier_for(shared_secret: str) -> SignatureVerifier:
+    """Shared verifier per secret, so call sites holding only config stay cheap."""
+
+    return SignatureVerifier(shared_secret)
 
 
 def verify_signature(body: bytes, signature: str | None, shared_secret: str) -> bool:
-    """Validate HMAC-SHA256 signature against raw request body."""
+    """Validate HMAC-SHA256 signature against raw request body.
+
+    Compatibility wrapper over `SignatureVerifier`.
+    """
 
-    if not signature:
-        return False
-    expected = hmac.new(shared_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
-    return hmac.compare_digest(expected, signature)
+    return verifier_for(shared_secret).verify(body, signature)
@@ -0,0 +1,472 @@
+"""Replay a recorded outbox against a grid of policy settings, offline.
+
+Answers "what would last night's session have felt like with a 2 s cooldown
+and a shock cap of 40?" without sending anything. The outbox
+(`<sig_hex>\\t<json_body>` lines) is verified and decoded once, replayed in
+`ts_ms` order with the emitter timestamps as the clock, and evaluated with
+`PolicyEngine.decide` semantics: mapping lookup, the shock opt-in and armed
+check, damage scaling and caps, rate limits and cooldowns. Per event, every
+grid point is decided at once as NumPy array operations, and the grid is split
+across a process pool, so a sweep costs roughly one replay per worker instead
+of one per configuration.
+
+Each configuration reports outcome counts, actions per mode, total
+shock-seconds (sum of accepted shock durations) and the shock intensity
+distribution.
+
+Damage coalescing windows (`coalesce_window_ms`) depend on flush timing and
+are not simulated; a grid whose configs use them is rejected.
+
+    python -m middleware.simulate outbox.log --grid cooldown_ms=500,1000,2000 \\
+        --grid session_max_shock_level=25:100:25 --grid max_intensity=20,40
+
+NumPy is an optional dependency (`pip install .[sim]`).
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any
+
+from .config import MAPPING_MODES, ServiceConfig, compile_event_mappings, load_config_cached
+from .events import Event, EventFormatError, decode_event
+from .pipeline import split_signed_line
+from .policy import PolicyError, damage_ratio
+from .ratelimit import TokenBuckets
+from .security import SignatureVerifier
+
+# Per-event decision codes, as indices into this tuple. `cooldown` and
+# `rate_limited` are both a 429 `cooldown` outcome on the live paths;
+# `unmapped` is a `policy_error` there.
+SIM_OUTCOMES = ("accepted", "cooldown", "rate_limited", "policy_error", "unmapped")
+SWEEP_CONFIG_KEYS = ("max_intensity", "max_duration_ms", "default_cooldown_ms", "session_max_shock_level")
+SWEEP_MAPPING_KEYS = ("intensity", "duration_ms", "cooldown_ms")
+
+_ACCEPTED, _COOLDOWN, _RATE_LIMITED, _POLICY_ERROR, _UNMAPPED = range(len(SIM_OUTCOMES))
+# "Never fired": far enough in the past that any cooldown has expired.
+_NEVER_NS = -(1 << 62)
+# Bounds the (events x configs) decision matrices held per chunk.
+_CHUNK_CELLS = 4_000_000
+
+
+def _numpy() -> Any:
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ModuleNotFoundError as exc:
+        raise RuntimeError("NumPy is required for the policy simulator (pip install numpy)") from exc
+    return numpy
+
+
+@dataclass(frozen=True)
+class SweepPoint:
+    """One grid combination: the swept values and the config they produce."""
+
+    params: dict[str, int]
+    config: ServiceConfig
+
+
+def read_outbox(path: str | Path, shared_secret: str | None) -> tuple[list[Event], dict[str, int]]:
+    """Verified, decoded events from an outbox file, sorted by `ts_ms`.
+
+    Lines are checked like the ingester does (skip verification with
+    `shared_secret=None`). Returns the events and counts of lines read and of
+    each reason a line was skipped.
+    """
+
+    verifier = SignatureVerifier(shared_secret) if shared_secret is not None else None
+    stats = dict.fromkeys(("lines", "malformed_line", "invalid_signature", "invalid_event", "missing_ts"), 0)
+    events = []
+    with Path(path).open("rb") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            stats["lines"] += 1
+            try:
+                signature, body = split_signed_line(line)
+            except ValueError:
+                stats["malformed_line"] += 1
+                continue
+            if verifier is not None and not verifier.verify(body, signature):
+                stats["invalid_signature"] += 1
+                continue
+            try:
+                event = decode_event(body)
+            except EventFormatError:
+                stats["invalid_event"] += 1
+                continue
+            if event.ts_ms is None:
+                stats["missing_ts"] += 1
+                continue
+            events.append(event)
+    events.sort(key=lambda event: event.ts_ms)
+    return events, stats
+
+
+def _parse_values(key: str, text: str) -> list[int]:
+    try:
+        if ":" in text:
+            # start:stop[:step], stop inclusive.
+            start, stop, *step = (int(part) for part in text.split(":"))
+            values = list(range(start, stop + 1, step[0] if step else 1))
+        else:
+            values = [int(part) for part in text.split(",")]
+    except ValueError as exc:
+        raise ValueError(f"--grid {key}: expected integers as a,b,c or start:stop[:step], got {text!r}") from exc
+    if not values:
+        raise ValueError(f"--grid {key}: empty range {text!r}")
+    return values
+
+
+def parse_grid(specs: list[str]) -> dict[str, list[int]]:
+    """Parse `KEY=VALUES` sweep specs.
+
+    `KEY` is a top-level setting (`SWEEP_CONFIG_KEYS`), a mapping setting
+    applied to every mapping (`SWEEP_MAPPING_KEYS`), or one mapping's setting
+    as `<event_type>.<key>`.
+    """
+
+    grid: dict[str, list[int]] = {}
+    for spec in specs:
+        key, sep, text = spec.partition("=")
+        key = key.strip()
+        if not sep:
+            raise ValueError(f"--grid {spec!r}: expected KEY=VALUES")
+        name = key.rpartition(".")[2]
+        if key not in SWEEP_CONFIG_KEYS and name not in SWEEP_MAPPING_KEYS:
+            raise ValueError(
+                f"--grid {key}: expected one of {SWEEP_CONFIG_KEYS}, {SWEEP_MAPPING_KEYS} "
+                "or <event_type>.<mapping key>"
+            )
+        if key in grid:
+            raise ValueError(f"--grid {key}: given more than once")
+        grid[key] = _parse_values(key, text)
+    return grid
+
+
+def expand_grid(base: ServiceConfig, grid: dict[str, list[int]]) -> list[SweepPoint]:
+    """Every combination of `grid` applied to `base`, validated like a loaded config.
+
+    Raises `ConfigError` for an invalid combination and `ValueError` for an
+    unknown event type or a config the simulator cannot model.
+    """
+
+    keys = list(grid)
+    points = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        params = dict(zip(keys, values))
+        top = {key: value for key, value in params.items() if key in SWEEP_CONFIG_KEYS}
+        mappings = {event_type: dict(mapping) for event_type, mapping in base.event_mappings.items()}
+        # Bare mapping keys first, so `<event_type>.<key>` overrides them.
+        for key, value in sorted(params.items(), key=lambda item: "." in item[0]):
+            if key in SWEEP_CONFIG_KEYS:
+                continue
+            event_type, _, name = key.rpartition(".")
+            if event_type and event_type not in mappings:
+                raise ValueError(f"--grid {key}: no mapping for event_type={event_type}")
+            for mapped_type, mapping in mappings.items():
+                if not event_type or mapped_type == event_type:
+                    mapping[name] = value
+        config = replace(base, **top, event_mappings=mappings)
+        for rule in compile_event_mappings(config).values():
+            if rule.damage_scaled and rule.coalesce_window_ms:
+                raise ValueError(
+                    f"event_mappings.{rule.event_type}.coalesce_window_ms: coalescing windows are not simulated"
+                )
+        points.append(SweepPoint(params, config))
+    return points
+
+
+def _columns(events: list[Event], event_types: list[str]) -> dict[str, Any]:
+    """Per-event arrays the simulation reads; `type` is -1 for unmapped events."""
+
+    np = _numpy()
+    type_ids = {event_type: i for i, event_type in enumerate(event_types)}
+    ratios = []
+    ratio_ok = []
+    for event in events:
+        try:
+            ratios.append(damage_ratio(event))
+            ratio_ok.append(True)
+        except (PolicyError, KeyError, TypeError, ValueError):
+            ratios.append(0.0)
+            ratio_ok.append(False)
+    ts_ms = np.array([event.ts_ms for event in events], dtype=np.int64)
+    if len(ts_ms) > 1 and np.any(np.diff(ts_ms) < 0):
+        raise ValueError("events must be in ts_ms order (read_outbox sorts them)")
+    return {
+        "ts_ns": ts_ms * 1_000_000,
+        "type": np.array([type_ids.get(event.event_type, -1) for event in events], dtype=np.int32),
+        "armed": np.array([event.armed for event in events], dtype=bool),
+        "ratio": np.array(ratios, dtype=np.float64),
+        "ratio_ok": np.array(ratio_ok, dtype=bool),
+    }
+
+
+def _uniform(keys: Any) -> Any:
+    """`keys` (one per config) as a plain int when they are all equal.
+
+    Basic indexing with an int is much cheaper than gathering per config, and
+    keys only differ between configs when a sweep changes a mapping's target.
+    """
+
+    first = int(keys[0])
+    return first if (keys == first).all() else keys
+
+
+class _Buckets:
+    """One rate-limit scope's token buckets for every config, as (key, config) arrays."""
+
+    def __init__(self, spec: Any, keys: list[Any], key_count: int, configs: int) -> None:
+        np = _numpy()
+        # Same capacity/refill/TTL arithmetic as the live limiter.
+        reference = TokenBuckets(spec)
+        self.capacity = reference.capacity
+        self.refill_per_ns = reference.refill_per_ns
+        self.ttl_ns = reference.ttl_ns
+        self.keys = keys  # per event type: bucket key (int or per-config array)
+        self.tokens = np.zeros((key_count, configs))
+        self.updated = np.zeros((key_count, configs), dtype=np.int64)
+        self.present = np.zeros((key_count, configs), dtype=bool)
+        # `TokenBuckets.take` evicts every bucket that would be full again; a
+        # bucket counts as evicted once a later take happened that late.
+        self.last_take = np.full(configs, _NEVER_NS, dtype=np.int64)
+
+
+def _decide_all(
+    cols: dict[str, Any], event_types: list[str], configs: list[ServiceConfig]
+) -> tuple[Any, Any, Any, Any]:
+    """Decide every event for every config.
+
+    Returns `(codes, intensity, mode, duration_ms)` matrices of shape
+    (events, configs): indices into `SIM_OUTCOMES`, the action intensity (0
+    unless accepted), the mapping's index into `MAPPING_MODES` (-1 for unmapped
+    events) and the action duration (0 unless accepted).
+    """
+
+    np = _numpy()
+    g = len(configs)
+    limits = configs[0].rate_limits
+    if any(config.rate_limits != limits for config in configs):
+        raise ValueError("all simulated configs must share rate_limits")
+
+    rule_keys: dict[tuple[str, str], int] = {}
+    targets: dict[str, int] = {}
+    shape = (max(1, len(event_types)), g)
+    shock, scaled = np.zeros(shape, dtype=bool), np.zeros(shape, dtype=bool)
+    intensity, duration_ms, cooldown_ns = (np.zeros(shape, dtype=np.int64) for _ in range(3))
+    rule_key, target_key = np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.int64)
+    mode = np.zeros(shape, dtype=np.int8)
+    for j, config in enumerate(configs):
+        rules = compile_event_mappings(config)
+        for t, event_type in enumerate(event_types):
+            rule = rules[event_type]
+            shock[t, j] = rule.mode == "shock"
+            scaled[t, j] = rule.damage_scaled
+            intensity[t, j] = rule.intensity
+            duration_ms[t, j] = rule.duration_ms
+            cooldown_ns[t, j] = rule.cooldown_ms * 1_000_000
+            rule_key[t, j] = rule_keys.setdefault((event_type, rule.target), len(rule_keys))
+            target_key[t, j] = targets.setdefault(rule.target, len(targets))
+            mode[t, j] = MAPPING_MODES.index(rule.mode)
+    allow_shock = np.array([config.allow_shock for config in configs], dtype=bool)
+    max_intensity = np.array([config.max_intensity for config in configs], dtype=np.int64)
+    session_max = np.array([config.session_max_shock_level for config in configs], dtype=np.int64)
+
+    # Scope order matches `RateLimiter._scopes`.
+    scopes = []
+    if limits.per_event is not None:
+        scopes.append(_Buckets(limits.per_event, [_uniform(k) for k in rule_key], len(rule_keys), g))
+    if limits.per_target is not None:
+        scopes.append(_Buckets(limits.per_target, [_uniform(k) for k in target_key], len(targets), g))
+    if limits.overall is not None:
+        scopes.append(_Buckets(limits.overall, [0] * shape[0], 1, g))
+    cooldown_keys = [_uniform(k) for k in rule_key]
+
+    # Everything that does not depend on earlier decisions, for all events at once.
+    types, armed = cols["type"], cols["armed"]
+    mapped = types >= 0
+    by_type = np.maximum(types, 0)
+    denied = shock[by_type] & ~(allow_shock & armed[:, None])
+    denied |= scaled[by_type] & ~cols["ratio_ok"][:, None]
+    damage_intensity = np.minimum(np.maximum(1, np.rint(cols["ratio"][:, None] * session_max)), max_intensity)
+    action_intensity = np.where(scaled[by_type], damage_intensity, intensity[by_type]).astype(np.int32)
+    codes = np.full((len(types), g), _UNMAPPED, dtype=np.int8)
+    codes[mapped] = _POLICY_ERROR
+
+    last_fired = np.full((max(1, len(rule_keys)), g), _NEVER_NS, dtype=np.int64)
+    rows = np.arange(g)
+    ts_ns, type_list = cols["ts_ns"].tolist(), types.tolist()
+    for i in np.flatnonzero(mapped & ~denied.all(axis=1)).tolist():
+        t, now_ns = type_list[i], ts_ns[i]
+        allowed = ~denied[i]
+        code = codes[i]
+
+        # Rate limits are checked without consuming, as in `decide`.
+        levels = []
+        for scope in scopes:
+            key = scope.keys[t]
+            at = key if isinstance(key, int) else (key, rows)
+            updated = scope.updated[at]
+            present = scope.present[at]
+            if scope.ttl_ns is not None:
+                present = present & (scope.last_take - updated < scope.ttl_ns)
+            level = np.where(
+                present,
+                np.minimum(scope.capacity, scope.tokens[at] + (now_ns - updated) * scope.refill_per_ns),
+                scope.capacity,
+            )
+            limited = allowed & (1.0 - level > 0)
+            code[limited] = _RATE_LIMITED
+            allowed &= ~limited
+            levels.append((at, level))
+
+        key = cooldown_keys[t]
+        at = key if isinstance(key, int) else (key, rows)
+        cooling = allowed & (last_fired[at] + cooldown_ns[t] - now_ns > 0)
+        code[cooling] = _COOLDOWN
+        fired = allowed & ~cooling
+        if not fired.any():
+            continue
+        code[fired] = _ACCEPTED
+        fired_at = (at, fired) if isinstance(at, int) else (at[0][fired], rows[fired])
+        last_fired[fired_at] = now_ns
+        for scope, (at, level) in zip(scopes, levels):
+            fired_at = (at, fired) if isinstance(at, int) else (at[0][fired], rows[fired])
+            scope.tokens[fired_at] = level[fired] - 1.0
+            scope.updated[fired_at] = now_ns
+            scope.present[fired_at] = True
+            scope.last_take[fired] = now_ns
+
+    accepted = codes == _ACCEPTED
+    action_intensity[~accepted] = 0
+    action_mode = np.where(mapped[:, None], mode[by_type], -1).astype(np.int8)
+    action_duration = np.where(accepted, duration_ms[by_type], 0)
+    return codes, action_intensity, action_mode, action_duration
+
+
+def trace(events: list[Event], configs: list[ServiceConfig]) -> tuple[Any, Any]:
+    """Per-event `(codes, intensity)` matrices, shape (events, configs).
+
+    `codes` index into `SIM_OUTCOMES`; `intensity` is the accepted action's
+    intensity, 0 otherwise. Events must be in `ts_ms` order.
+    """
+
+    event_types = list(configs[0].event_mappings) if configs else []
+    codes, intensity, _, _ = _decide_all(_columns(events, event_types), event_types, configs)
+    return codes, intensity
+
+
+def _summarize(
+    codes: Any, intensity: Any, action_mode: Any, action_duration: Any, points: list[SweepPoint]
+) -> list[dict[str, Any]]:
+    np = _numpy()
+    accepted = codes == _ACCEPTED
+    shocks = accepted & (action_mode == MAPPING_MODES.index("shock"))
+    shock_ms = np.where(shocks, action_duration, 0).sum(axis=0)
+    results = []
+    for j, point in enumerate(points):
+        column = codes[:, j]
+        outcome_counts = np.bincount(column, minlength=len(SIM_OUTCOMES))
+        mode_counts = np.bincount(action_mode[accepted[:, j], j], minlength=len(MAPPING_MODES))
+        histogram = np.bincount(intensity[shocks[:, j], j])
+        total = int(histogram.sum())
+        cumulative = np.cumsum(histogram)
+
+        def pct(q: float, cumulative: Any = cumulative, total: int = total) -> int | None:
+            if not total:
+                return None
+            return int(np.searchsorted(cumulative, min(total - 1, int(q * total)), side="right"))
+
+        results.append(
+            {
+                "params": point.params,
+                "outcomes": {name: int(count) for name, count in zip(SIM_OUTCOMES, outcome_counts)},
+                "actions": {name: int(count) for name, count in zip(MAPPING_MODES, mode_counts)},
+                "shock_seconds": round(int(shock_ms[j]) / 1000, 3),
+                "shock_intensity": {
+                    "p50": pct(0.50),
+                    "p90": pct(0.90),
+                    "max": int(len(histogram) - 1) if total else None,
+                    "mean": round(float((np.arange(len(histogram)) * histogram).sum() / total), 2) if total else None,
+                    "histogram": {str(value): int(count) for value, count in enumerate(histogram) if count},
+                },
+            }
+        )
+    return results
+
+
+def _sweep_chunk(cols: dict[str, Any], event_types: list[str], points: list[SweepPoint]) -> list[dict[str, Any]]:
+    return _summarize(*_decide_all(cols, event_types, [point.config for point in points]), points)
+
+
+def sweep(events: list[Event], points: list[SweepPoint], workers: int = 1) -> list[dict[str, Any]]:
+    """Summaries for every point, in order, splitting the grid across `workers` processes."""
+
+    if not points:
+        return []
+    event_types = list(points[0].config.event_mappings)
+    cols = _columns(events, event_types)
+    per_chunk = max(1, _CHUNK_CELLS // max(1, len(events)))
+    chunks = max(min(workers, len(points)), -(-len(points) // per_chunk))
+    size = -(-len(points) // chunks)
+    parts = [points[i : i + size] for i in range(0, len(points), size)]
+    if workers <= 1 or len(parts) == 1:
+        return [summary for part in parts for summary in _sweep_chunk(cols, event_types, part)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_sweep_chunk, cols, event_types, part) for part in parts]
+        return [summary for future in futures for summary in future.result()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded outbox against a grid of policy settings")
+    parser.add_argument("outbox", type=Path, help="recorded outbox file (<sig_hex>\\t<json_body> lines)")
+    parser.add_argument(
+        "--config",
+        type=Path,
+        default=Path(os.getenv("MIDDLEWARE_CONFIG", "middleware/config.example.yaml")),
+        help="base config; the grid overrides its values",
+    )
+    parser.add_argument("--grid", action="append", default=[], metavar="KEY=VALUES", help="e.g. cooldown_ms=500,1000")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--no-verify", action="store_true", help="skip signature checks")
+    parser.add_argument("--sort", default="shock_seconds", help="order by shock_seconds or an outcome name")
+    parser.add_argument("--top", type=int, default=None, help="only print the first N configurations")
+    args = parser.parse_args()
+
+    try:
+        base = load_config_cached(args.config)
+        points = expand_grid(base, parse_grid(args.grid))
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.sort != "shock_seconds" and args.sort not in SIM_OUTCOMES:
+        parser.error(f"--sort: expected shock_seconds or one of {SIM_OUTCOMES}")
+
+    events, stats = read_outbox(args.outbox, None if args.no_verify else base.shared_secret)
+    start = time.perf_counter()
+    results = sweep(events, points, args.workers)
+    elapsed_s = time.perf_counter() - start
+
+    results.sort(
+        key=lambda r: r["shock_seconds"] if args.sort == "shock_seconds" else r["outcomes"][args.sort], reverse=True
+    )
+    report = {
+        "input": {**stats, "events": len(events)},
+        "configurations": len(points),
+        "elapsed_s": round(elapsed_s, 3),
+        "decisions_per_s": round(len(events) * len(points) / elapsed_s) if elapsed_s > 0 else None,
+        "results": results[: args.top] if args.top else results,
+    }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
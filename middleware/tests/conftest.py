@@ -0,0 +1,11 @@
+"""Shared fixtures for the middleware tests."""
+
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _private_config_cache(tmp_path_factory, monkeypatch):
+    # Keep `load_config_cached` out of the real user cache directory.
+    monkeypatch.setenv("MIDDLEWARE_CACHE_DIR", str(tmp_path_factory.mktemp("config-cache")))
@@ -0,0 +1,66 @@
+"""Smoke tests for the offline load harness and its fake PiShock endpoint."""
+
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from middleware.bench.events import generate_lines, load_outbox
+from middleware.bench.fake_pishock import FakePiShock
+from middleware.bench.load import percentiles_ms, run
+from middleware.bench.startup import parse_importtime
+from middleware.pishock_http import send_pishock_http
+
+pytest.importorskip("uvicorn")
+
+
+def test_fake_pishock_injects_errors():
+    with FakePiShock(error_rate=1.0, seed=1) as fake:
+        result = send_pishock_http(
+            mode="beep", intensity=1, duration_ms=100, username="u", apikey="k", code="c", name="n", url=fake.url
+        )
+        assert httpx.post(fake.url.replace("apioperate", "other"), json={}).status_code == 404
+    assert (result.ok, result.status_code) == (False, 500)
+    assert fake.stats() == {"requests": 1, "errors": 1, "ops": {2: 1}}
+
+
+def test_load_outbox_skips_unverifiable_lines(tmp_path):
+    lines = generate_lines("s", 3)
+    outbox = tmp_path / "events.log"
+    outbox.write_bytes(b"\n".join([lines[0], b"no-tab", b"00\t" + lines[1].split(b"\t", 1)[1], lines[2]]) + b"\n")
+
+    replay, skipped = load_outbox(outbox, "s")
+
+    assert replay == [lines[0], lines[2]]
+    assert skipped == 2
+
+
+def test_percentiles_use_nearest_rank():
+    samples = [i * 1_000_000 for i in range(1, 101)]
+    assert percentiles_ms(samples) == {"p50": 50.0, "p95": 95.0, "p99": 99.0, "max": 100.0}
+    assert percentiles_ms([])["p99"] is None
+
+
+def test_load_run_drives_both_ingress_paths():
+    report = run(target="both", events=12, concurrency=4, tail_mode="poll")
+
+    for path in ("http", "file"):
+        result = report[path]
+        assert result["completed"] == 12
+        assert result["outcomes"] == {"accepted": 12}
+        assert result["latency_ms"]["p50"] is not None
+    # The file ingester sends synchronously; /event may drop under drop_oldest.
+    assert report["file"]["upstream"]["requests"] == 12
+    dispatch = report["http"]["dispatch"]
+    assert dispatch["sent"] + dispatch["failed"] + dispatch["dropped"] == 12
+
+
+def test_parse_importtime_keeps_nesting():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   middleware.config\n"
+        "import time:        30 |        150 | middleware\n"
+        "noise\n"
+    )
+
+    assert parse_importtime(stderr) == [("  middleware.config", 120, 120), ("middleware", 30, 150)]
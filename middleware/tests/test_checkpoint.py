@@ -0,0 +1,62 @@
+"""Tests for batched, atomic ingest checkpoints."""
+
+from __future__ import annotations
+
+import os
+
+from middleware.checkpoint import Checkpointer, CheckpointState, load_checkpoint, write_checkpoint
+
+
+def test_roundtrip_records_file_identity(tmp_path):
+    path = tmp_path / "outbox.offset"
+    write_checkpoint(path, CheckpointState(offset=42, inode=7, size=100), fsync=True)
+    assert load_checkpoint(path) == CheckpointState(offset=42, inode=7, size=100)
+    assert not (tmp_path / "outbox.offset.tmp").exists()
+
+
+def test_legacy_plain_integer_offset_is_accepted(tmp_path):
+    path = tmp_path / "outbox.offset"
+    path.write_text("123", encoding="utf-8")
+    assert load_checkpoint(path).offset == 123
+
+
+def test_matches_detects_replaced_or_truncated_file(tmp_path):
+    outbox = tmp_path / "events.log"
+    outbox.write_bytes(b"x" * 10)
+    stat = os.stat(outbox)
+
+    assert CheckpointState(offset=10, inode=stat.st_ino).matches(stat)
+    assert not CheckpointState(offset=10, inode=stat.st_ino + 1).matches(stat)
+    assert not CheckpointState(offset=11, inode=stat.st_ino).matches(stat)
+    # Truncated and rewritten in place: the offset still fits, the recorded size does not.
+    assert CheckpointState(offset=4, inode=stat.st_ino, size=10).matches(stat)
+    assert not CheckpointState(offset=4, inode=stat.st_ino, size=12).matches(stat)
+
+
+def test_checkpointer_group_commits_every_n_lines(tmp_path):
+    path = tmp_path / "outbox.offset"
+    cp = Checkpointer(path, every_lines=3, every_ms=60_000)
+
+    cp.update(10)
+    cp.update(20)
+    assert not path.exists()
+    cp.update(30)
+    assert load_checkpoint(path).offset == 30
+
+    cp.update(40)
+    assert load_checkpoint(path).offset == 30
+    cp.flush()
+    assert load_checkpoint(path).offset == 40
+    assert cp.commits == 2
+
+
+def test_switch_commits_the_start_of_a_segment_and_tags_later_updates(tmp_path):
+    path = tmp_path / "outbox.offset"
+    checkpointer = Checkpointer(path, every_lines=100)
+    checkpointer.switch(3, inode=9, size=0)
+    assert load_checkpoint(path) == CheckpointState(offset=0, inode=9, size=0, segment=3)
+
+    checkpointer.update(120, inode=9, size=120)
+    checkpointer.flush()
+    assert Checkpointer(path).segment == 3
+    assert load_checkpoint(path).offset == 120
@@ -0,0 +1,205 @@
+"""Config loading and mapping compilation tests."""
+
+from __future__ import annotations
+
+import os
+import stat
+
+import pytest
+
+from middleware.config import (
+    ConfigError,
+    PiShockCredentials,
+    ServiceConfig,
+    compile_event_mappings,
+    default_cache_path,
+    load_config,
+    load_config_cached,
+)
+
+
+def _cfg(event_mappings: dict) -> ServiceConfig:
+    return ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=8787,
+        shared_secret="s",
+        dry_run=True,
+        allow_shock=True,
+        max_intensity=20,
+        max_duration_ms=2000,
+        default_cooldown_ms=1500,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
+        event_mappings=event_mappings,
+    )
+
+
+def test_example_config_loads():
+    cfg = load_config("middleware/config.example.yaml")
+    assert cfg.event_mappings["player_damaged"]["mode"] == "shock"
+
+
+def test_compiled_rules_are_clamped_and_resolved():
+    rules = compile_event_mappings(
+        _cfg(
+            {
+                "player_damaged": {"mode": "shock", "intensity": 0, "duration_ms": 50},
+                "evt": {"mode": "vibrate", "intensity": 99, "duration_ms": 99999, "target": "other"},
+            }
+        )
+    )
+
+    damaged, evt = rules["player_damaged"], rules["evt"]
+    assert (damaged.intensity, damaged.duration_ms, damaged.cooldown_ms) == (1, 100, 1500)
+    assert damaged.damage_scaled is True
+    assert (evt.intensity, evt.duration_ms, evt.target, evt.damage_scaled) == (20, 2000, "other", False)
+    with pytest.raises(AttributeError):
+        evt.intensity = 5
+
+
+@pytest.mark.parametrize(
+    ("mapping", "fragment"),
+    [
+        ({"mode": "zap"}, "event_mappings.evt.mode"),
+        ({"mode": "beep", "intensity": "loud"}, "event_mappings.evt.intensity"),
+        ({"mode": "beep", "cooldown": 5}, "unknown key(s) cooldown"),
+        ({"mode": "beep", "max_age_ms": -1}, "max_age_ms must be >= 0"),
+        ("beep", "event_mappings.evt: expected a mapping"),
+    ],
+)
+def test_invalid_mappings_name_the_offending_key(mapping, fragment):
+    with pytest.raises(ConfigError, match=fragment.replace("(", r"\(").replace(")", r"\)")):
+        compile_event_mappings(_cfg({"evt": mapping}))
+
+
+def test_duplicate_yaml_keys_are_rejected(tmp_path):
+    text = open("middleware/config.example.yaml", encoding="utf-8").read()
+    path = tmp_path / "dup.yaml"
+    path.write_text(text.replace("  player_death:\n", "  player_death:\n    mode: beep\n", 1), encoding="utf-8")
+
+    with pytest.raises(ConfigError, match="duplicate key 'mode'"):
+        load_config(path)
+
+
+@pytest.mark.parametrize(
+    ("section", "fragment"),
+    [
+        ("cooldown_backend:\n  kind: redis\n", "cooldown_backend.kind"),
+        ("cooldown_backend:\n  kind: mmap\n", "cooldown_backend.path is required"),
+        ("cooldown_backend:\n  kind: sqlite\n  file: x\n", "cooldown_backend:.*file"),
+    ],
+)
+def test_invalid_cooldown_backend_is_rejected(tmp_path, section, fragment):
+    text = open("middleware/config.example.yaml", encoding="utf-8").read()
+    path = tmp_path / "backend.yaml"
+    path.write_text(text + "\n" + section, encoding="utf-8")
+
+    with pytest.raises(ConfigError, match=fragment):
+        load_config(path)
+
+
+@pytest.mark.parametrize(
+    ("section", "fragment"),
+    [
+        ("journal:\n  enabled: yes please\n", "journal.enabled"),
+        ("journal:\n  segment_mb: 0\n", "journal.segment_mb"),
+        ("journal:\n  rotate: daily\n", "journal:.*rotate"),
+    ],
+)
+def test_invalid_journal_section_is_rejected(tmp_path, section, fragment):
+    text = open("middleware/config.example.yaml", encoding="utf-8").read()
+    path = tmp_path / "journal.yaml"
+    path.write_text(text + "\n" + section, encoding="utf-8")
+
+    with pytest.raises(ConfigError, match=fragment):
+        load_config(path)
+
+
+@pytest.mark.parametrize(
+    ("section", "fragment"),
+    [
+        ("dedupe:\n  enabled: 1\n", "dedupe.enabled"),
+        ("dedupe:\n  window: 0\n", "dedupe.window"),
+        ("dedupe:\n  max_sessions: many\n", "dedupe.max_sessions"),
+    ],
+)
+def test_invalid_dedupe_section_is_rejected(tmp_path, section, fragment):
+    text = open("middleware/config.example.yaml", encoding="utf-8").read()
+    path = tmp_path / "dedupe.yaml"
+    path.write_text(text + "\n" + section, encoding="utf-8")
+
+    with pytest.raises(ConfigError, match=fragment):
+        load_config(path)
+
+
+@pytest.mark.parametrize(
+    ("section", "fragment"),
+    [
+        ("datagram:\n  udp_port: 70000\n", "datagram.udp_port"),
+        ("datagram:\n  udp_port: 8788\n  udp_host: 0.0.0.0\n", "datagram.udp_host"),
+        ("datagram:\n  unix_path: ''\n", "datagram.unix_path"),
+        ("datagram:\n  reply: 1\n", "datagram.reply"),
+    ],
+)
+def test_invalid_datagram_section_is_rejected(tmp_path, section, fragment):
+    text = open("middleware/config.example.yaml", encoding="utf-8").read()
+    path = tmp_path / "datagram.yaml"
+    path.write_text(text + "\n" + section, encoding="utf-8")
+
+    with pytest.raises(ConfigError, match=fragment):
+        load_config(path)
+
+
+def test_cached_config_round_trips_and_tracks_content(tmp_path):
+    text = open("middleware/config.example.yaml", encoding="utf-8").read()
+    path = tmp_path / "config.yaml"
+    path.write_text(text, encoding="utf-8")
+    cache = default_cache_path(path)
+
+    fresh = load_config_cached(path)
+    assert fresh == load_config(path)
+    assert cache.exists()
+    # Secrets stay out of the config's directory.
+    assert cache.parent != tmp_path
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["config.yaml"]
+    if os.name == "posix":
+        assert stat.S_IMODE(cache.stat().st_mode) == 0o600
+
+    cached = load_config_cached(path)
+    assert cached == fresh
+    assert cached.rate_limits.per_target.burst == 10
+
+    path.write_text(text.replace("max_intensity: 20", "max_intensity: 15"), encoding="utf-8")
+    assert load_config_cached(path).max_intensity == 15
+
+
+def test_corrupt_config_cache_falls_back_to_yaml(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(open("middleware/config.example.yaml", encoding="utf-8").read(), encoding="utf-8")
+    default_cache_path(path).parent.mkdir(parents=True, exist_ok=True)
+    default_cache_path(path).write_text("{not json", encoding="utf-8")
+
+    assert load_config_cached(path) == load_config(path)
+
+
+@pytest.mark.parametrize(
+    ("old", "new", "fragment"),
+    [
+        ("max_attempts: 3", "max_attempts: 0", "transport.max_attempts"),
+        ("breaker_reset_s: 10.0", "breaker_reset_s: -1", "transport.breaker_reset_s"),
+        ("deadline_ms: 2000", "deadline_ms: -5", "dispatch.deadline_ms"),
+        ("max_connections: 4", "max_conections: 4", "transport: .*max_conections"),
+        ("max_keepalive_connections: 4", "max_keepalive_connections: -1", "transport.max_keepalive_connections"),
+        ("timeout_s: 5.0", "timeout_s: 0", "transport.timeout_s"),
+        ("queue_size: 16", "queue_size: 0", "dispatch.queue_size"),
+        ("workers_per_target: 1", "workers_per_target: -2", "dispatch.workers_per_target"),
+        ("overflow: drop_oldest", "overflow_policy: drop_oldest", "dispatch: .*overflow_policy"),
+    ],
+)
+def test_invalid_transport_and_dispatch_settings_are_rejected(tmp_path, old, new, fragment):
+    text = open("middleware/config.example.yaml", encoding="utf-8").read()
+    path = tmp_path / "transport.yaml"
+    path.write_text(text.replace(old, new), encoding="utf-8")
+
+    with pytest.raises(ConfigError, match=fragment):
+        load_config(path)
@@ -0,0 +1,216 @@
+"""Tests for pluggable (including cross-process) cooldown backends."""
+
+from __future__ import annotations
+
+import multiprocessing
+from pathlib import Path
+
+import pytest
+
+from middleware.config import BucketSpec, CooldownBackendConfig, PiShockCredentials, RateLimitConfig, ServiceConfig
+from middleware import cooldowns
+from middleware.cooldowns import MmapCooldowns, open_cooldown_backend, same_boot
+from middleware.policy import CooldownError, PolicyEngine
+from middleware.ratelimit import NS_PER_MS, NS_PER_S, Gate
+
+KEY = ("player_damaged", "default")
+COOLDOWN_NS = 1000 * NS_PER_MS
+
+
+@pytest.fixture(params=["memory", "mmap", "sqlite"])
+def backend(request, tmp_path: Path):
+    store = open_cooldown_backend(
+        CooldownBackendConfig(kind=request.param, path=str(tmp_path / f"cooldowns.{request.param}"), slots=8),
+        ttl_ns=COOLDOWN_NS,
+    )
+    yield store
+    store.close()
+
+
+def test_try_acquire_is_check_and_set(backend):
+    assert backend.try_acquire(KEY, COOLDOWN_NS, 0) == 0
+    assert backend.last_fired_ns(KEY) == 0
+    assert backend.try_acquire(KEY, COOLDOWN_NS, 400 * NS_PER_MS) == 600 * NS_PER_MS
+    # A refused acquire records nothing.
+    assert backend.last_fired_ns(KEY) == 0
+    assert backend.remaining_ns(KEY, COOLDOWN_NS, 400 * NS_PER_MS) == 600 * NS_PER_MS
+    assert backend.try_acquire(KEY, COOLDOWN_NS, COOLDOWN_NS) == 0
+    assert backend.last_fired_ns(KEY) == COOLDOWN_NS
+
+
+def test_keys_are_independent(backend):
+    assert backend.try_acquire(KEY, COOLDOWN_NS, 0) == 0
+    assert backend.try_acquire(("player_healed", "default"), COOLDOWN_NS, 0) == 0
+    assert backend.last_fired_ns(("unknown", "default")) is None
+
+
+def test_mmap_table_reuses_expired_slots_and_fails_closed_when_full(tmp_path: Path):
+    store = MmapCooldowns(tmp_path / "cooldowns.bin", ttl_ns=COOLDOWN_NS, slots=2)
+    try:
+        assert store.try_acquire(("a", "t"), COOLDOWN_NS, 0) == 0
+        assert store.try_acquire(("b", "t"), COOLDOWN_NS, 0) == 0
+        # Both slots hold live cooldowns: a third key is refused, not admitted.
+        assert store.try_acquire(("c", "t"), COOLDOWN_NS, 1) > 0
+        # Once they expire, new keys take over their slots.
+        assert store.try_acquire(("c", "t"), COOLDOWN_NS, COOLDOWN_NS) == 0
+        assert store.try_acquire(("d", "t"), COOLDOWN_NS, COOLDOWN_NS) == 0
+    finally:
+        store.close()
+
+
+def test_mmap_try_acquire_all_undoes_taken_gates_when_full(tmp_path: Path):
+    store = MmapCooldowns(tmp_path / "cooldowns.bin", ttl_ns=COOLDOWN_NS, slots=2)
+    try:
+        assert store.try_acquire(("a", "t"), COOLDOWN_NS, 0) == 0
+        gates = [Gate(("b", "t"), COOLDOWN_NS), Gate(("c", "t"), COOLDOWN_NS)]
+        assert store.try_acquire_all(gates, 1) == [0, COOLDOWN_NS]
+        assert store.last_fired_ns(("b", "t")) is None
+    finally:
+        store.close()
+
+
+def test_mmap_table_keeps_slot_count_from_existing_file(tmp_path: Path):
+    path = tmp_path / "cooldowns.bin"
+    MmapCooldowns(path, ttl_ns=COOLDOWN_NS, slots=4).close()
+    store = MmapCooldowns(path, ttl_ns=COOLDOWN_NS, slots=64)
+    assert store.slots == 4
+    store.close()
+
+
+@pytest.mark.parametrize("kind", ["mmap", "sqlite"])
+def test_entries_from_the_future_count_as_expired(kind: str, tmp_path: Path):
+    config = CooldownBackendConfig(kind=kind, path=str(tmp_path / f"cooldowns.{kind}"), slots=1)
+    store = open_cooldown_backend(config, ttl_ns=COOLDOWN_NS)
+    try:
+        # Stamped by an earlier boot whose monotonic clock had run for an hour.
+        assert store.try_acquire(KEY, COOLDOWN_NS, 3600 * 10**9) == 0
+        assert store.remaining_ns(KEY, COOLDOWN_NS, 5 * 10**9) == 0
+        assert store.try_acquire(KEY, COOLDOWN_NS, 5 * 10**9) == 0
+        assert store.last_fired_ns(KEY) == 5 * 10**9
+        # Within the slack it is a racing process, not another boot.
+        assert store.try_acquire(KEY, COOLDOWN_NS, 5 * 10**9 - 1000) > 0
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize("kind", ["mmap", "sqlite"])
+def test_shared_tables_start_empty_after_a_reboot(kind: str, tmp_path: Path, monkeypatch):
+    config = CooldownBackendConfig(kind=kind, path=str(tmp_path / f"cooldowns.{kind}"))
+    monkeypatch.setattr(cooldowns, "boot_id", lambda: "boot-a")
+    store = open_cooldown_backend(config, ttl_ns=COOLDOWN_NS)
+    store.try_acquire(KEY, COOLDOWN_NS, 10**9)
+    store.close()
+
+    store = open_cooldown_backend(config, ttl_ns=COOLDOWN_NS)
+    assert store.last_fired_ns(KEY) == 10**9
+    store.close()
+
+    monkeypatch.setattr(cooldowns, "boot_id", lambda: "boot-b")
+    store = open_cooldown_backend(config, ttl_ns=COOLDOWN_NS)
+    try:
+        assert store.last_fired_ns(KEY) is None
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize("kind", ["mmap", "sqlite"])
+def test_try_acquire_all_takes_every_gate_or_none(kind: str, tmp_path: Path):
+    config = CooldownBackendConfig(kind=kind, path=str(tmp_path / f"cooldowns.{kind}"))
+    store = open_cooldown_backend(config, ttl_ns=2 * NS_PER_S)
+    bucket = Gate(("rate_limits.per_target 2/60", "default"), NS_PER_S, burst=2)
+    try:
+        assert store.try_acquire_all([bucket, Gate(("a", "default"), COOLDOWN_NS)], 0) == [0, 0]
+        # `a` is cooling down: the bucket keeps its last token.
+        assert store.try_acquire_all([bucket, Gate(("a", "default"), COOLDOWN_NS)], 0) == [0, COOLDOWN_NS]
+        assert store.try_acquire_all([bucket, Gate(("b", "default"), COOLDOWN_NS)], 0) == [0, 0]
+        assert store.try_acquire_all([bucket, Gate(("c", "default"), COOLDOWN_NS)], 0) == [NS_PER_S, 0]
+        # One token per second refills.
+        assert store.try_acquire_all([bucket, Gate(("c", "default"), COOLDOWN_NS)], NS_PER_S) == [0, 0]
+    finally:
+        store.close()
+
+
+def test_estimated_boot_times_tolerate_clock_adjustments():
+    assert same_boot("1700000000", "1700000030")
+    assert not same_boot("1700000000", "1700003600")
+    assert not same_boot("3f1c-boot", "1700000000")
+
+
+def _contend(kind: str, path: str, start, results) -> None:
+    store = open_cooldown_backend(CooldownBackendConfig(kind=kind, path=path), ttl_ns=COOLDOWN_NS)
+    start.wait()
+    won = sum(1 for _ in range(50) if store.try_acquire(KEY, COOLDOWN_NS, 10 * NS_PER_MS) == 0)
+    store.close()
+    results.put(won)
+
+
+@pytest.mark.parametrize("kind", ["mmap", "sqlite"])
+def test_shared_backends_admit_one_fire_across_processes(kind: str, tmp_path: Path):
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    results = ctx.Queue()
+    path = str(tmp_path / f"cooldowns.{kind}")
+    procs = [ctx.Process(target=_contend, args=(kind, path, start, results)) for _ in range(4)]
+    for proc in procs:
+        proc.start()
+    start.set()
+    wins = [results.get(timeout=30) for _ in procs]
+    for proc in procs:
+        proc.join(timeout=30)
+    assert sum(wins) == 1
+
+
+def _config(tmp_path: Path) -> ServiceConfig:
+    return ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=8787,
+        shared_secret="secret",
+        dry_run=True,
+        allow_shock=False,
+        max_intensity=20,
+        max_duration_ms=2000,
+        default_cooldown_ms=1000,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
+        event_mappings={"player_healed": {"mode": "beep", "intensity": 1, "duration_ms": 100, "cooldown_ms": 60000}},
+        cooldown_backend=CooldownBackendConfig(kind="sqlite", path=str(tmp_path / "cooldowns.sqlite")),
+    )
+
+
+def test_policy_engines_share_cooldowns_through_backend(tmp_path: Path):
+    config = _config(tmp_path)
+    first, second = PolicyEngine(config), PolicyEngine(config)
+    try:
+        first.decide({"event_type": "player_healed"})
+        with pytest.raises(CooldownError):
+            second.decide({"event_type": "player_healed"})
+    finally:
+        first.close()
+        second.close()
+
+
+@pytest.mark.parametrize("kind", ["mmap", "sqlite"])
+def test_policy_engines_share_rate_limits_through_backend(kind: str, tmp_path: Path):
+    config = ServiceConfig(
+        **{
+            **_config(tmp_path).__dict__,
+            "event_mappings": {
+                "player_healed": {"mode": "beep", "intensity": 1, "duration_ms": 100, "cooldown_ms": 0},
+                "player_died": {"mode": "beep", "intensity": 1, "duration_ms": 100, "cooldown_ms": 0},
+            },
+            "rate_limits": RateLimitConfig(per_target=BucketSpec(burst=2, per_minute=1)),
+            "cooldown_backend": CooldownBackendConfig(kind=kind, path=str(tmp_path / f"cooldowns.{kind}")),
+        }
+    )
+    first, second = PolicyEngine(config), PolicyEngine(config)
+    try:
+        first.decide({"event_type": "player_healed"})
+        second.decide({"event_type": "player_died"})
+        # Two processes, one bucket: the burst of 2 is spent.
+        with pytest.raises(CooldownError, match="Rate limit"):
+            first.decide({"event_type": "player_died"})
+        with pytest.raises(CooldownError, match="Rate limit"):
+            second.decide({"event_type": "player_healed"})
+    finally:
+        first.close()
+        second.close()
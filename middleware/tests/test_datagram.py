@@ -0,0 +1,87 @@
+"""Tests for the Unix socket / loopback UDP datagram ingress."""
+
+from __future__ import annotations
+
+import asyncio
+import socket
+import sys
+
+import pytest
+
+fastapi_testclient = pytest.importorskip("fastapi.testclient")
+TestClient = fastapi_testclient.TestClient
+
+from middleware.app import create_app
+from middleware.config import DatagramConfig, PiShockCredentials, ServiceConfig
+from middleware.datagram import DatagramListeners, DatagramSender
+
+unix_only = pytest.mark.skipif(not hasattr(socket, "AF_UNIX") or sys.platform == "win32", reason="needs AF_UNIX")
+
+
+def _free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _cfg(datagram: DatagramConfig) -> ServiceConfig:
+    return ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=8787,
+        shared_secret="test-secret",
+        dry_run=True,
+        allow_shock=False,
+        max_intensity=20,
+        max_duration_ms=2000,
+        default_cooldown_ms=0,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
+        event_mappings={"evt": {"mode": "vibrate", "intensity": 5, "duration_ms": 300, "cooldown_ms": 0}},
+        datagram=datagram,
+    )
+
+
+def test_udp_datagrams_run_the_event_pipeline():
+    port = _free_udp_port()
+    app = create_app(_cfg(DatagramConfig(udp_port=port)))
+
+    with TestClient(app) as client:
+        with DatagramSender(("127.0.0.1", port), "test-secret") as sender:
+            assert sender.send({"event_type": "evt", "session_id": "s", "seq": 1}) == (202, "accepted")
+            assert sender.send({"event_type": "evt", "session_id": "s", "seq": 1}) == (409, "duplicate")
+            assert sender.send({"event_type": "nope"}) == (400, "policy_error")
+        with DatagramSender(("127.0.0.1", port), "wrong-secret") as forger:
+            assert forger.send({"event_type": "evt"}) == (401, "invalid_signature")
+
+        health = client.get("/health").json()
+        assert health["datagram"]["udp"] == {"address": f"127.0.0.1:{port}", "received": 4, "errors": 0}
+        assert app.state.metrics.events("evt", "accepted") == 1
+
+
+@unix_only
+def test_unix_socket_listener_answers_bound_senders_and_cleans_up(tmp_path):
+    path = tmp_path / "ingest.sock"
+    app = create_app(_cfg(DatagramConfig(unix_path=str(path))))
+
+    with TestClient(app):
+        assert path.stat().st_mode & 0o777 == 0o600
+        with DatagramSender(str(path), "test-secret") as sender:
+            assert sender.send({"event_type": "evt"}) == (202, "accepted")
+        with DatagramSender(str(path), "test-secret", reply=False) as sender:
+            assert sender.send({"event_type": "evt"}) is None
+
+    assert app.state.metrics.events("evt", "accepted") == 2
+    assert not path.exists()
+
+
+@unix_only
+def test_unix_listener_refuses_to_replace_a_regular_file(tmp_path):
+    path = tmp_path / "not-a-socket"
+    path.write_text("keep me", encoding="utf-8")
+
+    async def open_listener() -> None:
+        await DatagramListeners.open(DatagramConfig(unix_path=str(path)), lambda line, arrived_ns: (202, "accepted"))
+
+    with pytest.raises(OSError, match="not a socket"):
+        asyncio.run(open_listener())
+    assert path.read_text(encoding="utf-8") == "keep me"
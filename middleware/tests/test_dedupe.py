@@ -0,0 +1,144 @@
+"""Tests for the (session_id, seq) replay-protection index."""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+
+from middleware import file_ingest
+from middleware.checkpoint import Checkpointer
+from middleware.config import DedupeConfig, PiShockCredentials, ServiceConfig
+from middleware.dedupe import DedupeIndex, open_dedupe
+from middleware.metrics import Metrics
+from middleware.pipeline import evaluate
+from middleware.policy import PolicyEngine
+
+
+class DummyLogger:
+    def info(self, *args, **kwargs):
+        return None
+
+    def warning(self, *args, **kwargs):
+        return None
+
+
+def _cfg() -> ServiceConfig:
+    return ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=8787,
+        shared_secret="s",
+        dry_run=True,
+        allow_shock=False,
+        max_intensity=20,
+        max_duration_ms=2000,
+        default_cooldown_ms=0,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
+        event_mappings={"evt": {"mode": "vibrate", "intensity": 5, "duration_ms": 300, "cooldown_ms": 0}},
+    )
+
+
+def _body(seq: int, session_id: str = "s1") -> bytes:
+    return json.dumps({"event_type": "evt", "session_id": session_id, "seq": seq}, separators=(",", ":")).encode()
+
+
+def _line(seq: int) -> bytes:
+    body = _body(seq)
+    return hmac.new(b"s", body, hashlib.sha256).hexdigest().encode() + b"\t" + body + b"\n"
+
+
+def test_out_of_order_seqs_within_the_window_count_once():
+    index = DedupeIndex(window=8)
+
+    assert [index.admit("s1", seq) for seq in (5, 3, 7, 4, 3, 7, 6)] == [True, True, True, True, False, False, True]
+    # 20 moves the window to 13..20: 12 is behind it and treated as a replay.
+    assert index.admit("s1", 20) is True
+    assert index.admit("s1", 12) is False
+    assert index.admit("s1", 13) is True
+    assert index.admit("s2", 3) is True
+    assert index.duplicates == 3
+
+
+def test_least_recently_seen_sessions_are_forgotten_first():
+    index = DedupeIndex(max_sessions=2)
+    index.admit("a", 1)
+    index.admit("b", 1)
+    index.admit("a", 2)
+    index.admit("c", 1)
+
+    assert index.stats()["sessions"] == 2
+    assert index.admit("a", 2) is False
+    assert index.admit("b", 1) is True
+
+
+def test_index_round_trips_and_merges_processes_sharing_a_file(tmp_path):
+    path = tmp_path / "state" / "http.dedupe"
+    first = DedupeIndex(window=16, path=path)
+    second = DedupeIndex(window=16, path=path)
+    for seq in (1, 2, 4):
+        first.admit("s1", seq)
+    second.admit("s1", 3)
+    second.admit("s2", 9)
+    first.flush()
+    second.flush()
+
+    reopened = DedupeIndex(window=16, path=path)
+    assert [reopened.admit("s1", seq) for seq in (1, 2, 3, 4, 5)] == [False, False, False, False, True]
+    assert reopened.admit("s2", 9) is False
+    assert second.flushes == 1
+    second.flush()
+    assert second.flushes == 1
+
+
+def test_open_dedupe_places_one_file_per_ingress_path(tmp_path):
+    assert open_dedupe(DedupeConfig(enabled=False), "http") is None
+    assert open_dedupe(DedupeConfig(), "http").path is None
+    assert open_dedupe(DedupeConfig(path=str(tmp_path)), "file").path == tmp_path / "file.dedupe"
+    assert open_dedupe(DedupeConfig(), "file", default_path=tmp_path / "x.dedupe").path == tmp_path / "x.dedupe"
+
+
+def test_replays_are_rejected_before_the_policy():
+    cfg = _cfg()
+    policy = PolicyEngine(cfg)
+    index = DedupeIndex()
+    metrics = Metrics(cfg.event_mappings)
+    body = _body(1)
+    signature = hmac.new(b"s", body, hashlib.sha256).hexdigest()
+
+    assert evaluate(body, signature, policy, cfg, metrics=metrics, dedupe=index).status == 202
+    replay = evaluate(body, signature, policy, cfg, metrics=metrics, dedupe=index)
+    assert (replay.status, replay.reason) == (409, "duplicate")
+    assert metrics.events("evt", "duplicate") == 1
+    # Without seq there is nothing to key on.
+    plain = json.dumps({"event_type": "evt", "session_id": "s1"}).encode()
+    plain_sig = hmac.new(b"s", plain, hashlib.sha256).hexdigest()
+    assert evaluate(plain, plain_sig, policy, cfg, dedupe=index).status == 202
+    assert evaluate(plain, plain_sig, policy, cfg, dedupe=index).status == 202
+
+
+def test_file_ingest_replay_after_losing_the_offset_skips_seen_events(tmp_path):
+    cfg = _cfg()
+    policy = PolicyEngine(cfg)
+    outbox = tmp_path / "events.log"
+    outbox.write_bytes(b"".join(_line(seq) for seq in range(1, 6)))
+    path = tmp_path / "outbox.dedupe"
+
+    index = DedupeIndex(path=path)
+    checkpointer = Checkpointer(tmp_path / "outbox.offset", before_commit=index.flush)
+    with outbox.open("rb") as handle:
+        file_ingest._drain(handle, policy, cfg, DummyLogger(), checkpointer, dedupe=index)
+    checkpointer.flush()
+    assert path.exists()
+
+    (tmp_path / "outbox.offset").unlink()
+    metrics = Metrics(cfg.event_mappings)
+    replayed = DedupeIndex(path=path)
+    with outbox.open("rb") as handle:
+        lines, _ = file_ingest._drain(
+            handle, policy, cfg, DummyLogger(), Checkpointer(tmp_path / "outbox.offset"), metrics, dedupe=replayed
+        )
+
+    assert lines == 5
+    assert metrics.events("evt", "duplicate") == 5
+    assert metrics.events("evt", "accepted") == 0
@@ -0,0 +1,134 @@
+"""Background dispatcher tests: admission, overflow policies, and drain."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from middleware.dispatcher import ActionDispatcher, QueueFullError
+from middleware.metrics import Metrics
+from middleware.pishock_http import PiShockResult
+from middleware.policy import Action
+
+
+def _action(intensity: int = 5, priority: int = 0, target: str = "c") -> Action:
+    return Action(mode="vibrate", intensity=intensity, duration_ms=300, target=target, priority=priority)
+
+
+class GatedSender:
+    """Fake PiShock send that blocks until released, recording what it sent."""
+
+    def __init__(self) -> None:
+        self.sent: list[Action] = []
+        self.gate = asyncio.Event()
+
+    async def __call__(self, action: Action) -> PiShockResult:
+        await self.gate.wait()
+        self.sent.append(action)
+        return PiShockResult(ok=True, status_code=200, body="ok")
+
+
+def test_submit_returns_immediately_and_worker_drains():
+    async def run():
+        sender = GatedSender()
+        dispatcher = ActionDispatcher(sender, queue_size=4)
+        dispatcher.submit(_action(1))
+        dispatcher.submit(_action(2))
+        await asyncio.sleep(0)
+        assert sender.sent == []
+        sender.gate.set()
+        await dispatcher.shutdown(drain_timeout_s=1.0)
+        return sender, dispatcher
+
+    sender, dispatcher = asyncio.run(run())
+    assert [a.intensity for a in sender.sent] == [1, 2]
+    assert dispatcher.stats()["sent"] == 2
+
+
+def test_reject_policy_raises_when_full():
+    async def run():
+        dispatcher = ActionDispatcher(GatedSender(), queue_size=1, overflow="reject")
+        dispatcher.submit(_action(1))
+        with pytest.raises(QueueFullError):
+            dispatcher.submit(_action(2))
+        await dispatcher.shutdown(drain_timeout_s=0)
+        return dispatcher.rejected
+
+    assert asyncio.run(run()) == 1
+
+
+def test_drop_oldest_keeps_newest_actions():
+    async def run():
+        sender = GatedSender()
+        dispatcher = ActionDispatcher(sender, queue_size=2, overflow="drop_oldest")
+        for i in range(1, 5):
+            dispatcher.submit(_action(i))
+        assert dispatcher.depth() == {"c": 2}
+        sender.gate.set()
+        await dispatcher.shutdown(drain_timeout_s=1.0)
+        return sender, dispatcher
+
+    sender, dispatcher = asyncio.run(run())
+    assert [a.intensity for a in sender.sent] == [3, 4]
+    assert dispatcher.dropped == 2
+
+
+def test_drop_lowest_priority_evicts_lowest_or_refuses_incoming():
+    async def run():
+        sender = GatedSender()
+        dispatcher = ActionDispatcher(sender, queue_size=2, overflow="drop_lowest_priority")
+        dispatcher.submit(_action(1, priority=5))
+        dispatcher.submit(_action(2, priority=1))
+        dispatcher.submit(_action(3, priority=3))  # evicts priority 1
+        with pytest.raises(QueueFullError):
+            dispatcher.submit(_action(4, priority=3))  # nothing ranks below it
+        sender.gate.set()
+        await dispatcher.shutdown(drain_timeout_s=1.0)
+        return sender
+
+    sender = asyncio.run(run())
+    assert [a.intensity for a in sender.sent] == [1, 3]
+
+
+def test_queues_are_per_target():
+    async def run():
+        dispatcher = ActionDispatcher(GatedSender(), queue_size=1, overflow="reject")
+        dispatcher.submit(_action(target="a"))
+        dispatcher.submit(_action(target="b"))
+        depth = dispatcher.depth()
+        await dispatcher.shutdown(drain_timeout_s=0)
+        return depth
+
+    assert asyncio.run(run()) == {"a": 1, "b": 1}
+
+
+def test_shutdown_abandons_queue_after_deadline_and_refuses_new_work():
+    async def run():
+        dispatcher = ActionDispatcher(GatedSender(), queue_size=4)
+        dispatcher.submit(_action(1))
+        dispatcher.submit(_action(2))
+        abandoned = await dispatcher.shutdown(drain_timeout_s=0.05)
+        with pytest.raises(QueueFullError):
+            dispatcher.submit(_action(3))
+        return abandoned
+
+    # One action is in flight (blocked on the gate), one still queued.
+    assert asyncio.run(run()) == 1
+
+
+def test_delivery_records_end_to_end_lag():
+    async def run():
+        sender, metrics = GatedSender(), Metrics()
+        sender.gate.set()
+        dispatcher = ActionDispatcher(sender, queue_size=4, metrics=metrics)
+        dispatcher.submit(_action(1), emitted_ns=time.monotonic_ns() - 250_000_000)
+        # Coalesced window actions carry no emit time.
+        dispatcher.submit(_action(2))
+        await dispatcher.shutdown(drain_timeout_s=1.0)
+        return metrics.lag["dispatch"]
+
+    lag = asyncio.run(run())
+    assert lag.count == 1
+    assert lag.sum_ns >= 250_000_000
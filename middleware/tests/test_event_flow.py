@@ -15,7 +15,8 @@ fastapi_testclient = pytest.importorskip("fastapi.testclient")
 TestClient = fastapi_testclient.TestClient
 
 from middleware.app import create_app
-from middleware.config import PiShockCredentials, ServiceConfig
+from middleware.config import PiShockCredentials, ServiceConfig, TransportConfig
+from middleware.dispatcher import QueueFullError
 
 
 def _build_cfg() -> ServiceConfig:
@@ -35,16 +36,8 @@ def _build_cfg() -> ServiceConfig:
         event_mappings={
             "player_damaged": {
                 "mode": "shock",
-        allow_shock=False,
-        max_intensity=20,
-        max_duration_ms=2000,
-        default_cooldown_ms=1500,
-        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
-        event_mappings={
-            "player_damaged": {
-                "mode": "vibrate",
-                "intensity": 12,
-                "duration_ms": 600,
+                "intensity": 8,
+                "duration_ms": 400,
                 "cooldown_ms": 0,
             }
         },
@@ -69,8 +62,6 @@ def test_post_event_simulation_returns_expected_action():
         "session_id": "session-1",
         "armed": True,
         "context": {"source": "cet", "damage": 100, "max_health": 400},
-        "armed": False,
-        "context": {"source": "cet"},
     }
     body, signature = _sign("test-secret", event)
 
@@ -86,5 +77,154 @@ def test_post_event_simulation_returns_expected_action():
     assert data["dry_run"] is True
     assert data["action"]["mode"] == "shock"
     assert data["action"]["intensity"] == 25
-    assert data["action"]["mode"] == "vibrate"
-    assert data["action"]["intensity"] == 12
+
+
+def test_live_event_is_queued_and_returns_before_dispatch():
+    """Live mode admits the action to the dispatcher and returns 202 immediately."""
+
+    cfg = ServiceConfig(
+        **{
+            **_build_cfg().__dict__,
+            "dry_run": False,
+            # Unroutable local port: the background send fails without blocking the response.
+            "transport": TransportConfig(url="http://127.0.0.1:9/api/apioperate", timeout_s=0.2),
+        }
+    )
+    event = {
+        "event_type": "player_damaged",
+        "ts_ms": 1700000000000,
+        "session_id": "session-1",
+        "armed": True,
+        "context": {"source": "cet", "damage": 100, "max_health": 400},
+    }
+    body, signature = _sign("test-secret", event)
+
+    with TestClient(create_app(cfg)) as client:
+        resp = client.post(
+            "/event",
+            content=body,
+            headers={"content-type": "application/json", "X-Event-Signature": signature},
+        )
+        health = client.get("/health").json()
+
+    assert resp.status_code == 202
+    assert resp.json()["queued"] is True
+    assert health["dispatch"]["queue_size"] == 16
+
+
+def test_event_refused_by_a_full_queue_is_admitted_on_retry(monkeypatch):
+    """A 503 queue_full must not leave the event's seq behind in the replay check."""
+
+    cfg = ServiceConfig(
+        **{
+            **_build_cfg().__dict__,
+            "dry_run": False,
+            "transport": TransportConfig(url="http://127.0.0.1:9/api/apioperate", timeout_s=0.2),
+        }
+    )
+    event = {
+        "event_type": "player_damaged",
+        "session_id": "session-1",
+        "seq": 7,
+        "armed": True,
+        "context": {"source": "cet", "damage": 100, "max_health": 400},
+    }
+    body, signature = _sign("test-secret", event)
+    headers = {"content-type": "application/json", "X-Event-Signature": signature}
+
+    app = create_app(cfg)
+    with TestClient(app) as client:
+        dispatcher = app.state.dispatcher
+        submit = dispatcher.submit
+        refusals = iter([QueueFullError("Dispatch queue full for target=c")])
+
+        def submit_once_full(*args):
+            refusal = next(refusals, None)
+            if refusal is not None:
+                raise refusal
+            return submit(*args)
+
+        monkeypatch.setattr(dispatcher, "submit", submit_once_full)
+        first = client.post("/event", content=body, headers=headers)
+        retry = client.post("/event", content=body, headers=headers)
+        replay = client.post("/event", content=body, headers=headers)
+
+    assert first.status_code == 503
+    assert retry.status_code == 202
+    assert replay.status_code == 409
+
+
+def test_post_events_batch_returns_per_line_results():
+    """A batch of outbox-format lines is verified and decided line by line."""
+
+    client = TestClient(create_app(_build_cfg()))
+    event = {
+        "event_type": "player_damaged",
+        "ts_ms": 1700000000000,
+        "session_id": "session-1",
+        "armed": True,
+        "context": {"source": "cet", "damage": 100, "max_health": 400},
+    }
+    body, signature = _sign("test-secret", event)
+    unknown_body, unknown_sig = _sign("test-secret", {**event, "event_type": "unmapped"})
+    batch = b"\n".join(
+        [
+            signature.encode() + b"\t" + body,
+            b"deadbeef\t" + body,
+            b"",
+            b"no-tab-here",
+            unknown_sig.encode() + b"\t" + unknown_body,
+        ]
+    )
+
+    resp = client.post("/events", content=batch, headers={"content-type": "application/x-ndjson"})
+
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["accepted"] == 1
+    assert data["rejected"] == 3
+    assert [(r["line"], r["status"]) for r in data["results"]] == [(1, 202), (2, 401), (4, 400), (5, 400)]
+    assert data["results"][0]["action"]["intensity"] == 25
+    assert data["results"][2]["error"] == "malformed_line"
+
+
+def test_metrics_endpoint_reports_stage_latency_and_outcomes():
+    """`/metrics` exposes Prometheus series for each evaluated event."""
+
+    client = TestClient(create_app(_build_cfg()))
+    event = {
+        "event_type": "player_damaged",
+        "armed": True,
+        "context": {"damage": 100, "max_health": 400},
+    }
+    body, signature = _sign("test-secret", event)
+    client.post("/event", content=body, headers={"X-Event-Signature": signature})
+    client.post("/event", content=body, headers={"X-Event-Signature": "bad"})
+
+    resp = client.get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = resp.text
+    assert 'middleware_events_total{event_type="player_damaged",outcome="accepted"} 1' in text
+    assert 'middleware_events_total{event_type="unmapped",outcome="invalid_signature"} 1' in text
+    assert 'middleware_stage_seconds_count{stage="verify"} 2' in text
+    assert 'middleware_stage_seconds_count{stage="decide"} 1' in text
+    assert "middleware_requests_in_flight 0" in text
+
+
+def test_module_app_is_built_lazily_from_middleware_config(tmp_path, monkeypatch):
+    """Importing `middleware.app` does no config I/O; `app` is built on first access."""
+
+    import middleware.app as app_module  # pylint: disable=import-outside-toplevel
+
+    path = tmp_path / "config.yaml"
+    path.write_text(open("middleware/config.example.yaml", encoding="utf-8").read(), encoding="utf-8")
+    monkeypatch.setenv("MIDDLEWARE_CONFIG", str(path))
+    monkeypatch.setattr(app_module, "_app", None)
+
+    app = app_module.app
+    assert app is app_module.app
+    assert app.state.reloader.path == path
+    with TestClient(app) as client:
+        assert client.get("/health").json()["config"]["generation"] == 0
@@ -0,0 +1,68 @@
+"""Tests for the shared event decoder and JSON codec."""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+
+import pytest
+
+from middleware.events import JSON_BACKEND, Event, EventFormatError, decode_event, dumps, loads
+
+
+def test_decode_event_validates_fields_and_ignores_unknown_keys():
+    event = decode_event(
+        b'{"event_type":"player_damaged","ts_ms":1700000000000,"session_id":"s1","seq":7,'
+        b'"armed":true,"context":{"damage":10},"extra":1}'
+    )
+
+    assert event == Event("player_damaged", 1700000000000, "s1", 7, True, {"damage": 10})
+    assert not hasattr(event, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        event.armed = False  # type: ignore[misc]
+
+
+def test_decode_event_defaults():
+    event = decode_event(b'{"event_type":"evt","context":null}')
+
+    assert (event.ts_ms, event.session_id, event.seq, event.armed, event.context) == (None, None, None, False, {})
+
+
+def test_decode_event_accepts_the_emitters_empty_context():
+    # What json_min.lua writes for an event raised with no context.
+    event = decode_event(
+        b'{"armed":false,"context":[],"event_type":"player_died","seq":3,"session_id":"s1","ts_ms":1700000000000}'
+    )
+
+    assert event == Event("player_died", 1700000000000, "s1", 3, False, {})
+
+
+@pytest.mark.parametrize(
+    ("body", "reason"),
+    [
+        (b"{nope", "invalid_json"),
+        (b"\xff\xfe", "invalid_json"),
+        (b"[1, 2]", "invalid_event"),
+        (b'{"armed": true}', "invalid_event"),
+        (b'{"event_type": ""}', "invalid_event"),
+        (b'{"event_type": "e", "armed": 1}', "invalid_event"),
+        (b'{"event_type": "e", "ts_ms": "now"}', "invalid_event"),
+        (b'{"event_type": "e", "seq": true}', "invalid_event"),
+        (b'{"event_type": "e", "session_id": 3}', "invalid_event"),
+        (b'{"event_type": "e", "context": [1]}', "invalid_event"),
+    ],
+)
+def test_decode_event_rejects(body, reason):
+    with pytest.raises(EventFormatError) as excinfo:
+        decode_event(body)
+    assert excinfo.value.reason == reason
+
+
+def test_codec_round_trips_compact_json():
+    payload = {"accepted": True, "action": {"mode": "vibrate", "intensity": 5}, "note": "é"}
+
+    encoded = dumps(payload)
+    assert isinstance(encoded, bytes)
+    assert b" " not in encoded
+    assert json.loads(encoded) == loads(encoded) == payload
+    assert JSON_BACKEND in ("orjson", "msgspec", "json")
@@ -5,9 +5,14 @@ from __future__ import annotations
 import hashlib
 import hmac
 import json
+import threading
+import time
 
 from middleware import file_ingest
+from middleware.checkpoint import Checkpointer
 from middleware.config import PiShockCredentials, ServiceConfig
+from middleware.dedupe import DedupeIndex
+from middleware.metrics import Metrics
 from middleware.policy import PolicyEngine
 
 
@@ -73,8 +78,150 @@ def test_process_line_rejects_invalid_signature():
     assert file_ingest._process_line(line, policy, cfg, logger) is False
 
 
+def test_ingester_logs_structured_fields(caplog):
+    cfg = _cfg()
+    line = _signed_line({"event_type": "player_damaged", "armed": False})
+
+    with caplog.at_level("INFO", logger="middleware.file_ingest"):
+        assert file_ingest._process_line(line, PolicyEngine(cfg), cfg, file_ingest._get_logger()) is False
+
+    record = caplog.records[-1]
+    assert record.getMessage() == "ingest_skip"
+    assert (record.event_type, record.reason) == ("player_damaged", "policy_error")
+
+
 def test_offset_helpers_roundtrip(tmp_path):
     p = tmp_path / "offset.txt"
     assert file_ingest._load_offset(p) == 0
     file_ingest._save_offset(p, 123)
     assert file_ingest._load_offset(p) == 123
+
+
+def test_drain_leaves_partial_line_for_next_wake(tmp_path):
+    cfg = _cfg()
+    policy = PolicyEngine(cfg)
+    outbox = tmp_path / "events.log"
+    checkpointer = Checkpointer(tmp_path / "outbox.offset")
+    complete = _signed_line({"event_type": "player_damaged", "armed": True, "context": {"damage": 1, "max_health": 4}})
+    outbox.write_text(complete + complete[:20], encoding="utf-8")
+
+    with outbox.open("rb") as handle:
+        lines, _ = file_ingest._drain(handle, policy, cfg, DummyLogger(), checkpointer)
+        assert lines == 1
+        assert handle.tell() == len(complete)
+
+        with outbox.open("a", encoding="utf-8") as writer:
+            writer.write(complete[20:])
+        lines, _ = file_ingest._drain(handle, policy, cfg, DummyLogger(), checkpointer)
+
+    assert lines == 1
+    assert file_ingest._load_offset(checkpointer.path) == 2 * len(complete)
+
+
+def test_catch_up_fast_forwards_old_events_and_decides_fresh_ones(tmp_path):
+    cfg = _cfg()
+    policy = PolicyEngine(cfg)
+    now_ms = int(time.time() * 1000)
+    old = [
+        _signed_line({"event_type": "player_damaged", "ts_ms": now_ms - 60_000, "session_id": "s", "seq": seq})
+        for seq in range(3)
+    ]
+    fresh = _signed_line(
+        {
+            "event_type": "player_damaged",
+            "ts_ms": now_ms,
+            "session_id": "s",
+            "seq": 3,
+            "armed": True,
+            "context": {"damage": 1, "max_health": 4},
+        }
+    )
+    backlog = "".join(old) + old[0] + "garbage\n" + fresh
+    outbox = tmp_path / "events.log"
+    outbox.write_text(backlog + fresh[:20], encoding="utf-8")
+    metrics = Metrics(cfg.event_mappings)
+    checkpointer = Checkpointer(tmp_path / "outbox.offset")
+    dedupe = DedupeIndex()
+
+    with outbox.open("rb") as handle:
+        report = file_ingest.catch_up(
+            handle, policy, cfg, DummyLogger(), checkpointer, metrics, dedupe=dedupe, workers=2, chunk_bytes=64
+        )
+        assert handle.tell() == len(backlog)
+
+    assert (report.lines, report.accepted, report.fast_forwarded, report.duplicates, report.rejected) == (6, 1, 3, 1, 1)
+    assert report.bytes == len(backlog)
+    assert metrics.events("player_damaged", "stale") == 3
+    assert metrics.events("player_damaged", "accepted") == 1
+    assert file_ingest._load_offset(checkpointer.path) == len(backlog)
+
+
+def test_ingest_loop_catches_up_on_a_backlog_before_tailing(tmp_path):
+    cfg = _cfg()
+    outbox = tmp_path / "events.log"
+    old_ms = int(time.time() * 1000) - 60_000
+    lines = [_signed_line({"event_type": "player_damaged", "ts_ms": old_ms + i}) for i in range(50)]
+    outbox.write_text("".join(lines), encoding="utf-8")
+    stop = threading.Event()
+    stop.set()
+
+    report = file_ingest.run_ingest_loop(
+        outbox, tmp_path / "outbox.offset", policy=PolicyEngine(cfg), stop=stop, catchup_min_bytes=1
+    )
+
+    assert report.lines == report.fast_forwarded == 50
+    assert file_ingest._load_offset(tmp_path / "outbox.offset") == outbox.stat().st_size
+
+
+class _Recorder:
+    """Journal stand-in keeping each outcome's reason in arrival order."""
+
+    def __init__(self):
+        self.reasons = []
+
+    def record(self, outcome, reason=None):
+        self.reasons.append(reason or outcome.reason)
+
+
+def test_catch_up_reports_malformed_lines_in_file_order(tmp_path):
+    cfg = _cfg()
+    event = {"event_type": "player_damaged", "armed": True, "context": {"damage": 1, "max_health": 4}}
+    outbox = tmp_path / "events.log"
+    outbox.write_text(_signed_line(event) + "garbage\n" + _signed_line(event), encoding="utf-8")
+    journal = _Recorder()
+
+    with outbox.open("rb") as handle:
+        file_ingest.catch_up(
+            handle, PolicyEngine(cfg), cfg, DummyLogger(), Checkpointer(tmp_path / "outbox.offset"), journal=journal
+        )
+
+    assert journal.reasons == ["accepted", "malformed_line", "accepted"]
+
+
+def test_ingest_loop_fast_forwards_a_backlog_too_small_to_catch_up(tmp_path):
+    cfg = _cfg()
+    outbox = tmp_path / "events.log"
+    now_ms = int(time.time() * 1000)
+    old = [_signed_line({"event_type": "player_damaged", "ts_ms": now_ms - 60_000 + i}) for i in range(3)]
+    fresh = _signed_line(
+        {"event_type": "player_damaged", "ts_ms": now_ms, "armed": True, "context": {"damage": 1, "max_health": 4}}
+    )
+    outbox.write_text("".join(old) + fresh, encoding="utf-8")
+    metrics = Metrics(cfg.event_mappings)
+    stop = threading.Event()
+    loop = threading.Thread(
+        target=file_ingest.run_ingest_loop,
+        args=(outbox, tmp_path / "outbox.offset"),
+        kwargs={"policy": PolicyEngine(cfg), "metrics": metrics, "stop": stop, "poll_interval_s": 0.05},
+    )
+    loop.start()
+    try:
+        deadline = time.monotonic() + 5
+        while metrics.events("player_damaged", "accepted") < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        stop.set()
+        loop.join(timeout=5)
+
+    assert metrics.events("player_damaged", "stale") == 3
+    assert metrics.events("player_damaged", "accepted") == 1
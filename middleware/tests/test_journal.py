@@ -0,0 +1,177 @@
+"""Decision journal tests: write/read round trip, rotation, and ingress wiring."""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import logging
+import math
+
+import pytest
+
+from middleware import file_ingest
+from middleware.config import JournalConfig, PiShockCredentials, ServiceConfig
+from middleware.events import Event
+from middleware.journal import JOURNAL_OUTCOMES, RECORD, Journal, JournalReader, open_journal, summarize
+from middleware.metrics import OUTCOMES
+from middleware.pipeline import Outcome
+from middleware.policy import Action, PolicyEngine
+
+SECRET = "test-secret"
+
+
+def _cfg(journal_path=None) -> ServiceConfig:
+    return ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=8787,
+        shared_secret=SECRET,
+        dry_run=True,
+        allow_shock=True,
+        max_intensity=100,
+        max_duration_ms=2000,
+        default_cooldown_ms=0,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
+        event_mappings={"player_damaged": {"mode": "shock", "intensity": 8, "duration_ms": 400, "cooldown_ms": 0}},
+        journal=JournalConfig(enabled=journal_path is not None, path=str(journal_path or "journal")),
+    )
+
+
+def _signed(payload: dict) -> tuple[bytes, str]:
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return body, hmac.new(SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def _accepted(seq: int = 1) -> Outcome:
+    event = Event(
+        "player_damaged", ts_ms=1_700_000_000_000, session_id="s1", seq=seq, armed=True, context={"damage": 40}
+    )
+    return Outcome(202, "accepted", Action("shock", 8, 400, "c"), event, stage_ns=(1_000, 2_000, 3_000))
+
+
+def test_outcome_codes_are_pinned():
+    # On-disk codes: existing journals decode wrongly if any of these move.
+    assert JOURNAL_OUTCOMES[:12] == (
+        "accepted",
+        "coalesced",
+        "cooldown",
+        "policy_error",
+        "invalid_signature",
+        "invalid_json",
+        "invalid_event",
+        "malformed_line",
+        "queue_full",
+        "window_closed",
+        "stale",
+        "duplicate",
+    )
+    # Every outcome the pipeline counts can be journaled.
+    assert set(OUTCOMES) <= set(JOURNAL_OUTCOMES)
+
+
+def test_round_trip_decodes_every_field(tmp_path):
+    journal = Journal(tmp_path, "http")
+    journal.record(_accepted())
+    journal.record(_accepted(2), "queue_full")
+    journal.record(Outcome(401, "invalid_signature", stage_ns=(500,)))
+    journal.record_action(Action("vibrate", 3, 200, "c"))
+    journal.close()
+    journal.close()
+
+    records = list(JournalReader(tmp_path).records())
+    assert [r.outcome for r in records] == ["accepted", "queue_full", "invalid_signature", "window_closed"]
+    first = records[0]
+    assert (first.event_type, first.session_id, first.seq, first.ts_ms) == ("player_damaged", "s1", 1, 1_700_000_000_000)
+    assert (first.target, first.mode, first.intensity, first.duration_ms, first.status) == ("c", "shock", 8, 400, 202)
+    assert first.armed and first.source == "http"
+    assert first.damage == 40 and math.isnan(first.max_health)
+    assert (first.verify_ns, first.parse_ns, first.decide_ns) == (1_000, 2_000, 3_000)
+    assert records[1].status == 503
+    assert records[2].event_type is None and records[2].seq is None and records[2].decide_ns == 0
+    assert (records[3].mode, records[3].intensity, records[3].event_type) == ("vibrate", 3, None)
+
+    summary = summarize(iter(records))
+    assert summary["records"] == 4
+    assert summary["outcomes"]["player_damaged"] == {"accepted": 1, "queue_full": 1}
+    assert summary["decide_us"]["p50"] == 3.0
+    assert summary["lag_ms"]["p50"] > 0
+
+
+def test_segments_rotate_and_index_skips_by_time(tmp_path):
+    # Room for four records per segment after the header.
+    journal = Journal(tmp_path, "file", segment_bytes=32 + 4 * RECORD.size, batch_size=1)
+    for seq in range(10):
+        journal.record(_accepted(seq))
+    journal.close()
+
+    (stream,) = JournalReader(tmp_path).streams
+    assert len(list(stream.glob("seg-*.jrn"))) == 3
+    records = list(JournalReader(stream).records())
+    assert [r.seq for r in records] == list(range(10))
+    assert all(r.source == "file" for r in records)
+
+    cutoff = records[6].recorded_ns
+    assert [r.seq for r in JournalReader(tmp_path).records(start_ns=cutoff)] == [
+        r.seq for r in records if r.recorded_ns >= cutoff
+    ]
+    assert [r.seq for r in JournalReader(tmp_path).records(end_ns=cutoff)] == [
+        r.seq for r in records if r.recorded_ns < cutoff
+    ]
+
+
+def test_reader_ignores_a_torn_trailing_record(tmp_path):
+    journal = Journal(tmp_path, "http")
+    journal.record(_accepted())
+    journal.close()
+
+    (segment,) = tmp_path.glob("*/seg-*.jrn")
+    with segment.open("ab") as fh:
+        fh.write(b"\x01" * (RECORD.size // 2))
+    assert len(list(JournalReader(tmp_path).records())) == 1
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    journal = Journal(tmp_path, "http", queue_size=1)
+    journal.close()
+    # With the writer stopped (a stalled disk), the first record fills the queue.
+    journal.record(_accepted(1))
+    journal.record(_accepted(2))
+    assert journal.dropped == 1
+    assert "middleware_journal_dropped_total 1" in journal.metric_lines()
+
+
+def test_open_journal_is_none_when_disabled(tmp_path):
+    assert open_journal(JournalConfig(), "http") is None
+    journal = open_journal(JournalConfig(enabled=True, path=str(tmp_path)), "http")
+    journal.close()
+    assert JournalReader(tmp_path).streams
+
+
+def test_file_ingest_journals_each_line(tmp_path):
+    cfg = _cfg(tmp_path / "journal")
+    policy = PolicyEngine(cfg)
+    journal = open_journal(cfg.journal, "file")
+    good, sig = _signed({"event_type": "player_damaged", "session_id": "s1", "seq": 7, "armed": True, "context": {"damage": 10, "max_health": 100}})
+    logger = logging.getLogger("middleware.tests.journal")
+    assert file_ingest._process_line(f"{sig}\t{good.decode()}", policy, cfg, logger, journal=journal)
+    assert not file_ingest._process_line(f"{'0' * 64}\t{good.decode()}", policy, cfg, logger, journal=journal)
+    journal.close()
+
+    records = list(JournalReader(tmp_path / "journal").records())
+    assert [(r.outcome, r.seq, r.source) for r in records] == [("accepted", 7, "file"), ("invalid_signature", None, "file")]
+
+
+def test_app_journals_accepted_and_rejected_events(tmp_path):
+    testclient = pytest.importorskip("fastapi.testclient")
+    from middleware.app import create_app
+
+    body, sig = _signed({"event_type": "player_damaged", "session_id": "s1", "seq": 1, "armed": True, "context": {"damage": 10, "max_health": 100}})
+    with testclient.TestClient(create_app(_cfg(tmp_path / "journal"))) as client:
+        headers = {"content-type": "application/json"}
+        assert client.post("/event", content=body, headers={**headers, "X-Event-Signature": sig}).status_code == 202
+        assert client.post("/event", content=b"{", headers={**headers, "X-Event-Signature": sig}).status_code == 401
+        assert "journal" in client.get("/health").json()
+
+    records = list(JournalReader(tmp_path / "journal").records())
+    assert [(r.outcome, r.status) for r in records] == [("accepted", 202), ("invalid_signature", 401)]
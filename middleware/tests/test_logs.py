@@ -0,0 +1,83 @@
+"""Tests for queued structured JSON logging."""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+
+from middleware.logs import DroppingQueueHandler, JsonFormatter, LogPipeline
+
+
+class _Collect(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.lines: list[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.lines.append(self.format(record))
+
+
+def _record(msg: str = "event_accepted", args=None, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("middleware", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_extra_fields_become_top_level_keys():
+    line = JsonFormatter().format(_record(event_type="player_damaged", action={"mode": "shock"}))
+
+    payload = json.loads(line)
+    assert payload["message"] == "event_accepted"
+    assert payload["event_type"] == "player_damaged"
+    assert payload["action"] == {"mode": "shock"}
+    assert {"level", "logger", "ts"} <= payload.keys()
+    assert "_json_line" not in payload and "args" not in payload
+
+
+def test_percent_style_messages_still_format():
+    payload = json.loads(JsonFormatter().format(_record("sent %s", ("ok",))))
+    assert payload["message"] == "sent ok"
+
+
+def test_record_is_serialized_once_across_handlers():
+    formatter = JsonFormatter()
+    record = _record(detail="x")
+    first = formatter.format(record)
+    record.detail = "changed"
+    assert formatter.format(record) is first
+
+
+def test_full_queue_drops_and_counts_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    logger = logging.getLogger("middleware.tests.dropping")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for i in range(5):
+            logger.warning("overload", extra={"i": i})
+    finally:
+        logger.removeHandler(handler)
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_pipeline_formats_on_listener_thread_and_flushes_on_stop():
+    first, second = _Collect(), _Collect()
+    for handler in (first, second):
+        handler.setFormatter(JsonFormatter())
+    pipeline = LogPipeline([first, second], queue_size=100)
+    logger = logging.getLogger("middleware.tests.pipeline")
+    logger.propagate = False
+    logger.addHandler(pipeline.handler)
+    try:
+        for i in range(10):
+            logger.info("event_accepted", extra={"seq": i})
+    finally:
+        pipeline.stop()
+        pipeline.stop()
+        logger.removeHandler(pipeline.handler)
+
+    assert [json.loads(line)["seq"] for line in first.lines] == list(range(10))
+    assert first.lines == second.lines
+    assert pipeline.dropped == 0
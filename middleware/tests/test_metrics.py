@@ -0,0 +1,71 @@
+"""Tests for the Prometheus metrics registry."""
+
+from __future__ import annotations
+
+import urllib.request
+
+from middleware.metrics import Histogram, Metrics, dispatcher_gauge_lines, serve_metrics
+
+
+def test_histogram_buckets_are_cumulative_in_exposition():
+    metrics = Metrics(["evt"])
+    metrics.observe("decide", 20_000)  # 20us -> first bucket
+    metrics.observe("decide", 2_000_000)  # 2ms
+    metrics.observe("decide", 60_000_000_000)  # beyond the last bound -> +Inf
+
+    text = metrics.render()
+
+    assert 'middleware_stage_seconds_bucket{stage="decide",le="5e-05"} 1' in text
+    assert 'middleware_stage_seconds_bucket{stage="decide",le="0.0025"} 2' in text
+    assert 'middleware_stage_seconds_bucket{stage="decide",le="5"} 2' in text
+    assert 'middleware_stage_seconds_bucket{stage="decide",le="+Inf"} 3' in text
+    assert 'middleware_stage_seconds_count{stage="decide"} 3' in text
+
+
+def test_histogram_bucket_edges_are_inclusive():
+    hist = Histogram([0.001])
+    hist.observe_ns(1_000_000)
+    hist.observe_ns(1_000_001)
+    assert hist.counts == [1, 1]
+    assert hist.count == 2
+
+
+def test_unknown_event_types_share_one_label():
+    metrics = Metrics(["evt"])
+    metrics.count_event("evt", "cooldown")
+    metrics.count_event("made_up", "policy_error")
+    metrics.count_event(None, "invalid_signature")
+    metrics.count_event(["not", "hashable"], "policy_error")
+
+    assert metrics.events("evt", "cooldown") == 1
+    assert metrics.events("unmapped", "policy_error") == 2
+    assert metrics.events("unmapped", "invalid_signature") == 1
+    assert "made_up" not in metrics.render()
+
+
+def test_dispatch_counters_and_gauges():
+    metrics = Metrics()
+    metrics.count_dispatch("dev", "ok")
+    metrics.count_dispatch("dev", "upstream_error")
+    metrics.add_gauges(lambda: dispatcher_gauge_lines({"depth": {"dev": 3}, "in_flight": 1}))
+
+    text = metrics.render()
+
+    assert metrics.dispatches("dev", "ok") == 1
+    assert 'middleware_dispatch_total{target="dev",result="upstream_error"} 1' in text
+    assert 'middleware_queue_depth{target="dev"} 3' in text
+    assert "middleware_dispatch_in_flight 1" in text
+
+
+def test_serve_metrics_exposes_registry_over_http():
+    metrics = Metrics(["evt"])
+    metrics.count_event("evt", "accepted")
+    server = serve_metrics(metrics, "127.0.0.1", 0)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+            text = resp.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'middleware_events_total{event_type="evt",outcome="accepted"} 1' in text
@@ -0,0 +1,201 @@
+"""Tests for the segmented outbox layout and the ingester following it."""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+from middleware import file_ingest
+from middleware.checkpoint import load_checkpoint
+from middleware.config import PiShockCredentials, ServiceConfig
+from middleware.metrics import Metrics
+from middleware.outbox import OutboxLayout
+from middleware.policy import PolicyEngine
+
+
+def _cfg() -> ServiceConfig:
+    return ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=8787,
+        shared_secret="test-secret",
+        dry_run=True,
+        allow_shock=False,
+        max_intensity=20,
+        max_duration_ms=2000,
+        default_cooldown_ms=0,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
+        event_mappings={"evt": {"mode": "vibrate", "intensity": 5, "duration_ms": 300, "cooldown_ms": 0}},
+    )
+
+
+def _line(seq: int) -> bytes:
+    body = json.dumps({"event_type": "evt", "session_id": "s", "seq": seq}, separators=(",", ":")).encode()
+    return hmac.new(b"test-secret", body, hashlib.sha256).hexdigest().encode() + b"\t" + body + b"\n"
+
+
+def _emit(layout: OutboxLayout, segment: int, seqs: range) -> None:
+    """Append to `segment` the way `lib/outbox.lua` does, then name it active."""
+
+    with layout.segment_path(segment).open("ab") as handle:
+        handle.write(b"".join(_line(seq) for seq in seqs))
+    layout.manifest_path.write_text(json.dumps({"version": 1, "active": segment, "segment_bytes": 4096}))
+
+
+def _wait_for(condition, timeout_s: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _start(outbox: Path, offset_file: Path, metrics: Metrics, **kwargs) -> tuple[threading.Thread, threading.Event]:
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=file_ingest.run_ingest_loop,
+        args=(outbox, offset_file, 0.02, "poll"),
+        kwargs={"policy": PolicyEngine(_cfg()), "metrics": metrics, "stop": stop, **kwargs},
+        daemon=True,
+    )
+    thread.start()
+    return thread, stop
+
+
+def test_layout_names_lists_and_compacts_segments(tmp_path):
+    layout = OutboxLayout(tmp_path / "events.log")
+    for segment in (1, 2, 3):
+        layout.segment_path(segment).touch()
+    (tmp_path / "events.log").touch()
+
+    assert layout.segment_path(2).name == "events.000002.log"
+    assert layout.manifest_path.name == "events.manifest"
+    assert layout.segments() == [1, 2, 3]
+    assert layout.next_segment(2) == 3
+    assert layout.next_segment(3) is None
+    assert not layout.segmented()
+
+    assert layout.compact(2, archive_dir=tmp_path / "archive") == [1]
+    assert (tmp_path / "archive" / "events.000001.log").exists()
+    assert layout.compact(3) == [2]
+    assert layout.segments() == [3]
+
+
+def test_next_segment_skips_a_gap_named_by_the_manifest(tmp_path):
+    layout = OutboxLayout(tmp_path / "events.log")
+    _emit(layout, 1, range(1))
+    _emit(layout, 3, range(1))
+
+    assert layout.next_segment(1) == 3
+    layout.manifest_path.write_text(json.dumps({"version": 1, "active": 1}))
+    assert layout.next_segment(1) is None
+
+
+def test_compact_keeps_segments_it_cannot_remove_yet(tmp_path, monkeypatch, caplog):
+    layout = OutboxLayout(tmp_path / "events.log")
+    for segment in (1, 2, 3):
+        layout.segment_path(segment).touch()
+    held_open = layout.segment_path(1)
+    unlink = Path.unlink
+
+    def refuse(path, *args, **kwargs):
+        # What Windows reports for a file another process has open.
+        if path == held_open:
+            raise PermissionError(13, "The process cannot access the file", str(path))
+        return unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "unlink", refuse)
+    with caplog.at_level("WARNING"):
+        assert layout.compact(3, logger=logging.getLogger("middleware.tests.outbox")) == [2]
+    assert layout.pending == [1]
+    assert [r.getMessage() for r in caplog.records] == ["outbox_compact_deferred"]
+
+    monkeypatch.setattr(Path, "unlink", unlink)
+    assert layout.compact(3) == [1]
+    assert layout.pending == []
+    assert layout.segments() == [3]
+
+
+def test_ingester_waits_for_the_emitter_instead_of_creating_files(tmp_path):
+    outbox = tmp_path / "outbox" / "events.log"
+    outbox.parent.mkdir()
+    layout = OutboxLayout(outbox)
+    metrics = Metrics(["evt"])
+    thread, stop = _start(outbox, tmp_path / "outbox.offset", metrics)
+    try:
+        time.sleep(0.1)
+        assert list(outbox.parent.iterdir()) == []
+        _emit(layout, 1, range(3))
+        _wait_for(lambda: metrics.events("evt", "accepted") == 3)
+    finally:
+        stop.set()
+        thread.join(5)
+    assert not thread.is_alive()
+    assert not outbox.exists()
+
+    # Stopping while still waiting ends the loop cleanly.
+    empty = tmp_path / "empty" / "events.log"
+    empty.parent.mkdir()
+    thread, stop = _start(empty, tmp_path / "empty.offset", Metrics(["evt"]))
+    stop.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert list(empty.parent.iterdir()) == []
+
+
+def test_ingester_follows_rollovers_and_deletes_consumed_segments(tmp_path):
+    outbox = tmp_path / "events.log"
+    offset_file = tmp_path / "outbox.offset"
+    layout = OutboxLayout(outbox)
+    _emit(layout, 1, range(0, 10))
+    metrics = Metrics(["evt"])
+    thread, stop = _start(outbox, offset_file, metrics)
+    try:
+        _wait_for(lambda: metrics.events("evt", "accepted") == 10)
+        # Lines written to segment 1 just before the roll must still be read.
+        _emit(layout, 1, range(10, 15))
+        _emit(layout, 2, range(15, 20))
+        _wait_for(lambda: metrics.events("evt", "accepted") == 20)
+        _wait_for(lambda: layout.segments() == [2])
+    finally:
+        stop.set()
+        thread.join(5)
+
+    state = load_checkpoint(offset_file)
+    assert (state.segment, state.offset) == (2, layout.segment_path(2).stat().st_size)
+    assert metrics.events("evt", "duplicate") == 0
+
+    # A restart resumes inside segment 2 without re-reading anything.
+    _emit(layout, 2, range(20, 22))
+    restarted = Metrics(["evt"])
+    thread, stop = _start(outbox, offset_file, restarted)
+    try:
+        _wait_for(lambda: restarted.events("evt", "accepted") == 2)
+    finally:
+        stop.set()
+        thread.join(5)
+    assert restarted.outcome_totals()["accepted"] == 2
+
+
+def test_ingester_drains_the_single_file_outbox_before_switching_to_segments(tmp_path):
+    outbox = tmp_path / "events.log"
+    outbox.write_bytes(b"".join(_line(seq) for seq in range(3)))
+    layout = OutboxLayout(outbox)
+    _emit(layout, 1, range(3, 5))
+    metrics = Metrics(["evt"])
+    archive = tmp_path / "archive"
+    thread, stop = _start(outbox, tmp_path / "outbox.offset", metrics, archive_dir=archive)
+    try:
+        _wait_for(lambda: metrics.events("evt", "accepted") == 5)
+        _emit(layout, 2, range(5, 6))
+        _wait_for(lambda: metrics.events("evt", "accepted") == 6)
+        _wait_for(lambda: (archive / "events.000001.log").exists())
+    finally:
+        stop.set()
+        thread.join(5)
+
+    assert load_checkpoint(tmp_path / "outbox.offset").segment == 2
@@ -0,0 +1,129 @@
+"""Tests for the shared verify/parse/decide pipeline."""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from middleware.config import PiShockCredentials, ServiceConfig
+from middleware.dedupe import DedupeIndex
+from middleware.metrics import Metrics
+from middleware.pipeline import evaluate, evaluate_line, split_signed_line
+from middleware.policy import PolicyEngine
+
+
+def _cfg(**mapping) -> ServiceConfig:
+    return ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=8787,
+        shared_secret="s",
+        dry_run=True,
+        allow_shock=False,
+        max_intensity=20,
+        max_duration_ms=2000,
+        default_cooldown_ms=60_000,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
+        event_mappings={"evt": {"mode": "vibrate", "intensity": 5, "duration_ms": 300, **mapping}},
+    )
+
+
+def _signed(payload: dict) -> tuple[bytes, str]:
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    return body, hmac.new(b"s", body, hashlib.sha256).hexdigest()
+
+
+def test_split_signed_line_strips_newline_and_requires_tab():
+    assert split_signed_line(b"ab\t{}\r\n") == ("ab", b"{}")
+    with pytest.raises(ValueError):
+        split_signed_line(b"ab {}")
+
+
+def test_evaluate_classifies_outcomes():
+    cfg = _cfg()
+    policy = PolicyEngine(cfg)
+    body, sig = _signed({"event_type": "evt"})
+
+    assert evaluate(body, "bad", policy, cfg).status == 401
+    first = evaluate(body, sig, policy, cfg)
+    assert (first.status, first.reason, first.action.intensity) == (202, "accepted", 5)
+    assert evaluate(body, sig, policy, cfg).status == 429
+
+    bad_json, bad_sig = b"{nope", hmac.new(b"s", b"{nope", hashlib.sha256).hexdigest()
+    assert evaluate(bad_json, bad_sig, policy, cfg).reason == "invalid_json"
+
+    unmapped, unmapped_sig = _signed({"event_type": "other"})
+    assert evaluate(unmapped, unmapped_sig, policy, cfg).reason == "policy_error"
+
+    bad_shape, bad_shape_sig = _signed({"event_type": "evt", "armed": "yes"})
+    outcome = evaluate(bad_shape, bad_shape_sig, policy, cfg)
+    assert (outcome.status, outcome.reason) == (400, "invalid_event")
+
+
+def test_evaluate_line_reports_malformed_lines():
+    cfg = _cfg()
+    assert evaluate_line(b"garbage", PolicyEngine(cfg), cfg).reason == "malformed_line"
+
+
+class _SlowDedupe(DedupeIndex):
+    def admit(self, session_id: str, seq: int) -> bool:
+        time.sleep(0.02)
+        return super().admit(session_id, seq)
+
+
+def test_replay_check_is_timed_as_its_own_stage():
+    cfg = _cfg(cooldown_ms=0)
+    policy, metrics, dedupe = PolicyEngine(cfg), Metrics(["evt"]), _SlowDedupe()
+    body, sig = _signed({"event_type": "evt", "session_id": "s", "seq": 1})
+
+    accepted = evaluate(body, sig, policy, cfg, metrics=metrics, dedupe=dedupe)
+    duplicate = evaluate(body, sig, policy, cfg, metrics=metrics, dedupe=dedupe)
+    unsequenced = evaluate(*_signed({"event_type": "evt"}), policy, cfg, metrics=metrics, dedupe=dedupe)
+
+    assert accepted.dedupe_ns >= 20_000_000 > accepted.stage_ns[2]
+    assert (duplicate.status, len(duplicate.stage_ns)) == (409, 2)
+    assert unsequenced.dedupe_ns is None
+    assert metrics.stages["dedupe"].count == 2
+    assert metrics.stages["decide"].count == 2
+
+
+def test_stale_events_are_dropped_before_spending_the_cooldown():
+    cfg = _cfg(max_age_ms=500)
+    policy = PolicyEngine(cfg)
+    metrics = Metrics(cfg.event_mappings)
+    now_ms = time.time_ns() // 1_000_000
+
+    stale_body, stale_sig = _signed({"event_type": "evt", "ts_ms": now_ms - 5_000})
+    stale = evaluate(stale_body, stale_sig, policy, cfg, metrics=metrics)
+    assert (stale.status, stale.reason) == (410, "stale")
+    assert "max_age_ms=500" in stale.detail
+
+    fresh_body, fresh_sig = _signed({"event_type": "evt", "ts_ms": now_ms})
+    fresh = evaluate(fresh_body, fresh_sig, policy, cfg, metrics=metrics)
+    assert fresh.status == 202
+    assert metrics.events("evt", "stale") == 1
+
+    # Ingest lag is measured at arrival, decide lag after the decision.
+    ingest_ns, decide_ns = stale.lag_ns
+    assert 5_000_000_000 <= ingest_ns <= decide_ns < 6_000_000_000
+    assert metrics.lag["ingest"].count == metrics.lag["decide"].count == 2
+
+
+def test_events_without_a_wall_clock_timestamp_are_not_aged():
+    cfg = _cfg(max_age_ms=1)
+    policy = PolicyEngine(cfg)
+    # Pre-contract emitters stamped os.clock() milliseconds.
+    body, sig = _signed({"event_type": "evt", "ts_ms": 12_345})
+    outcome = evaluate(body, sig, policy, cfg)
+    assert outcome.status == 202
+    assert (outcome.emitted_ns, outcome.lag_ns) == (None, ())
+
+    # An emitter clock running ahead counts as zero lag, not negative.
+    ahead_body, ahead_sig = _signed({"event_type": "evt", "ts_ms": time.time_ns() // 1_000_000 + 60_000})
+    ahead = evaluate(ahead_body, ahead_sig, PolicyEngine(cfg), cfg, arrived_ns=time.monotonic_ns())
+    assert ahead.status == 202
+    assert ahead.lag_ns[0] == 0
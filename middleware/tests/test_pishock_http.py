@@ -0,0 +1,93 @@
+"""PiShock HTTP client tests using an in-process mock transport."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from middleware.config import TransportConfig
+from middleware.pishock_http import AsyncPiShockClient, build_payload, client_for, close_client
+
+
+def _send_kwargs(**overrides) -> dict:
+    kwargs = {
+        "mode": "vibrate",
+        "intensity": 10,
+        "duration_ms": 1400,
+        "username": "u",
+        "apikey": "k",
+        "code": "c",
+        "name": "CyberpunkBridge",
+    }
+    kwargs.update(overrides)
+    return kwargs
+
+
+def test_build_payload_maps_operation_and_seconds():
+    payload = build_payload(**_send_kwargs(mode="shock", duration_ms=200))
+    assert payload["Op"] == 0
+    assert payload["Duration"] == 1
+
+
+def test_build_payload_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        build_payload(**_send_kwargs(mode="zap"))
+
+
+def test_async_client_posts_payload_and_reports_result():
+    seen: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(json.loads(request.content))
+        return httpx.Response(200, text="Operation Succeeded.")
+
+    async def run():
+        client = AsyncPiShockClient(transport=httpx.MockTransport(handler))
+        try:
+            return await asyncio.gather(*(client.send(**_send_kwargs()) for _ in range(3)))
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(run())
+    assert [r.ok for r in results] == [True, True, True]
+    assert len(seen) == 3
+    assert seen[0]["Op"] == 1
+    assert seen[0]["Duration"] == 1
+
+
+def test_async_client_maps_transport_errors_to_failed_result():
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    async def run():
+        client = AsyncPiShockClient(transport=httpx.MockTransport(handler))
+        try:
+            return await client.send(**_send_kwargs(), timeout_s=0.1)
+        finally:
+            await client.aclose()
+
+    result = asyncio.run(run())
+    assert result.ok is False
+    assert result.status_code == 0
+    assert "ReadTimeout" in result.body
+
+
+def test_blocking_client_is_pooled_per_transport_settings_and_closed():
+    transport = TransportConfig(url="http://127.0.0.1:9/api", max_connections=7, keepalive_expiry_s=5.0)
+    client = client_for(transport)
+    try:
+        assert client_for(transport) is client
+        assert client_for(TransportConfig(max_connections=2)) is not client
+        assert client.url == "http://127.0.0.1:9/api"
+        pool = client._client._transport._pool
+        assert (pool._max_connections, pool._keepalive_expiry) == (7, 5.0)
+    finally:
+        close_client(transport)
+        close_client(TransportConfig(max_connections=2))
+
+    assert client._client.is_closed
+    assert client_for(transport) is not client
+    close_client(transport)
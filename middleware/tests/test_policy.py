@@ -3,7 +3,7 @@
 import pytest
 
 from middleware.config import PiShockCredentials, ServiceConfig
-from middleware.policy import PolicyEngine, PolicyError
+from middleware.policy import EventCoalesced, PolicyEngine, PolicyError
 
 
 def make_cfg() -> ServiceConfig:
@@ -67,3 +67,71 @@ def test_damage_percentage_scales_shock_intensity():
         assert False, "expected PolicyError"
     except PolicyError:
         pass
+
+
+def _coalescing_engine(**mapping_overrides) -> PolicyEngine:
+    cfg = ServiceConfig(**{**make_cfg().__dict__, "allow_shock": True, "max_intensity": 100})
+    cfg.event_mappings["player_damaged"] = {
+        "mode": "shock",
+        "duration_ms": 300,
+        "cooldown_ms": 0,
+        "coalesce_window_ms": 200,
+        **mapping_overrides,
+    }
+    return PolicyEngine(cfg)
+
+
+def _hit(damage: int) -> dict:
+    return {"event_type": "player_damaged", "armed": True, "context": {"damage": damage, "max_health": 400}}
+
+
+def test_coalescing_sums_damage_into_one_action():
+    """Hits inside the window become a single action scaled by summed damage."""
+
+    pe = _coalescing_engine()
+    for damage in (40, 40, 20):
+        with pytest.raises(EventCoalesced):
+            pe.decide(_hit(damage))
+
+    due = pe.next_flush_ns()
+    assert pe.flush_due(now_ns=due - 1) == []
+    actions = pe.flush_due(now_ns=due)
+    assert len(actions) == 1
+    assert actions[0].mode == "shock"
+    assert actions[0].intensity == 25  # (40 + 40 + 20) / 400 * 100
+    assert pe.next_flush_ns() is None
+
+
+def test_coalescing_respects_session_cap_and_max_intensity():
+    """Summed damage saturates at 100% and is still clamped by max_intensity."""
+
+    pe = _coalescing_engine()
+    pe.config = ServiceConfig(**{**pe.config.__dict__, "max_intensity": 30})
+    for _ in range(5):
+        with pytest.raises(EventCoalesced):
+            pe.decide(_hit(300))
+
+    (action,) = pe.flush_due(force=True)
+    assert action.intensity == 30
+
+
+def test_coalescing_window_waits_for_cooldown():
+    """A window opened during cooldown does not close before the cooldown ends."""
+
+    pe = _coalescing_engine(cooldown_ms=5000)
+    with pytest.raises(EventCoalesced):
+        pe.decide(_hit(40))
+    (first,) = pe.flush_due(now_ns=pe.next_flush_ns())
+
+    with pytest.raises(EventCoalesced):
+        pe.decide(_hit(40))
+    fired_at = pe._cooldowns.last_fired_ns(("player_damaged", "c"))
+    assert pe.next_flush_ns() == fired_at + 5000 * 1_000_000
+    assert first.intensity == 10
+
+
+def test_coalescing_still_requires_armed_shock():
+    pe = _coalescing_engine()
+    with pytest.raises(PolicyError):
+        pe.decide({**_hit(40), "armed": False})
+    assert pe.next_flush_ns() is None
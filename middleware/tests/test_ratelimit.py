@@ -0,0 +1,74 @@
+"""Tests for monotonic cooldown storage and token-bucket rate limits."""
+
+from __future__ import annotations
+
+import pytest
+
+from middleware.config import BucketSpec, PiShockCredentials, RateLimitConfig, ServiceConfig
+from middleware.policy import CooldownError, PolicyEngine
+from middleware.ratelimit import NS_PER_MS, NS_PER_S, CooldownStore, RateLimiter, TokenBuckets
+
+
+def test_cooldown_store_blocks_until_expiry():
+    store = CooldownStore(ttl_ns=1000 * NS_PER_MS)
+    store.record("k", 0)
+    assert store.remaining_ns("k", 1000 * NS_PER_MS, 400 * NS_PER_MS) == 600 * NS_PER_MS
+    assert store.remaining_ns("k", 1000 * NS_PER_MS, 1000 * NS_PER_MS) == 0
+
+
+def test_cooldown_store_memory_stays_flat_with_unbounded_keys():
+    store = CooldownStore(ttl_ns=10 * NS_PER_MS)
+    for i in range(100_000):
+        store.record(("evt", f"target-{i}"), i * NS_PER_MS)
+    assert len(store) <= 11
+
+
+def test_token_bucket_burst_then_refill():
+    buckets = TokenBuckets(BucketSpec(burst=2, per_minute=60))  # one token per second
+    buckets.take("t", 0)
+    buckets.take("t", 0)
+    assert buckets.wait_ns("t", 0) == pytest.approx(NS_PER_S, rel=1e-6)
+    assert buckets.wait_ns("t", NS_PER_S + 1) == 0
+
+
+def test_token_buckets_evict_full_buckets():
+    buckets = TokenBuckets(BucketSpec(burst=1, per_minute=60))
+    for i in range(10_000):
+        buckets.take(i, i * NS_PER_S // 10)
+    assert len(buckets) <= 11
+
+
+def test_rate_limiter_waits_for_every_scope_and_only_take_consumes():
+    limiter = RateLimiter(
+        RateLimitConfig(per_target=BucketSpec(burst=1, per_minute=1), overall=BucketSpec(burst=5, per_minute=1))
+    )
+    assert limiter.wait_ns("evt", "a", 0) == 0
+    limiter.take("evt", "a", 0)
+    assert limiter.wait_ns("evt", "a", 0) > 0  # per-target exhausted
+    # The refused check must not have consumed a global token.
+    for target in ("b", "c", "d", "e"):
+        assert limiter.wait_ns("evt", target, 0) == 0
+        limiter.take("evt", target, 0)
+    assert limiter.wait_ns("evt", "f", 0) > 0  # global exhausted
+
+
+def test_policy_enforces_per_target_limit_on_top_of_cooldown():
+    cfg = ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=8787,
+        shared_secret="s",
+        dry_run=True,
+        allow_shock=False,
+        max_intensity=20,
+        max_duration_ms=2000,
+        default_cooldown_ms=0,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
+        event_mappings={"a": {"mode": "vibrate"}, "b": {"mode": "beep"}},
+        rate_limits=RateLimitConfig(per_target=BucketSpec(burst=2, per_minute=2)),
+    )
+    pe = PolicyEngine(cfg)
+    pe.decide({"event_type": "a"})
+    pe.decide({"event_type": "b"})
+    with pytest.raises(CooldownError, match="Rate limit"):
+        pe.decide({"event_type": "a"})
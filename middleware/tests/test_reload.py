@@ -0,0 +1,158 @@
+"""Config hot-reload tests: policy swap, rejection, and the file watcher."""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from middleware.config import ConfigError, PiShockCredentials, ServiceConfig
+from middleware.policy import CooldownError, EventCoalesced, PolicyEngine
+from middleware.reload import ConfigReloader, restart_required
+
+LOGGER = logging.getLogger("middleware.tests.reload")
+
+YAML = """\
+service:
+  shared_secret: s
+  allow_shock: true
+pishock:
+  username: u
+  apikey: k
+  code: c
+event_mappings:
+  player_healed:
+    mode: vibrate
+    intensity: {intensity}
+    duration_ms: 300
+    cooldown_ms: 60000
+"""
+
+
+def _cfg(**mappings: dict) -> ServiceConfig:
+    return ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=8787,
+        shared_secret="s",
+        dry_run=True,
+        allow_shock=True,
+        max_intensity=20,
+        max_duration_ms=2000,
+        default_cooldown_ms=60_000,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
+        event_mappings=mappings,
+    )
+
+
+def _write(path: Path, text: str) -> None:
+    # Save like an editor: write a sibling file and rename it over the original.
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def test_reload_swaps_mappings_and_keeps_cooldowns():
+    pe = PolicyEngine(_cfg(a={"mode": "vibrate", "intensity": 5, "duration_ms": 300}))
+    assert pe.decide({"event_type": "a"}).intensity == 5
+
+    pe.reload(
+        _cfg(
+            a={"mode": "vibrate", "intensity": 9, "duration_ms": 300},
+            b={"mode": "beep", "intensity": 3, "duration_ms": 300},
+        )
+    )
+
+    with pytest.raises(CooldownError):
+        pe.decide({"event_type": "a"})
+    assert pe.decide({"event_type": "b"}).intensity == 3
+
+
+def test_invalid_reload_keeps_old_config():
+    pe = PolicyEngine(_cfg(a={"mode": "vibrate", "intensity": 5, "duration_ms": 300}))
+    old = pe.config
+
+    with pytest.raises(ConfigError):
+        pe.reload(_cfg(a={"mode": "zap"}))
+
+    assert pe.config is old
+    assert pe.decide({"event_type": "a"}).intensity == 5
+
+
+def test_reload_discards_windows_of_removed_mappings():
+    damaged = {"mode": "shock", "intensity": 8, "duration_ms": 400, "cooldown_ms": 0, "coalesce_window_ms": 100}
+    pe = PolicyEngine(_cfg(player_damaged=damaged))
+    with pytest.raises(EventCoalesced):
+        pe.decide({"event_type": "player_damaged", "armed": True, "context": {"damage": 10, "max_health": 100}})
+
+    pe.reload(_cfg(player_healed={"mode": "vibrate", "intensity": 5, "duration_ms": 300}))
+
+    assert pe.flush_due(force=True) == []
+    assert pe.next_flush_ns() is None
+
+
+@pytest.mark.parametrize(
+    "reloaded",
+    [
+        {"allow_shock": False},
+        {"event_mappings": {"player_damaged": {"mode": "vibrate", "intensity": 5, "duration_ms": 300}}},
+    ],
+)
+def test_reload_disabling_shock_discards_open_damage_windows(reloaded):
+    damaged = {"mode": "shock", "intensity": 8, "duration_ms": 400, "cooldown_ms": 0, "coalesce_window_ms": 100}
+    pe = PolicyEngine(_cfg(player_damaged=damaged))
+    with pytest.raises(EventCoalesced):
+        pe.decide({"event_type": "player_damaged", "armed": True, "context": {"damage": 10, "max_health": 100}})
+
+    pe.reload(ServiceConfig(**{**pe.config.__dict__, **reloaded}))
+
+    assert pe.flush_due(time.monotonic_ns() + 1_000_000_000) == []
+    assert pe.next_flush_ns() is None
+
+
+def test_restart_required_names_startup_only_fields():
+    old = _cfg()
+    new = ServiceConfig(**{**old.__dict__, "bind_port": 9000, "max_intensity": 10})
+    assert restart_required(old, new) == ["bind_port"]
+
+
+def test_reloader_applies_valid_and_rejects_invalid(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(YAML.format(intensity=5), encoding="utf-8")
+    applied: list[ServiceConfig] = []
+    reloader = ConfigReloader(path, _cfg(), applied.append, LOGGER)
+
+    _write(path, YAML.format(intensity=7))
+    assert reloader.check() is True
+    assert applied[-1].event_mappings["player_healed"]["intensity"] == 7
+    assert reloader.check() is None
+
+    _write(path, YAML.format(intensity="loud"))
+    assert reloader.check() is False
+    assert len(applied) == 1
+    stats = reloader.stats()
+    assert (stats["generation"], stats["reloads"], stats["last_result"]) == (1, {"ok": 1, "rejected": 1}, "rejected")
+    assert "intensity" in stats["last_error"]
+    assert stats["last_reload_ms"] >= 0
+    assert 'middleware_config_reloads_total{result="rejected"} 1' in reloader.metric_lines()
+
+
+@pytest.mark.parametrize("tail_mode", ["auto", "poll"])
+def test_reloader_thread_picks_up_saves(tmp_path, tail_mode):
+    path = tmp_path / "config.yaml"
+    path.write_text(YAML.format(intensity=5), encoding="utf-8")
+    pe = PolicyEngine(_cfg(player_healed={"mode": "vibrate", "intensity": 5, "duration_ms": 300}))
+    reloader = ConfigReloader(path, pe.config, pe.reload, LOGGER, poll_interval_s=0.05, tail_mode=tail_mode).start()
+    try:
+        _write(path, YAML.format(intensity=8))
+        deadline = time.monotonic() + 5
+        while reloader.generation < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        reloader.stop()
+
+    assert reloader.generation == 1
+    assert pe.decide({"event_type": "player_healed"}).intensity == 8
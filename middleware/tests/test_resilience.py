@@ -0,0 +1,127 @@
+"""Retry, circuit breaker and deadline tests against the local fake PiShock server."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from middleware.bench.fake_pishock import FakePiShock
+from middleware.config import TransportConfig
+from middleware.dispatcher import ActionDispatcher
+from middleware.pishock_http import AsyncPiShockClient, PiShockResult, send_pishock_http
+from middleware.policy import Action
+from middleware.resilience import CircuitOpenError, DeadlineExceeded, Resilience
+
+SEND = {"mode": "beep", "intensity": 0, "duration_ms": 100, "username": "u", "apikey": "k", "code": "c", "name": "t"}
+
+
+def _resilience(url: str, **overrides) -> Resilience:
+    transport = TransportConfig(url=url, timeout_s=2.0, backoff_ms=1, backoff_max_ms=5, **overrides)
+    return Resilience(transport)
+
+
+async def _send_all(resilience: Resilience, url: str, count: int) -> list[PiShockResult | str]:
+    client = AsyncPiShockClient(url=url, timeout_s=2.0)
+    results: list[PiShockResult | str] = []
+    try:
+        for _ in range(count):
+            try:
+                results.append(await resilience.run(lambda: client.send(**SEND)))
+            except CircuitOpenError:
+                results.append("open")
+    finally:
+        await client.aclose()
+    return results
+
+
+def test_not_processed_failures_are_retried_with_backoff():
+    with FakePiShock(fail_first=2, fail_status=503) as fake:
+        resilience = _resilience(fake.url, max_attempts=3)
+        (result,) = asyncio.run(_send_all(resilience, fake.url, 1))
+        assert result.ok
+        assert fake.stats()["requests"] == 3
+    assert resilience.retries == 2
+    assert resilience.breaker.state == "closed"
+
+
+def test_server_errors_are_not_retried():
+    # A 500 may have actuated the device already; repeating it could double-shock.
+    with FakePiShock(fail_first=1, fail_status=500) as fake:
+        resilience = _resilience(fake.url, max_attempts=3)
+        (result,) = asyncio.run(_send_all(resilience, fake.url, 1))
+        assert not result.ok and result.status_code == 500
+        assert fake.stats()["requests"] == 1
+    assert resilience.retries == 0
+
+
+def test_breaker_opens_fails_fast_then_probes_half_open():
+    with FakePiShock(fail_first=3, fail_status=500) as fake:
+        resilience = _resilience(fake.url, max_attempts=1, breaker_failures=3, breaker_reset_s=0.2)
+        results = asyncio.run(_send_all(resilience, fake.url, 5))
+        assert [r if isinstance(r, str) else r.status_code for r in results] == [500, 500, 500, "open", "open"]
+        assert fake.stats()["requests"] == 3
+        assert resilience.breaker.state == "open"
+        assert 'middleware_breaker_state{endpoint="%s",state="open"} 1' % fake.url in resilience.metric_lines()
+
+        time.sleep(0.25)
+        (probe,) = asyncio.run(_send_all(resilience, fake.url, 1))
+        assert probe.ok
+    stats = resilience.stats()
+    assert (stats["breaker"], stats["breaker_opened"], stats["short_circuited"]) == ("closed", 1, 2)
+
+
+def test_failed_half_open_probe_reopens_the_breaker():
+    clock = [0.0]
+    transport = TransportConfig(max_attempts=1, breaker_failures=1, breaker_reset_s=1.0)
+    resilience = Resilience(transport, clock=lambda: clock[0])
+    failure = PiShockResult(ok=False, status_code=0, body="refused", retryable=True)
+
+    async def send() -> PiShockResult:
+        return failure
+
+    asyncio.run(resilience.run(send))
+    assert resilience.breaker.state == "open"
+    clock[0] = 1.5
+    assert resilience.breaker.allow()
+    # Only one probe at a time while half-open.
+    assert not resilience.breaker.allow()
+    resilience.breaker.record(False)
+    assert resilience.breaker.state == "open" and resilience.breaker.opened == 2
+
+
+def test_dispatcher_drops_actions_past_their_deadline():
+    with FakePiShock(latency_ms=150) as fake:
+
+        async def run():
+            client = AsyncPiShockClient(url=fake.url, timeout_s=2.0)
+            resilience = _resilience(fake.url)
+
+            async def send(action: Action) -> PiShockResult:
+                return await resilience.run(lambda: client.send(**SEND))
+
+            dispatcher = ActionDispatcher(send, queue_size=8, deadline_ms=100)
+            # Arrived long ago: dropped at dequeue without a request.
+            dispatcher.submit(Action("beep", 0, 100, "c"), arrived_ns=time.monotonic_ns() - 10**9)
+            # Fresh, but the 150 ms round trip overruns the 100 ms budget.
+            dispatcher.submit(Action("beep", 0, 100, "c"))
+            await dispatcher.shutdown(drain_timeout_s=2.0)
+            await client.aclose()
+            return dispatcher.stats()
+
+        stats = asyncio.run(run())
+    assert (stats["expired"], stats["sent"], stats["deadline_ms"]) == (2, 0, 100)
+
+
+def test_blocking_send_honours_the_deadline():
+    with FakePiShock() as fake:
+        resilience = _resilience(fake.url)
+
+        def send(timeout_s: float) -> PiShockResult:
+            return send_pishock_http(**SEND, timeout_s=timeout_s, url=fake.url)
+
+        with pytest.raises(DeadlineExceeded):
+            resilience.run_blocking(send, deadline_ns=time.monotonic_ns() - 1)
+        assert resilience.run_blocking(send, deadline_ns=time.monotonic_ns() + 10**9).ok
+        assert fake.stats()["requests"] == 1
@@ -2,8 +2,9 @@
 
 import hashlib
 import hmac
+from concurrent.futures import ThreadPoolExecutor
 
-from middleware.security import verify_signature
+from middleware.security import SignatureVerifier, verify_signature
 
 
 def test_verify_signature_ok():
@@ -19,3 +20,31 @@ def test_verify_signature_bad():
     """A non-matching signature must be rejected."""
 
     assert not verify_signature(b"x", "bad", "abc")
+
+
+def test_verifier_matches_stdlib_hmac_and_is_reusable():
+    """The precomputed-key verifier must agree with a fresh hmac.new per message."""
+
+    verifier = SignatureVerifier("abc")
+    for body in (b"", b'{"event_type":"x"}', b"y" * 5000):
+        expected = hmac.new(b"abc", body, hashlib.sha256).hexdigest()
+        assert verifier.sign(body) == expected
+        assert verifier.verify(body, expected)
+    assert not verifier.verify(b"x", None)
+    assert not verifier.verify(b"x", "é" * 64)
+
+
+def test_verify_many_preserves_order_with_executor():
+    """Batch verification returns one result per pair, in input order."""
+
+    verifier = SignatureVerifier("abc")
+    pairs = []
+    for i in range(50):
+        body = f'{{"seq":{i}}}'.encode()
+        sig = verifier.sign(body) if i % 3 else "bad"
+        pairs.append((body, sig))
+
+    expected = [i % 3 != 0 for i in range(50)]
+    assert verifier.verify_many(pairs) == expected
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        assert verifier.verify_many(pairs, executor=pool, chunk_size=7) == expected
@@ -0,0 +1,162 @@
+"""Policy simulator tests: exact agreement with `PolicyEngine.decide`, sweeps, grid parsing."""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import random
+from dataclasses import replace
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from middleware import policy as policy_module
+from middleware.config import BucketSpec, ConfigError, PiShockCredentials, RateLimitConfig, ServiceConfig
+from middleware.events import Event
+from middleware.policy import CooldownError, PolicyEngine, PolicyError
+from middleware.simulate import SIM_OUTCOMES, expand_grid, parse_grid, read_outbox, sweep, trace
+
+SECRET = "sim-secret"
+
+
+def _cfg(**overrides) -> ServiceConfig:
+    base = ServiceConfig(
+        bind_host="127.0.0.1",
+        bind_port=8787,
+        shared_secret=SECRET,
+        dry_run=True,
+        allow_shock=True,
+        max_intensity=60,
+        max_duration_ms=2000,
+        default_cooldown_ms=500,
+        session_max_shock_level=100,
+        pishock=PiShockCredentials(username="u", apikey="k", code="c"),
+        event_mappings={
+            "player_damaged": {"mode": "shock", "intensity": 5, "duration_ms": 400, "cooldown_ms": 300},
+            "player_healed": {"mode": "vibrate", "intensity": 10, "duration_ms": 500, "cooldown_ms": 0},
+            "enemy_killed": {"mode": "beep", "duration_ms": 100, "target": "other"},
+            "player_shocked": {"mode": "shock", "intensity": 30, "duration_ms": 700, "cooldown_ms": 1000},
+        },
+        rate_limits=RateLimitConfig(
+            per_event=BucketSpec(burst=3, per_minute=40),
+            per_target=BucketSpec(burst=4, per_minute=90),
+        ),
+    )
+    return replace(base, **overrides)
+
+
+def _session(count: int = 600, seed: int = 7) -> list[Event]:
+    rng = random.Random(seed)
+    events, ts_ms = [], 1_700_000_000_000
+    types = ["player_damaged"] * 5 + ["player_healed", "enemy_killed", "player_shocked", "unknown_event"]
+    for seq in range(count):
+        ts_ms += rng.choice([0, 15, 80, 120, 250, 400, 900, 2500])
+        context = {"damage": rng.uniform(0, 300), "max_health": rng.choice([400, 250.0, 0, "x"])}
+        if rng.random() < 0.05:
+            context = {}
+        events.append(
+            Event(rng.choice(types), ts_ms=ts_ms, session_id="s", seq=seq, armed=rng.random() > 0.1, context=context)
+        )
+    return events
+
+
+def _decide_live(events: list[Event], config: ServiceConfig, monkeypatch) -> list[tuple[str, int]]:
+    clock = [0]
+    monkeypatch.setattr(policy_module.time, "monotonic_ns", lambda: clock[0])
+    engine = PolicyEngine(config)
+    decisions = []
+    for event in events:
+        clock[0] = event.ts_ms * 1_000_000
+        try:
+            decisions.append(("accepted", engine.decide(event).intensity))
+        except CooldownError as exc:
+            decisions.append(("rate_limited" if str(exc).startswith("Rate limit") else "cooldown", 0))
+        except PolicyError as exc:
+            decisions.append(("unmapped" if str(exc).startswith("No mapping") else "policy_error", 0))
+    engine.close()
+    monkeypatch.undo()
+    return decisions
+
+
+def test_trace_matches_policy_engine_decide_exactly(monkeypatch):
+    events = _session()
+    grid = {
+        "cooldown_ms": [0, 250, 1000],
+        "session_max_shock_level": [40, 100],
+        "max_intensity": [20, 60],
+        "player_shocked.cooldown_ms": [0, 3000],
+    }
+    configs = [point.config for point in expand_grid(_cfg(), grid)] + [_cfg(allow_shock=False)]
+    codes, intensity = trace(events, configs)
+
+    seen = set()
+    for j, config in enumerate(configs):
+        expected = _decide_live(events, config, monkeypatch)
+        got = [(SIM_OUTCOMES[code], int(value)) for code, value in zip(codes[:, j], intensity[:, j])]
+        assert got == expected, j
+        seen.update(name for name, _ in expected)
+    # The session exercises every decision path.
+    assert seen == set(SIM_OUTCOMES)
+
+
+def test_sweep_summaries_match_across_worker_counts():
+    events = _session(300)
+    points = expand_grid(_cfg(), parse_grid(["cooldown_ms=0:1000:500", "max_intensity=20,60"]))
+    serial = sweep(events, points, workers=1)
+    parallel = sweep(events, points, workers=2)
+    assert serial == parallel
+    assert [r["params"] for r in serial] == [p.params for p in points]
+
+    codes, intensity = trace(events, [p.config for p in points])
+    for j, result in enumerate(serial):
+        assert sum(result["outcomes"].values()) == len(events)
+        assert result["outcomes"]["accepted"] == int((codes[:, j] == 0).sum())
+        assert sum(result["shock_intensity"]["histogram"].values()) == result["actions"]["shock"]
+        assert result["shock_intensity"]["max"] <= result["params"]["max_intensity"]
+    # A longer cooldown can only remove actuations.
+    assert serial[0]["outcomes"]["accepted"] >= serial[-1]["outcomes"]["accepted"]
+
+
+def test_parse_grid_rejects_unknown_keys_and_bad_values():
+    assert parse_grid(["player_damaged.cooldown_ms=100,200", "max_intensity=10:30:10"]) == {
+        "player_damaged.cooldown_ms": [100, 200],
+        "max_intensity": [10, 20, 30],
+    }
+    with pytest.raises(ValueError, match="allow_shock"):
+        parse_grid(["allow_shock=1"])
+    with pytest.raises(ValueError, match="integers"):
+        parse_grid(["cooldown_ms=fast"])
+    with pytest.raises(ValueError, match="no mapping"):
+        expand_grid(_cfg(), parse_grid(["missing.cooldown_ms=1"]))
+    with pytest.raises(ConfigError, match="cooldown_ms"):
+        expand_grid(_cfg(), parse_grid(["cooldown_ms=100,-5"]))
+
+
+def test_coalescing_configs_are_rejected():
+    mappings = dict(_cfg().event_mappings)
+    mappings["player_damaged"] = {**mappings["player_damaged"], "coalesce_window_ms": 250}
+    with pytest.raises(ValueError, match="coalesce_window_ms"):
+        expand_grid(_cfg(event_mappings=mappings), {})
+
+
+def test_read_outbox_verifies_and_sorts(tmp_path):
+    def line(payload: dict, secret: str = SECRET) -> str:
+        body = json.dumps(payload, separators=(",", ":"))
+        return hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest() + "\t" + body + "\n"
+
+    outbox = tmp_path / "outbox.log"
+    outbox.write_text(
+        line({"event_type": "player_healed", "ts_ms": 20})
+        + line({"event_type": "player_healed", "ts_ms": 10})
+        + line({"event_type": "player_healed", "ts_ms": 5}, secret="wrong")
+        + line({"event_type": "player_healed"})
+        + line({"event_type": 3, "ts_ms": 1})
+        + "no tab here\n\n",
+        encoding="utf-8",
+    )
+    events, stats = read_outbox(outbox, SECRET)
+    assert [event.ts_ms for event in events] == [10, 20]
+    assert stats == {"lines": 6, "malformed_line": 1, "invalid_signature": 1, "invalid_event": 1, "missing_ts": 1}
+    assert len(read_outbox(outbox, None)[0]) == 3
@@ -0,0 +1,51 @@
+"""Tests for outbox change waiters (inotify + adaptive polling)."""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+
+import pytest
+
+from middleware.watch import AdaptivePollWaiter, InotifyWaiter, open_waiter
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+def test_inotify_waiter_wakes_on_append(tmp_path):
+    path = tmp_path / "events.log"
+    path.touch()
+    waiter = InotifyWaiter(path)
+    try:
+        assert waiter.wait(0.01) is False
+
+        def append():
+            time.sleep(0.05)
+            with path.open("a", encoding="utf-8") as handle:
+                handle.write("line\n")
+
+        writer = threading.Thread(target=append)
+        writer.start()
+        started = time.monotonic()
+        assert waiter.wait(2.0) is True
+        assert time.monotonic() - started < 1.0
+        writer.join()
+    finally:
+        waiter.close()
+
+
+def test_adaptive_poll_backs_off_and_resets_on_activity():
+    waiter = AdaptivePollWaiter(min_interval_s=0.001, max_interval_s=0.004)
+    for _ in range(4):
+        waiter.wait(1.0)
+    assert waiter.interval_s == 0.004
+    waiter.activity()
+    assert waiter.interval_s == 0.001
+
+
+def test_open_waiter_poll_mode_and_validation(tmp_path):
+    path = tmp_path / "events.log"
+    path.touch()
+    assert open_waiter(path, "poll").kind == "poll"
+    with pytest.raises(ValueError):
+        open_waiter(path, "fsevents")
@@ -0,0 +1,132 @@
+"""File change waiters used to tail the CET outbox without fixed-interval polling.
+
+- `InotifyWaiter` (Linux): blocks on an inotify fd via `selectors`, waking as
+  soon as the watched file is modified. Loaded through ctypes; no extra service.
+- `AdaptivePollWaiter` (portable fallback): sleeps a short interval right after
+  activity and backs off exponentially while the file is idle.
+
+Both expose the same small interface: `wait(max_wait_s) -> bool` (True when
+woken by a file event), `activity()` (new data was read), and `close()`.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import selectors
+import sys
+import time
+from pathlib import Path
+
+TAIL_MODES = ("auto", "inotify", "poll")
+
+# <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_DELETE_SELF | _IN_MOVE_SELF
+
+
+class InotifyWaiter:
+    """Wake on writes to a single file using Linux inotify."""
+
+    kind = "inotify"
+
+    def __init__(self, path: Path) -> None:
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self._libc = libc
+        self._fd = fd
+        self._path = path
+        self._wd = -1
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(fd, selectors.EVENT_READ)
+        try:
+            self.rewatch()
+        except OSError:
+            self.close()
+            raise
+
+    def rewatch(self, path: Path | None = None) -> None:
+        """(Re)attach the watch, e.g. after the file was replaced, or to the next outbox segment."""
+
+        if path is not None:
+            self._path = path
+        if self._wd >= 0:
+            self._libc.inotify_rm_watch(self._fd, self._wd)
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(self._path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch failed: {os.strerror(err)}", str(self._path))
+        self._wd = wd
+
+    def wait(self, max_wait_s: float) -> bool:
+        if not self._selector.select(max(0.0, max_wait_s)):
+            return False
+        # Drain queued events; one wake covers any number of writes.
+        try:
+            while os.read(self._fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def activity(self) -> None:
+        return None
+
+    def close(self) -> None:
+        self._selector.close()
+        os.close(self._fd)
+
+
+class AdaptivePollWaiter:
+    """Sleep-based waiter: short interval after activity, backing off when idle."""
+
+    kind = "poll"
+
+    def __init__(self, min_interval_s: float = 0.01, max_interval_s: float = 0.25, backoff: float = 2.0) -> None:
+        self.min_interval_s = min(min_interval_s, max_interval_s)
+        self.max_interval_s = max_interval_s
+        self.backoff = backoff
+        self.interval_s = self.min_interval_s
+
+    def wait(self, max_wait_s: float) -> bool:
+        time.sleep(max(0.0, min(self.interval_s, max_wait_s)))
+        self.interval_s = min(self.max_interval_s, self.interval_s * self.backoff)
+        return False
+
+    def activity(self) -> None:
+        self.interval_s = self.min_interval_s
+
+    def rewatch(self, path: Path | None = None) -> None:
+        return None
+
+    def close(self) -> None:
+        return None
+
+
+def open_waiter(path: Path, mode: str = "auto", max_poll_interval_s: float = 0.25) -> InotifyWaiter | AdaptivePollWaiter:
+    """Return a waiter for `path`; `auto` prefers inotify and falls back to polling."""
+
+    if mode not in TAIL_MODES:
+        raise ValueError(f"Unsupported tail mode: {mode}")
+    if mode in ("auto", "inotify"):
+        try:
+            return InotifyWaiter(path)
+        except (OSError, AttributeError):
+            # AttributeError: libc without inotify symbols (non-glibc/musl edge cases).
+            if mode == "inotify":
+                raise
+    return AdaptivePollWaiter(max_interval_s=max_poll_interval_s)
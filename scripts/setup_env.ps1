@@ -36,6 +36,6 @@ if (-not (Test-Path $venvPython)) {
 & $venvPython -m ensurepip --upgrade | Out-Null
 & $venvPython -m pip install -e '.[test]' --no-build-isolation --index-url $PipIndexUrl
 
-& $venvPython -c "import fastapi, requests, yaml, pytest; print('setup-check: fastapi', fastapi.__version__); print('setup-check: requests', requests.__version__); print('setup-check: pyyaml', yaml.__version__); print('setup-check: pytest', pytest.__version__)"
+& $venvPython -c "import fastapi, httpx, yaml, pytest; print('setup-check: fastapi', fastapi.__version__); print('setup-check: httpx', httpx.__version__); print('setup-check: pyyaml', yaml.__version__); print('setup-check: pytest', pytest.__version__)"
 
 Write-Host "setup complete: activate with '.\\$VenvDir\\Scripts\\Activate.ps1'"
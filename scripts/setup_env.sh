@@ -36,9 +36,9 @@ python -m ensurepip --upgrade >/dev/null 2>&1 || true
 python -m pip install -e '.[test]' --no-build-isolation --index-url "$PIP_INDEX_URL"
 
 python - <<'PY'
-import fastapi, requests, yaml, pytest
+import fastapi, httpx, yaml, pytest
 print('setup-check: fastapi', fastapi.__version__)
-print('setup-check: requests', requests.__version__)
+print('setup-check: httpx', httpx.__version__)
 print('setup-check: pyyaml', yaml.__version__)
 print('setup-check: pytest', pytest.__version__)
 PY